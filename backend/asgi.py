@@ -0,0 +1,678 @@
+"""ASGI entry point: `uvicorn asgi:app` from the backend directory.
+
+The endpoints that wait on MongoDB and the event stream run as native
+coroutines, so one process can keep thousands of requests and open streams
+in flight without a thread each. The remaining routes registered by
+routes.init_routes (health, metrics and debug endpoints) fall through to the
+Flask app on a pool of ASGI_WSGI_THREADS threads (10 by default). The Flask
+app is still configured by app.py and shares the cache, event broker and
+availability index.
+"""
+import functools
+import os
+import queue
+from contextlib import asynccontextmanager
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+from app import create_app
+import async_database as db
+import availability
+import database
+import encoding
+import events
+import health
+import metrics
+import ratelimit
+import tokens
+import validation
+from database import BULK_STATUS_MAX
+from models import User
+from passwords import PasswordPoolBusy
+from tokens import session_tokens
+from log import get_logger
+from routes import DUPLICATE_USER_ERRORS, TRANSITION_ERROR_STATUS
+
+logger = get_logger(__name__)
+
+flask_app = create_app()
+
+
+def json_response(content, status_code=200, headers=None):
+    # Same encoder as Flask's jsonify so both stacks render dates and ObjectIds alike
+    return Response(flask_app.json.encode(content), status_code=status_code, headers=headers, media_type='application/json')
+
+
+async def json_body(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+def password_pool_busy_response():
+    return json_response({
+        'message': 'Server is busy',
+        'error': 'Too many concurrent password checks, please retry shortly'
+    }, 503, headers={'Retry-After': '1'})
+
+
+def admission_controlled(endpoint, account_field=None):
+    """Async counterpart of routes.admission_controlled"""
+    def decorate(handler):
+        @functools.wraps(handler)
+        async def admitted(request):
+            data = await json_body(request)
+            account = data.get(account_field) if account_field and isinstance(data, dict) else None
+            remote_addr = request.client.host if request.client else None
+            ip = ratelimit.admission.client_ip(remote_addr, request.headers.get('x-forwarded-for'))
+            refused = ratelimit.admission.admit(endpoint, ip, account)
+            if refused:
+                status, retry_after = refused
+                return json_response(ratelimit.REFUSALS[status], status, headers={'Retry-After': str(retry_after)})
+            try:
+                return await handler(request)
+            finally:
+                ratelimit.admission.release(endpoint)
+        return admitted
+    return decorate
+
+
+def token_required(roles=tokens.STAFF_ROLES, owner_param=None):
+    """Async counterpart of routes.token_required"""
+    def decorate(handler):
+        @functools.wraps(handler)
+        async def authorized(request):
+            owner = request.path_params.get(owner_param) if owner_param else None
+            refused = token_refusal(request, roles, owner)
+            if refused:
+                return refused
+            return await handler(request)
+        return authorized
+    return decorate
+
+
+def token_refusal(request, roles=tokens.STAFF_ROLES, owner=None, query_token=False):
+    """Async-stack counterpart of routes.token_refusal"""
+    token = tokens.bearer_token(request.headers.get('authorization'))
+    if token is None and query_token:
+        token = request.query_params.get('token')
+    refused = session_tokens.authorize(token, roles, owner)
+    if not refused:
+        return None
+    body, headers = tokens.refusal(*refused)
+    return json_response(body, refused[0], headers=headers)
+
+
+def database_unavailable_response():
+    if health.monitor.available():
+        return None
+    return json_response({
+        'message': 'Service unavailable',
+        'error': 'Database is unreachable, please retry shortly'
+    }, 503, headers={'Retry-After': str(health.monitor.interval or 10)})
+
+
+def appointments_etag(request, user_id=None):
+    return validation.etag_for(db.appointments_version(user_id), request.url.query)
+
+
+def etag_headers(etag):
+    return {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+
+
+def not_modified(request, etag):
+    """304 response if the client already holds etag, otherwise None"""
+    candidates = [tag.strip() for tag in request.headers.get('if-none-match', '').split(',')]
+    if '*' in candidates or f'"{etag}"' in candidates or f'W/"{etag}"' in candidates:
+        return Response(status_code=304, headers=etag_headers(etag))
+    return None
+
+
+async def index(request):
+    return json_response({
+        'message': 'TUPT Counseling Scheduler API',
+        'status': 'active'
+    })
+
+
+@admission_controlled('register')
+async def register(request):
+    try:
+        data = await json_body(request)
+        logger.debug('register_request', data=data)
+
+        error = validation.validate_registration(data)
+        if error:
+            return json_response(error, 400)
+
+        unavailable = database_unavailable_response()
+        if unavailable:
+            return unavailable
+
+        try:
+            password_hash = await User.set_password_async(data['password'])
+        except PasswordPoolBusy:
+            return password_pool_busy_response()
+        user = validation.new_user(data, password_hash)
+
+        try:
+            result = await db.insert_user(user)
+        except db.DuplicateUserError as e:
+            error = DUPLICATE_USER_ERRORS.get(e.field, 'User already exists')
+            logger.info('register_rejected', username=user.username, error=error)
+            return json_response({
+                'message': 'Registration failed',
+                'error': error
+            }, 409)
+
+        if not result:
+            return json_response({
+                'message': 'Registration failed',
+                'error': 'Failed to create user in database'
+            }, 500)
+
+        logger.info('user_registered', user_id=result, username=user.username)
+        return json_response({
+            'message': 'Registration successful! Please login.',
+            'user_id': str(user._id),
+            'user': validation.user_summary(user)
+        }, 201)
+
+    except Exception as e:
+        logger.error('register_failed', exc_info=True)
+        return json_response({
+            'message': 'Registration error',
+            'error': str(e)
+        }, 500)
+
+
+@admission_controlled('login', account_field='username')
+async def login(request):
+    try:
+        data = await json_body(request)
+        error = validation.validate_login(data)
+        if error:
+            return json_response(error, 400)
+
+        user = await db.find_user_by_username(data['username'])
+        try:
+            if user is None or not await user.check_password_async(data['password']):
+                return json_response({
+                    'message': 'Login failed',
+                    'error': 'Invalid username or password'
+                }, 401)
+
+            if user.password_needs_rehash():
+                await db.update_user_password_hash(user._id, await User.set_password_async(data['password']))
+        except PasswordPoolBusy:
+            return password_pool_busy_response()
+
+        logger.info('user_logged_in', user_id=str(user._id), role=user.role)
+        return json_response({
+            'message': 'Login successful',
+            'user': dict(validation.user_summary(user), user_id=str(user._id)),
+            **session_tokens.grant(user)
+        })
+
+    except Exception as e:
+        logger.error('login_failed', exc_info=True)
+        return json_response({
+            'message': 'Login error',
+            'error': str(e)
+        }, 500)
+
+
+@admission_controlled('booking', account_field='user_id')
+async def create_appointment(request):
+    try:
+        data = await json_body(request)
+        error = validation.validate_new_appointment(data, database.SLOT_TIMES)
+        if error:
+            return json_response(error, 400)
+
+        unavailable = database_unavailable_response()
+        if unavailable:
+            return unavailable
+
+        appointment = validation.new_appointment(data)
+        result, error = await db.book_appointment(appointment)
+
+        if error == 'slot_full':
+            return json_response({
+                'message': 'Appointment scheduling failed',
+                'error': 'Selected time slot is fully booked'
+            }, 409)
+        if not result:
+            return json_response({
+                'message': 'Appointment scheduling failed',
+                'error': 'Failed to create appointment in database'
+            }, 500)
+
+        logger.info('appointment_created', appointment_id=str(appointment._id), user_id=data['user_id'], date=data['date'], preferred_time=data['preferred_time'])
+        return json_response({
+            'message': 'Appointment scheduled successfully! Waiting for approval.',
+            'appointment_id': str(appointment._id),
+            'appointment': appointment.to_dict()
+        }, 201)
+
+    except Exception as e:
+        logger.error('appointment_create_failed', exc_info=True)
+        return json_response({
+            'message': 'Appointment scheduling error',
+            'error': str(e)
+        }, 500)
+
+
+async def refresh_token(request):
+    try:
+        claims, error = session_tokens.verify(tokens.bearer_token(request.headers.get('authorization')) or '')
+        user = await db.find_user_by_id(claims['uid']) if claims else None
+        if user is None:
+            body, headers = tokens.refusal(401, error or tokens.INVALID)
+            return json_response(body, 401, headers=headers)
+
+        return json_response({
+            'message': 'Token refreshed',
+            'user': dict(validation.user_summary(user), user_id=str(user._id)),
+            **session_tokens.grant(user)
+        })
+
+    except Exception as e:
+        logger.error('token_refresh_failed', exc_info=True)
+        return json_response({
+            'message': 'Token refresh error',
+            'error': str(e)
+        }, 500)
+
+
+async def stream_appointment_events(request):
+    # Waits on the broker from the event loop, so an open stream holds no thread; see routes.py for the protocol
+    user_id = request.query_params.get('user_id')
+    if request.query_params.get('scope') == 'admin':
+        channel = events.ADMIN_CHANNEL
+    elif user_id:
+        channel = events.user_channel(user_id)
+    else:
+        return json_response({
+            'message': 'Invalid stream request',
+            'error': 'Provide user_id or scope=admin'
+        }, 400)
+
+    refused = token_refusal(request, owner=None if channel == events.ADMIN_CHANNEL else user_id, query_token=True)
+    if refused:
+        return refused
+
+    subscription = events.broker.subscribe(channel, subscription_class=events.AsyncSubscription)
+    if subscription is None:
+        return json_response({
+            'message': 'Server is busy',
+            'error': 'Too many open event streams'
+        }, 503, headers={'Retry-After': '5'})
+
+    heartbeat = flask_app.config.get('SSE_HEARTBEAT_SECONDS', 15)
+
+    async def generate():
+        try:
+            yield events.SSE_RETRY
+            while True:
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    yield events.SSE_RESYNC
+                try:
+                    event = await subscription.get_async(heartbeat)
+                except queue.Empty:
+                    yield events.SSE_KEEP_ALIVE
+                    continue
+                yield events.sse_frame(event, flask_app.json.dumps)
+        finally:
+            events.broker.unsubscribe(subscription)
+
+    return StreamingResponse(generate(), media_type='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@token_required(owner_param='user_id')
+async def get_user_appointments(request):
+    user_id = request.path_params['user_id']
+    try:
+        start, end, error = validation.parse_date_range(request.query_params.get('from'), request.query_params.get('to'))
+        if error:
+            return json_response(error, 400)
+
+        etag = appointments_etag(request, user_id)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+
+        return json_response({
+            'message': 'Appointments retrieved successfully',
+            'appointments': await db.find_appointment_rows_by_user_id(user_id, start, end)
+        }, headers=etag_headers(etag))
+
+    except Exception as e:
+        logger.error('user_appointments_failed', exc_info=True, user_id=user_id)
+        return json_response({
+            'message': 'Error retrieving appointments',
+            'error': str(e)
+        }, 500)
+
+
+@token_required()
+async def update_appointment_status(request):
+    try:
+        data = await json_body(request)
+        error = validation.validate_status_update(data)
+        if error:
+            return json_response(error, 400)
+
+        unavailable = database_unavailable_response()
+        if unavailable:
+            return unavailable
+
+        appointment, error = await db.transition_appointment_status(
+            request.path_params['appointment_id'], data['status'], data.get('version')
+        )
+        if appointment:
+            return json_response({
+                'message': f'Appointment status updated to {appointment.status}',
+                'status': appointment.status,
+                'version': appointment.version
+            })
+        return json_response({
+            'message': 'Failed to update appointment status',
+            'error': error
+        }, TRANSITION_ERROR_STATUS.get(error, 400))
+
+    except Exception as e:
+        return json_response({
+            'message': 'Error updating appointment status',
+            'error': str(e)
+        }, 500)
+
+
+async def get_appointment_stats(request):
+    try:
+        etag = appointments_etag(request)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+
+        return json_response({
+            'message': 'Appointment statistics retrieved successfully',
+            'stats': await db.get_appointment_stats()
+        }, headers=etag_headers(etag))
+
+    except Exception as e:
+        logger.error('appointment_stats_failed', exc_info=True)
+        return json_response({
+            'message': 'Error retrieving appointment statistics',
+            'error': str(e)
+        }, 500)
+
+
+async def get_availability(request):
+    start, days, error = validation.parse_availability_query(request.query_params.get('date'), request.query_params.get('range'))
+    if error:
+        return json_response(error, 400)
+
+    return json_response({
+        'message': 'Availability retrieved successfully',
+        'capacity': availability.index.capacity,
+        'days': availability.index.free_slots(start, days, request.query_params.get('counselor_id'))
+    })
+
+
+@token_required()
+async def bulk_update_appointment_status(request):
+    try:
+        updates, error = validation.validate_bulk_status_update(await json_body(request), BULK_STATUS_MAX)
+        if error:
+            return json_response(error, 400)
+
+        unavailable = database_unavailable_response()
+        if unavailable:
+            return unavailable
+
+        results = await db.bulk_update_appointment_status(updates)
+        updated = sum(1 for result in results if result['success'])
+        return json_response({
+            'message': f'{updated} of {len(results)} appointments updated',
+            'updated': updated,
+            'failed': len(results) - updated,
+            'results': results
+        })
+
+    except Exception as e:
+        logger.error('bulk_status_update_failed', exc_info=True)
+        return json_response({
+            'message': 'Error updating appointment statuses',
+            'error': str(e)
+        }, 500)
+
+
+@token_required()
+async def get_all_appointments(request):
+    try:
+        limit, after, error = validation.parse_page_query(request.query_params.get('limit'), request.query_params.get('cursor'))
+        if not error:
+            start, end, error = validation.parse_date_range(request.query_params.get('from'), request.query_params.get('to'))
+        if error:
+            return json_response(error, 400)
+
+        # Secondary reads may lag the version stamp; see routes.py
+        etag = appointments_etag(request) if database.LIST_READS_PRIMARY else None
+        cached = not_modified(request, etag) if etag else None
+        if cached:
+            return cached
+
+        page = await db.iter_appointments_with_user_details(limit=limit, after=after, start=start, end=end)
+
+        async def generate():
+            yield '{"message": "All appointments retrieved successfully", "appointments": ['
+            first = True
+            async for appointment in page:
+                if not first:
+                    yield ','
+                first = False
+                yield flask_app.json.dumps(appointment)
+            yield '], "next_cursor": ' + flask_app.json.dumps(page.next_cursor) + '}'
+
+        return StreamingResponse(generate(), media_type='application/json', headers=etag_headers(etag) if etag else None)
+
+    except Exception as e:
+        logger.error('all_appointments_failed', exc_info=True)
+        return json_response({
+            'message': 'Error retrieving appointments',
+            'error': str(e)
+        }, 500)
+
+
+async def get_user_profile(request):
+    user_id = request.path_params['user_id']
+    try:
+        user = await db.find_user_by_id(user_id)
+        if not user:
+            return json_response({
+                'message': 'User not found',
+                'error': 'Invalid user ID'
+            }, 404)
+
+        return json_response({
+            'message': 'User profile retrieved successfully',
+            'user': dict(
+                validation.user_summary(user),
+                user_id=str(user._id),
+                created_at=user.created_at.isoformat() if hasattr(user.created_at, 'isoformat') else user.created_at
+            )
+        })
+
+    except Exception as e:
+        logger.error('user_profile_failed', exc_info=True, user_id=user_id)
+        return json_response({
+            'message': 'Error retrieving user profile',
+            'error': str(e)
+        }, 500)
+
+
+class RequestMetrics:
+    """Times natively served requests into the shared metrics registry.
+
+    Requests that fall through to Flask are timed by Flask's own hooks, so
+    they are skipped here rather than counted twice.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        stats = metrics.start_request()
+        status = None
+
+        def finish():
+            nonlocal status
+            metrics.finish_request(stats, ROUTE_PATHS.get(scope.get('endpoint'), 'unmatched'), scope['method'], status)
+            status = None
+
+        async def send_with_timing(message):
+            nonlocal status
+            # The router has filled in scope['endpoint'] by the time the response starts
+            if scope.get('endpoint') is flask_wsgi:
+                return await send(message)
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                # Streamed bodies are still to come, so the header covers the time to the first byte
+                timing = metrics.server_timing(stats)
+                message['headers'] = list(message.get('headers', [])) + [(b'server-timing', timing.encode('latin-1'))]
+            await send(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body') and status is not None:
+                finish()
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            # A client that went away mid-stream is still counted, up to where it left
+            if status is not None:
+                finish()
+
+
+class CompressResponses:
+    """Compresses natively served JSON with the coding negotiated on Accept-Encoding.
+
+    Responses from the Flask fallthrough are compressed by Flask's own hook and
+    arrive with Content-Encoding already set, so they pass through untouched.
+    A single-message body is compressed whole; a streamed one chunk by chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not encoding.compression.codings:
+            return await self.app(scope, receive, send)
+        accept_encoding = Headers(scope=scope).get('accept-encoding')
+        start = None
+        coding = None
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start, coding, compressor
+            if message['type'] == 'http.response.start':
+                headers = MutableHeaders(raw=message['headers'])
+                if scope.get('endpoint') is not flask_wsgi and encoding.compression.compressible(headers.get('content-type')):
+                    headers.add_vary_header('Accept-Encoding')
+                    status = message['status']
+                    if 200 <= status and status not in (204, 206, 304) and 'content-encoding' not in headers:
+                        coding = encoding.compression.choose(accept_encoding, headers.get('content-type'))
+                if coding is None:
+                    await send(message)
+                else:
+                    # Held back until the first body message shows whether the body is worth compressing
+                    start = message
+                return
+            if message['type'] != 'http.response.body' or coding is None:
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            if start is not None:
+                headers = MutableHeaders(raw=start['headers'])
+                if not more_body and len(body) < encoding.compression.min_size:
+                    coding = None
+                    await send(start)
+                    await send(message)
+                    return
+                headers['content-encoding'] = coding
+                etag = headers.get('etag')
+                if etag and not etag.startswith('W/'):
+                    headers['etag'] = f'W/{etag}'
+                if more_body:
+                    del headers['content-length']
+                    compressor = encoding.compression.compressor(coding)
+                else:
+                    body = encoding.compression.compress(body, coding)
+                    headers['content-length'] = str(len(body))
+                    await send(start)
+                    await send({'type': 'http.response.body', 'body': body})
+                    start = None
+                    return
+                await send(start)
+                start = None
+
+            data = compressor.compress(body)
+            if not more_body:
+                data += compressor.flush()
+            await send({'type': 'http.response.body', 'body': data, 'more_body': more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Motor binds to the running loop, so the client is created here rather than at import
+    db.init_app(flask_app)
+    logger.info('asgi_started')
+    try:
+        yield
+    finally:
+        db.mongo.close()
+
+
+# The fallthrough routes are short requests (health, metrics, debug); each holds one of these threads while it runs
+flask_wsgi = WSGIMiddleware(flask_app, workers=int(os.environ.get('ASGI_WSGI_THREADS', 10)))
+
+app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/register', register, methods=['POST']),
+        Route('/login', login, methods=['POST']),
+        Route('/token/refresh', refresh_token, methods=['POST']),
+        Route('/appointments', create_appointment, methods=['POST']),
+        # Registered before /appointments/{user_id}
+        Route('/appointments/stream', stream_appointment_events, methods=['GET']),
+        Route('/appointments/bulk-status', bulk_update_appointment_status, methods=['PUT']),
+        Route('/appointments/{user_id}', get_user_appointments, methods=['GET']),
+        Route('/appointments/{appointment_id}/status', update_appointment_status, methods=['PUT']),
+        Route('/stats/appointments', get_appointment_stats, methods=['GET']),
+        Route('/availability', get_availability, methods=['GET']),
+        Route('/all-appointments', get_all_appointments, methods=['GET']),
+        Route('/user/profile', flask_wsgi),
+        Route('/user/{user_id}', get_user_profile, methods=['GET']),
+        Mount('/', app=flask_wsgi),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'], expose_headers=['ETag', 'Server-Timing']),
+        Middleware(RequestMetrics),
+        Middleware(CompressResponses)
+    ],
+    lifespan=lifespan
+)
+
+# Route templates as metric labels, so /appointments/<id> is one series rather than one per user
+ROUTE_PATHS = {route.endpoint: route.path for route in app.routes if isinstance(route, Route)}
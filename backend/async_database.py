@@ -0,0 +1,357 @@
+"""Motor (asyncio) counterparts of the database.py operations the native ASGI routes call.
+
+Only those operations are mirrored; routes served through the Flask
+fallthrough, startup checks and debug helpers use database.py alone.
+
+Queries, pipelines, validation and event payloads come from database.py's
+public helpers, so both serving stacks read and write the same documents and
+only the awaits differ; the user cache, version stamps, slot bookkeeping and
+event broker are shared in-process.
+"""
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+import uuid
+from bson import ObjectId
+from models import User, Appointment
+from log import get_logger
+from cache import user_cache, MISSING
+from database import (
+    DEFAULT_COUNSELOR_ID, STATS_ID, STATUS_PREIMAGE_PROJECTION, APPOINTMENT_PAGE_MAX,
+    DuplicateUserError, AppointmentPage, appointments_version, bump_appointments_version,
+    duplicate_key_field, user_id_key, username_key, id_number_key, cache_user,
+    slot_id, has_slot, booked_per_time_pipeline, slot_documents, resized_slots_filter, resize_slots_update, only_duplicate_keys, ensured_slot_days,
+    insert_increments, stats_view, created_event,
+    status_deltas, slot_change_for, slot_of, publish_status_change, validate_bulk_updates,
+    plan_bulk_updates, applied_bulk_updates, BULK_REREAD_PROJECTION, finish_bulk_updates, appointments_with_user_details_pipeline,
+    user_appointments_filter, id_match, ids_match, user_ids_query, attach_user_info, USER_INFO_PROJECTION,
+    status_transition_filter, status_transition_update, status_revert_update, transition_error, transition_preimage,
+    serialize_appointment_with_user
+)
+import config
+import database
+import events
+import metrics
+
+logger = get_logger(__name__)
+
+
+class AsyncMongo:
+    """Motor counterpart of flask_pymongo.PyMongo; create it inside the running event loop"""
+
+    def __init__(self):
+        self.cx = None
+        self.db = None
+        self.read_databases = {}
+
+    def init_app(self, app):
+        try:
+            from motor.motor_asyncio import AsyncIOMotorClient
+        except ImportError:
+            raise RuntimeError('The ASGI app needs the motor package')
+        self.cx = AsyncIOMotorClient(
+            app.config['MONGO_URI'],
+            event_listeners=[metrics.command_timer],
+            **config.client_options(app.config)
+        )
+        self.db = self.cx.get_default_database()
+        self.read_databases = {}
+        for operation in config.READ_OPERATIONS:
+            options = config.read_options(app.config, operation)
+            if options:
+                self.read_databases[operation] = self.db.with_options(**options)
+
+    def reads(self, operation):
+        """Database to read with for an operation class of config.READ_OPERATIONS"""
+        return self.read_databases.get(operation, self.db)
+
+    def close(self):
+        if self.cx is not None:
+            self.cx.close()
+            self.cx = self.db = None
+            self.read_databases = {}
+
+
+mongo = AsyncMongo()
+
+
+def init_app(app):
+    """Connect Motor; the sync data layer has already created indexes and slot settings"""
+    mongo.init_app(app)
+
+
+async def _find_user_cached(index_key, query):
+    user_id = user_cache.get(index_key)
+    if user_id is not MISSING:
+        user_data = user_cache.get(user_id_key(user_id))
+        if user_data is not MISSING:
+            return user_data
+    user_data = await mongo.db.users.find_one(query)
+    if user_data:
+        cache_user(user_data)
+    return user_data
+
+
+async def insert_user(user):
+    try:
+        user_cache.invalidate(user_id_key(str(user._id)), username_key(user.username), id_number_key(user.id_number))
+        result = await mongo.db.users.insert_one(user.to_document())
+        logger.debug('user_inserted', user_id=str(result.inserted_id), username=user.username)
+        return str(result.inserted_id)
+    except DuplicateKeyError as e:
+        field = duplicate_key_field(e)
+        logger.info('user_duplicate', field=field, username=user.username)
+        raise DuplicateUserError(field)
+    except Exception:
+        logger.error('user_insert_failed', exc_info=True, username=user.username)
+        return None
+
+
+async def find_user_by_username(username):
+    try:
+        user_data = await _find_user_cached(username_key(username), {'username': username})
+        return User.from_dict(user_data) if user_data else None
+    except Exception:
+        logger.error('user_lookup_failed', exc_info=True, by='username')
+        return None
+
+
+async def find_user_by_id(user_id):
+    try:
+        if not ObjectId.is_valid(user_id):
+            logger.debug('user_id_invalid', user_id=user_id)
+            return None
+        user_data = user_cache.get(user_id_key(user_id))
+        if user_data is MISSING:
+            user_data = await mongo.db.users.find_one({'_id': id_match(user_id)})
+            if user_data:
+                cache_user(user_data)
+        if user_data:
+            return User.from_dict(user_data)
+        logger.debug('user_not_found', user_id=user_id)
+        return None
+    except Exception:
+        logger.error('user_lookup_failed', exc_info=True, by='_id', user_id=user_id)
+        return None
+
+
+async def update_user_password_hash(user_id, password_hash):
+    try:
+        result = await mongo.db.users.update_one({'_id': id_match(user_id)}, {'$set': {'password_hash': password_hash}})
+        user_cache.invalidate(user_id_key(str(user_id)))
+        return result.modified_count > 0
+    except Exception:
+        logger.error('password_hash_update_failed', exc_info=True, user_id=str(user_id))
+        return False
+
+
+async def ensure_day_slots(date, counselor_id=None):
+    counselor_id = counselor_id or DEFAULT_COUNSELOR_ID
+    if (counselor_id, date) in ensured_slot_days:
+        return
+
+    booked_rows = await mongo.db.appointments.aggregate(booked_per_time_pipeline(date, counselor_id)).to_list(None)
+    try:
+        await mongo.db.slots.insert_many(slot_documents(date, counselor_id, booked_rows), ordered=False)
+    except BulkWriteError as e:
+        if not only_duplicate_keys(e):
+            raise
+        await mongo.db.slots.update_many(resized_slots_filter(date, counselor_id), resize_slots_update())
+    ensured_slot_days.add((counselor_id, date))
+
+
+async def reserve_slot(date, preferred_time, counselor_id=None):
+    if not has_slot(preferred_time):
+        return True
+    await ensure_day_slots(date, counselor_id)
+    slot = await mongo.db.slots.find_one_and_update(
+        {'_id': slot_id(date, preferred_time, counselor_id), 'remaining': {'$gt': 0}},
+        {'$inc': {'remaining': -1, 'booked': 1}},
+        projection={'_id': 1}
+    )
+    return slot is not None
+
+
+async def release_slot(date, preferred_time, counselor_id=None):
+    if not has_slot(preferred_time):
+        return
+    await mongo.db.slots.update_one(
+        {'_id': slot_id(date, preferred_time, counselor_id), 'booked': {'$gt': 0}},
+        {'$inc': {'remaining': 1, 'booked': -1}}
+    )
+
+
+async def book_appointment(appointment):
+    """Reserve the appointment's slot and insert it; returns (inserted_id, error)"""
+    holds_slot = Appointment.holds_slot(appointment.status)
+    try:
+        if holds_slot and not await reserve_slot(appointment.date, appointment.preferred_time, appointment.counselor_id):
+            logger.info('slot_full', date=appointment.date, preferred_time=appointment.preferred_time)
+            return None, 'slot_full'
+    except Exception:
+        logger.error('slot_reserve_failed', exc_info=True, date=appointment.date)
+        return None, 'error'
+
+    result = await insert_appointment(appointment)
+    if not result and holds_slot:
+        await release_slot(appointment.date, appointment.preferred_time, appointment.counselor_id)
+        return None, 'error'
+    return result, None
+
+
+async def _record_stats(increments):
+    increments = {field: delta for field, delta in increments.items() if delta}
+    if not increments:
+        return
+    try:
+        await mongo.db.stats.update_one({'_id': STATS_ID}, {'$inc': increments}, upsert=True)
+    except Exception:
+        logger.error('stats_update_failed', exc_info=True)
+
+
+async def get_appointment_stats():
+    return stats_view(await mongo.db.stats.find_one({'_id': STATS_ID}))
+
+
+async def insert_appointment(appointment):
+    try:
+        result = await mongo.db.appointments.insert_one(appointment.to_document())
+        bump_appointments_version(appointment.user_id)
+        await _record_stats(insert_increments(appointment))
+        events.notify('appointment_created', created_event(appointment))
+        logger.debug('appointment_inserted', appointment_id=str(result.inserted_id), user_id=appointment.user_id)
+        return result.inserted_id
+    except Exception:
+        logger.error('appointment_insert_failed', exc_info=True, user_id=appointment.user_id)
+        return None
+
+
+async def find_appointment_rows_by_user_id(user_id, start=None, end=None):
+    try:
+        cursor = mongo.db.appointments.find(user_appointments_filter(user_id, start, end)).sort('slot_start', -1)
+        documents = await cursor.to_list(None)
+        rows = Appointment.serialize_documents(documents)
+        logger.debug('user_appointments_found', user_id=user_id, count=len(rows))
+        return rows
+    except Exception:
+        logger.error('user_appointments_lookup_failed', exc_info=True, user_id=user_id)
+        return []
+
+
+async def transition_appointment_status(appointment_id, new_status, expected_version=None):
+    if not Appointment.is_valid_status(new_status):
+        return None, "Invalid status value"
+    try:
+        updated = await mongo.db.appointments.find_one_and_update(
+            status_transition_filter(appointment_id, new_status, expected_version),
+            status_transition_update(new_status),
+            return_document=ReturnDocument.AFTER
+        )
+        if not updated:
+            current = await mongo.db.appointments.find_one({'_id': id_match(appointment_id)}, {'status': 1})
+            error = transition_error(current, new_status)
+            logger.debug('appointment_status_not_changed', appointment_id=appointment_id, status=new_status, error=error)
+            return None, error
+
+        previous = transition_preimage(updated)
+        slot_change = slot_change_for(previous, new_status)
+        if slot_change == 'release':
+            await release_slot(*slot_of(updated))
+        elif slot_change == 'reserve' and not await reserve_slot(*slot_of(updated)):
+            await mongo.db.appointments.update_one(
+                {'_id': updated['_id'], 'version': updated['version']},
+                status_revert_update(previous)
+            )
+            return None, "Selected time slot is fully booked"
+
+        await _record_stats(status_deltas([(previous['status'], new_status)]))
+        publish_status_change(appointment_id, previous, new_status)
+        logger.info('appointment_status_updated', appointment_id=appointment_id, status=new_status, version=updated['version'])
+        return Appointment.from_dict(updated), None
+
+    except Exception as e:
+        logger.error('appointment_status_update_failed', exc_info=True, appointment_id=appointment_id)
+        return None, f"Error updating appointment: {str(e)}"
+
+
+async def bulk_update_appointment_status(updates):
+    results, pending = validate_bulk_updates(updates)
+    if not pending:
+        return results
+
+    try:
+        current = {
+            str(apt['_id']): apt
+            async for apt in mongo.db.appointments.find({'_id': ids_match(pending)}, STATUS_PREIMAGE_PROJECTION)
+        }
+
+        write_id = uuid.uuid4().hex
+        operations = plan_bulk_updates(pending, current, write_id)
+        if not operations:
+            return results
+
+        write = await mongo.db.appointments.bulk_write(operations, ordered=False)
+        applied = set(pending)
+        if write.modified_count < len(operations):
+            reread = await mongo.db.appointments.find({'_id': ids_match(pending)}, BULK_REREAD_PROJECTION).to_list(None)
+            applied = applied_bulk_updates(pending, current, reread, write_id)
+
+        releases, increments = finish_bulk_updates(pending, current, applied)
+        for slot in releases:
+            await release_slot(*slot)
+        await _record_stats(increments)
+        logger.info('appointment_status_bulk_updated', requested=len(updates), updated=len(applied))
+    except Exception as e:
+        logger.error('appointment_status_bulk_update_failed', exc_info=True)
+        for result, _ in pending.values():
+            if not result['success']:
+                result['error'] = f"Error updating appointment: {str(e)}"
+
+    return results
+
+
+class AsyncAppointmentPage(AppointmentPage):
+    """AppointmentPage over a Motor cursor; iterate with `async for`"""
+
+    def __init__(self, cursor, limit=None):
+        super().__init__(aiter(cursor), limit=limit)
+        self._first = None
+
+    async def start(self):
+        """Run the query and buffer its first document, so errors surface before streaming"""
+        self._first = await anext(self._cursor, None)
+        return self
+
+    async def __aiter__(self):
+        apt, self._first = self._first, None
+        while apt is not None:
+            self._last = apt
+            self.count += 1
+            yield serialize_appointment_with_user(apt)
+            apt = await anext(self._cursor, None)
+
+
+async def _joined_in_app(cursor, users_collection, batch_size=APPOINTMENT_PAGE_MAX):
+    batch = []
+    async for apt in cursor:
+        batch.append(apt)
+        if len(batch) == batch_size:
+            users = await users_collection.find(user_ids_query(batch), USER_INFO_PROJECTION).to_list(None)
+            for joined in attach_user_info(batch, users):
+                yield joined
+            batch = []
+    if batch:
+        users = await users_collection.find(user_ids_query(batch), USER_INFO_PROJECTION).to_list(None)
+        for joined in attach_user_info(batch, users):
+            yield joined
+
+
+async def iter_appointments_with_user_details(limit=None, after=None, start=None, end=None):
+    """Started AsyncAppointmentPage; Motor runs the aggregate lazily, so the first batch is awaited here as pymongo does"""
+    # The join mode is configured through database.init_app
+    join = database.APPOINTMENT_USER_JOIN
+    db = mongo.reads('lists')
+    pipeline = appointments_with_user_details_pipeline(limit=limit, after=after, start=start, end=end, join=join)
+    cursor = db.appointments.aggregate(pipeline)
+    if join == 'app':
+        cursor = _joined_in_app(cursor, db.users)
+    return await AsyncAppointmentPage(cursor, limit=limit).start()
@@ -0,0 +1,127 @@
+import threading
+import time
+from datetime import date as Date, timedelta
+import database
+import events
+from log import get_logger
+from models import Appointment
+
+logger = get_logger(__name__)
+
+MAX_RANGE_DAYS = 366
+
+
+class AvailabilityIndex:
+    """Booked seats per counselor-day, one count per bookable time.
+
+    Built with one scan of the appointments collection, then kept
+    current from appointment events, so availability queries never touch
+    the database. Holding appointments are remembered by id so a status
+    event can be applied without knowing the previous status.
+    """
+
+    def __init__(self, slot_times=(), capacity=1):
+        self._lock = threading.Lock()
+        self.configure(slot_times, capacity)
+
+    def configure(self, slot_times, capacity):
+        with self._lock:
+            self.slot_times = list(slot_times)
+            self.capacity = capacity
+            self._positions = {t: i for i, t in enumerate(self.slot_times)}
+            self._booked = {}
+            self._holding = {}
+
+    def _add(self, booked, holding, appointment_id, counselor_id, date, preferred_time):
+        position = self._positions.get(preferred_time)
+        if position is None or not date:
+            return
+        key = (counselor_id or database.DEFAULT_COUNSELOR_ID, date)
+        counts = booked.get(key)
+        if counts is None:
+            counts = booked[key] = [0] * len(self.slot_times)
+        counts[position] += 1
+        holding[appointment_id] = (key, position)
+
+    def rebuild(self, appointments):
+        """Replace the index from an iterable of appointment documents (a single collection scan)"""
+        booked, holding = {}, {}
+        for apt in appointments:
+            if Appointment.holds_slot(apt.get('status', 'Pending')):
+                self._add(booked, holding, str(apt['_id']), apt.get('counselor_id'), apt.get('date'), apt.get('preferred_time'))
+        with self._lock:
+            self._booked, self._holding = booked, holding
+        logger.info('availability_index_rebuilt', days=len(booked), appointments=len(holding))
+
+    def apply_event(self, event):
+        """Update the index from an appointment_created / appointment_status_changed event"""
+        apt = event.get('appointment') or {}
+        appointment_id = str(apt.get('_id'))
+        holds = Appointment.holds_slot(apt.get('status') or 'Pending')
+        with self._lock:
+            current = self._holding.get(appointment_id)
+            if holds and current is None:
+                self._add(self._booked, self._holding, appointment_id, apt.get('counselor_id'), apt.get('date'), apt.get('preferred_time'))
+            elif not holds and current is not None:
+                key, position = self._holding.pop(appointment_id)
+                self._booked[key][position] -= 1
+
+    def free_slots(self, start, days=1, counselor_id=None):
+        """Free seats per day from `start` (a date) for `days` days: [{'date', 'free': [...]}]"""
+        counselor_id = counselor_id or database.DEFAULT_COUNSELOR_ID
+        empty = [0] * len(self.slot_times)
+        result = []
+        with self._lock:
+            for offset in range(days):
+                day = (start + timedelta(days=offset)).isoformat()
+                counts = self._booked.get((counselor_id, day), empty)
+                result.append({
+                    'date': day,
+                    'free': [
+                        {'preferred_time': preferred_time, 'remaining': self.capacity - count}
+                        for preferred_time, count in zip(self.slot_times, counts)
+                        if count < self.capacity
+                    ]
+                })
+        return result
+
+
+index = AvailabilityIndex()
+_subscribed = False
+_refresher = None
+
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD query parameter, raises ValueError"""
+    return Date.fromisoformat(value)
+
+
+def rebuild_index():
+    index.rebuild(database.mongo.db.appointments.find(
+        {'status': {'$nin': list(Appointment.SLOT_RELEASING_STATUSES)}},
+        {'counselor_id': 1, 'date': 1, 'preferred_time': 1, 'status': 1}
+    ))
+
+
+def _refresh_periodically(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            rebuild_index()
+        except Exception:
+            logger.error('availability_index_rebuild_failed', exc_info=True)
+
+
+def init_app(app):
+    """Build the index and subscribe it to appointment events; call after database.init_app"""
+    global _subscribed, _refresher
+    index.configure(database.SLOT_TIMES, database.SLOT_CAPACITY)
+    rebuild_index()
+    if not _subscribed:
+        events.broker.add_listener(index.apply_event)
+        _subscribed = True
+    # Periodic rebuild bounds drift from events missed while the change stream was down
+    interval = app.config.get('AVAILABILITY_REBUILD_SECONDS', 300)
+    if interval and _refresher is None:
+        _refresher = threading.Thread(target=_refresh_periodically, args=(interval,), name='availability-refresh', daemon=True)
+        _refresher.start()
@@ -0,0 +1,78 @@
+"""Benchmarks and load tests; run from backend/ with `python -m bench.<name>`.
+
+Set BENCH_MONGO_URI to run against a real mongod (required for meaningful
+concurrency results). Without it the in-process mongomock stand-in is used.
+"""
+import os
+import secrets
+from flask import Flask
+import database
+
+
+def _bench_uri(db_name):
+    return os.environ['BENCH_MONGO_URI'].rstrip('/') + '/' + db_name
+
+
+def bench_app(db_name='tupt_bench'):
+    """Flask app wired to the benchmark database, which is emptied first"""
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'bench'
+    if using_real_mongo():
+        app.config['MONGO_URI'] = _bench_uri(db_name)
+        database.init_app(app)
+        database.mongo.cx.drop_database(db_name)
+        database.ensure_indexes()
+    else:
+        import mongomock
+        _patch_mongomock_bulk_write()
+        client = mongomock.MongoClient()
+        database.mongo.cx = client
+        database.mongo.db = client[db_name]
+        database.ensure_indexes()
+    return app
+
+
+def _patch_mongomock_bulk_write():
+    """mongomock's bulk builder predates the `sort` argument newer pymongo passes to it"""
+    from mongomock.collection import BulkOperationBuilder
+    add_update = BulkOperationBuilder.add_update
+    if getattr(add_update, 'accepts_sort', False):
+        return
+
+    def add_update_ignoring_sort(self, *args, sort=None, **kwargs):
+        return add_update(self, *args, **kwargs)
+
+    add_update_ignoring_sort.accepts_sort = True
+    BulkOperationBuilder.add_update = add_update_ignoring_sort
+
+
+def using_real_mongo():
+    return bool(os.environ.get('BENCH_MONGO_URI'))
+
+
+def load_app(db_name='tupt_bench', **settings):
+    """The full app from create_app() on the database bench_app() prepared.
+
+    Call bench_app() and seed first. `settings` are environment variables for
+    create_app (SLOT_CAPACITY='3', ...). Against BENCH_MONGO_URI the app opens
+    its own client like a deployment would; on the mongomock stand-in it keeps
+    bench_app's client and runs without background threads, since mongomock
+    is not thread-safe.
+    """
+    os.environ.setdefault('LOG_LEVEL', 'ERROR')
+    os.environ.setdefault('SECRET_KEY', secrets.token_urlsafe(32))
+    os.environ['MONGO_DB_NAME'] = db_name
+    if using_real_mongo():
+        os.environ['MONGO_URI'] = _bench_uri(db_name)
+    else:
+        os.environ['MONGO_URI'] = f'mongodb://localhost/{db_name}'
+        os.environ.update(HEALTH_CHECK_SECONDS='0', AVAILABILITY_REBUILD_SECONDS='0', STATS_RECONCILE_SECONDS='0', EVENTS_CHANGE_STREAM='false')
+        client, db = database.mongo.cx, database.mongo.db
+
+        def keep_stand_in(app, **kwargs):
+            database.mongo.cx, database.mongo.db = client, db
+
+        database.mongo.init_app = keep_stand_in
+    os.environ.update(settings)
+    from app import create_app
+    return create_app()
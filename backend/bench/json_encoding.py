@@ -0,0 +1,96 @@
+"""JSON encoding and compression throughput for /all-appointments sized payloads.
+
+    python -m bench.json_encoding --rows 100 1000 10000 50000
+
+Compares Flask's default provider (sorted keys, ASCII escapes, stdlib json)
+with encoding.JSONProvider on the standard library and on orjson, then the
+cost and ratio of each response compression on the encoded body. No database
+is involved.
+"""
+import argparse
+import gc
+import random
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+import encoding
+
+CONCERNS = ('Academic', 'Career', 'Personal', 'Financial', 'Mental Health')
+STATUSES = ('Pending', 'Approved', 'Rejected')
+TIMES = ('08:00 AM', '09:00 AM', '10:00 AM', '01:00 PM', '02:00 PM', '03:00 PM')
+
+
+def make_payload(rows):
+    """Response body of /all-appointments with `rows` appointments joined to their users"""
+    rng = random.Random(rows)
+    start = datetime(2025, 8, 1, 7, 30)
+    appointments = []
+    for i in range(rows):
+        created_at = start + timedelta(minutes=i * 7, seconds=rng.randrange(60))
+        appointments.append({
+            '_id': str(ObjectId()),
+            'user_id': str(ObjectId()),
+            'date': (start + timedelta(days=i % 120)).date().isoformat(),
+            'preferred_time': rng.choice(TIMES),
+            'concern_type': rng.choice(CONCERNS),
+            'status': rng.choice(STATUSES),
+            # Older documents hold datetimes, newer ones ISO strings
+            'created_at': created_at if i % 4 == 0 else created_at.isoformat(),
+            'user_info': {
+                'username': f'student{rng.randrange(100000):05d}',
+                'id_number': f'TUPT-{rng.randrange(10**6):06d}'
+            }
+        })
+    return {'message': 'All appointments retrieved successfully', 'appointments': appointments, 'next_cursor': None}
+
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 10000, 50000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    encoders = [('flask default', DefaultJSONProvider(app)), ('provider/json', encoding.JSONProvider(app, backend='json'))]
+    if encoding.orjson is not None:
+        encoders.append(('provider/orjson', encoding.JSONProvider(app, backend='orjson')))
+    else:
+        print('orjson is not installed; only the standard library is measured')
+
+    codings = [('gzip', 1), ('gzip', 6)] + ([('br', 4)] if encoding.brotli is not None else [])
+    if encoding.brotli is None:
+        print('brotli is not installed; only gzip is measured')
+
+    for rows in args.rows:
+        payload = make_payload(rows)
+        print(f'\n{rows} rows')
+        baseline = None
+        body = None
+        for name, provider in encoders:
+            body, elapsed = best_of(lambda: provider.dumps(payload, separators=(',', ':')).encode('utf-8'), args.repeat)
+            baseline = baseline or elapsed
+            print(f'  {name:<18} {elapsed * 1000:8.2f} ms  {len(body) / elapsed / 1e6:7.1f} MB/s  '
+                  f'{rows / elapsed / 1000:8.1f} k rows/s  {baseline / elapsed:4.1f}x')
+
+        for coding, level in codings:
+            encoding.compression.configure([coding], gzip_level=level, brotli_quality=level)
+            compressed, elapsed = best_of(lambda: encoding.compression.compress(body, coding), args.repeat)
+            print(f'  {coding + " " + str(level):<18} {elapsed * 1000:8.2f} ms  {len(body) / elapsed / 1e6:7.1f} MB/s  '
+                  f'{len(body) / 1024:8.0f} KiB -> {len(compressed) / 1024:.0f} KiB ({len(body) / len(compressed):.1f}x smaller)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,351 @@
+"""Load test: realistic traffic mixes against the full app at a fixed concurrency.
+
+    python -m bench.load --scenario admin_lists --appointments 100000 --concurrency 16 --duration 30
+    BENCH_MONGO_URI=mongodb://localhost:27017 python -m bench.load --scenario mixed --concurrency 64
+    BENCH_MONGO_URI=mongodb://localhost:27017 python -m bench.load --seed-only
+    python -m bench.load --scenario booking_storm --url http://127.0.0.1:8000 --concurrency 128
+
+Seeds users and appointments, boots create_app() on them (bench.load_app) and
+drives it through the Flask test client from --concurrency threads. With --url
+the same traffic goes over HTTP to a server that is already running; seed its
+database first with --seed-only, then start it with MONGO_URI pointing at
+<BENCH_MONGO_URI>/tupt_bench. A --url run touches no database itself: seeded ids
+are derived from the row number, so it only needs the --users and
+--appointments the seeding run was given.
+
+The student and admin requests carry session tokens signed in the bench
+process; with --url it signs with the SECRET_KEY in its environment, which
+must match the server's.
+
+Per operation it reports throughput, p50/p95/p99 latency, MongoDB round trips
+per request (from the Server-Timing header) and the status codes seen; --json
+writes the same numbers to a file for comparing runs. The mongomock stand-in is
+single-threaded and has no wire protocol, so its latencies are only a smoke
+test and round trips are not counted; use BENCH_MONGO_URI for real numbers.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from urllib.parse import urlsplit
+from bson import ObjectId
+import database
+import passwords
+import tokens
+from bench import bench_app, load_app, using_real_mongo
+from models import User
+
+PASSWORD = 'bench-password'
+CONCERNS = ('Academic', 'Career', 'Personal', 'Financial', 'Mental Health')
+STATUSES = ('Pending', 'Approved', 'Rejected', 'Cancelled', 'Completed')
+FIRST_DAY = date(2026, 1, 5)
+SEEDED_DAYS = 180
+# Bookings land after the seeded history, on days whose slots are still free
+BOOKING_DAYS = 20
+
+# Operation weights per scenario
+SCENARIOS = {
+    'login_burst': {'login': 1.0},
+    'booking_storm': {'book': 0.9, 'availability': 0.1},
+    'admin_lists': {'admin_list': 0.5, 'admin_range': 0.2, 'admin_page': 0.2, 'stats': 0.1},
+    'mixed': {
+        'login': 0.1, 'book': 0.15, 'own_list': 0.35, 'admin_list': 0.1, 'admin_page': 0.05,
+        'review': 0.05, 'stats': 0.1, 'availability': 0.1
+    },
+}
+
+# Leading 8 hex digits of the seeded ids; the rest is the row number
+USER_ID_PREFIX = 'be0c0001'
+APPOINTMENT_ID_PREFIX = 'be0c0002'
+
+ROUND_TRIPS = re.compile(r'desc="(\d+) round trips"')
+
+
+def seeded_ids(users, appointments):
+    """(user ids, appointment ids) of a seeded database, the same in every run for the same sizes"""
+    return (
+        [ObjectId(f'{USER_ID_PREFIX}{i:016x}') for i in range(users)],
+        [ObjectId(f'{APPOINTMENT_ID_PREFIX}{i:016x}') for i in range(appointments)]
+    )
+
+
+def seed(users, appointments):
+    """Insert users (all with PASSWORD) and appointments; returns (user ids, appointment ids)"""
+    rng = random.Random(0)
+    password_hash = User.set_password(PASSWORD)
+    user_ids, appointment_ids = seeded_ids(users, appointments)
+    for offset in range(0, users, 10000):
+        database.mongo.db.users.insert_many([
+            {
+                '_id': user_ids[i], 'username': f'bench{i:06d}', 'id_number': f'TUPT-{i:06d}',
+                'birthdate': '2004-01-01', 'password_hash': password_hash, 'role': 'user',
+                'created_at': datetime(2025, 8, 1)
+            }
+            for i in range(offset, min(offset + 10000, users))
+        ])
+
+    documents = []
+    for i in range(appointments):
+        day = FIRST_DAY + timedelta(days=rng.randrange(SEEDED_DAYS))
+        preferred_time = rng.choice(database.SLOT_TIMES)
+        documents.append({
+            '_id': appointment_ids[i],
+            'user_id': rng.choice(user_ids),
+            'date': day.isoformat(),
+            'preferred_time': preferred_time,
+            'slot_start': datetime.strptime(f'{day.isoformat()} {preferred_time}', '%Y-%m-%d %I:%M %p'),
+            'concern_type': rng.choice(CONCERNS),
+            'status': rng.choice(STATUSES),
+            'counselor_id': None,
+            'version': 0,
+            'created_at': datetime(2025, 12, 1) + timedelta(seconds=i)
+        })
+        if len(documents) == 10000:
+            database.mongo.db.appointments.insert_many(documents)
+            documents = []
+    if documents:
+        database.mongo.db.appointments.insert_many(documents)
+    return [str(_id) for _id in user_ids], [str(_id) for _id in appointment_ids]
+
+
+class TestClientTransport:
+    """Requests through the app's Flask test client, one client per thread"""
+
+    def __init__(self, app):
+        self._app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, token=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self._app.test_client()
+        headers = {'Authorization': f'Bearer {token}'} if token else None
+        response = client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_data(), response.headers.get('Server-Timing', '')
+
+
+class HTTPTransport:
+    """Requests over keep-alive HTTP connections, one connection per thread"""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self._host, self._port = parts.hostname, parts.port or 80
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, token=None):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection(self._host, self._port, timeout=30)
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        try:
+            connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = connection.getresponse()
+            return response.status, response.read(), response.getheader('Server-Timing', '')
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            self._local.connection = None
+            raise
+
+
+class Traffic:
+    """The operations a scenario mixes; each returns (method, path, body, session token or None)"""
+
+    def __init__(self, user_ids, appointment_ids, rng, signer):
+        self.user_ids = user_ids
+        self.appointment_ids = appointment_ids
+        self.rng = rng
+        self.signer = signer
+        self.admin_token = signer.issue(ObjectId(), 'admin')
+        self.admin_cursor = None
+
+    def login(self):
+        return 'POST', '/login', {'username': f'bench{self.rng.randrange(len(self.user_ids)):06d}', 'password': PASSWORD}, None
+
+    def book(self):
+        day = FIRST_DAY + timedelta(days=SEEDED_DAYS + self.rng.randrange(BOOKING_DAYS))
+        return 'POST', '/appointments', {
+            'user_id': self.rng.choice(self.user_ids),
+            'date': day.isoformat(),
+            'preferred_time': self.rng.choice(database.SLOT_TIMES),
+            'concern_type': self.rng.choice(CONCERNS)
+        }, None
+
+    def availability(self):
+        day = FIRST_DAY + timedelta(days=SEEDED_DAYS + self.rng.randrange(BOOKING_DAYS))
+        return 'GET', f'/availability?date={day.isoformat()}&range=7', None, None
+
+    def own_list(self):
+        user_id = self.rng.choice(self.user_ids)
+        return 'GET', f'/appointments/{user_id}', None, self.signer.issue(user_id, 'user')
+
+    def admin_list(self):
+        return 'GET', '/all-appointments?limit=100', None, self.admin_token
+
+    def admin_range(self):
+        start = FIRST_DAY + timedelta(days=self.rng.randrange(SEEDED_DAYS - 7))
+        return 'GET', f'/all-appointments?limit=100&from={start.isoformat()}&to={(start + timedelta(days=6)).isoformat()}', None, self.admin_token
+
+    def admin_page(self):
+        # Keeps paging where this worker's last page ended, starting over at the end
+        if self.admin_cursor:
+            return 'GET', f'/all-appointments?limit=100&cursor={self.admin_cursor}', None, self.admin_token
+        return self.admin_list()
+
+    def review(self):
+        return 'PUT', f'/appointments/{self.rng.choice(self.appointment_ids)}/status', {'status': self.rng.choice(('Approved', 'Rejected'))}, self.admin_token
+
+    def stats(self):
+        return 'GET', '/stats/appointments', None, None
+
+    def observe(self, operation, status, body):
+        if operation in ('admin_list', 'admin_page') and status == 200:
+            self.admin_cursor = json.loads(body).get('next_cursor')
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def run(transport, scenario, user_ids, appointment_ids, concurrency, duration, signer):
+    """Drive the scenario from `concurrency` threads for `duration` seconds; returns per-operation samples"""
+    operations, weights = zip(*SCENARIOS[scenario].items())
+    samples = defaultdict(list)
+    statuses = defaultdict(Counter)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(seed):
+        traffic = Traffic(user_ids, appointment_ids, random.Random(seed), signer)
+        local_samples, local_statuses = defaultdict(list), defaultdict(Counter)
+        while time.perf_counter() < deadline:
+            operation = traffic.rng.choices(operations, weights)[0]
+            method, path, body, token = getattr(traffic, operation)()
+            started = time.perf_counter()
+            try:
+                status, response_body, server_timing = transport.request(method, path, body, token)
+            except Exception as e:
+                local_statuses[operation][type(e).__name__] += 1
+                continue
+            elapsed = time.perf_counter() - started
+            match = ROUND_TRIPS.search(server_timing)
+            local_samples[operation].append((elapsed, int(match.group(1)) if match else None))
+            local_statuses[operation][status] += 1
+            traffic.observe(operation, status, response_body)
+        with lock:
+            for operation, values in local_samples.items():
+                samples[operation].extend(values)
+            for operation, counts in local_statuses.items():
+                statuses[operation].update(counts)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, statuses, time.perf_counter() - started
+
+
+def summarize(samples, statuses, elapsed, count_round_trips=True):
+    """Per-operation report rows plus an 'all' row"""
+    report = {}
+    everything = []
+    for operation in sorted(set(samples) | set(statuses)):
+        values = samples.get(operation, [])
+        everything.extend(values)
+        report[operation] = _summary(values, elapsed, statuses[operation], count_round_trips)
+    report['all'] = _summary(everything, elapsed, sum(statuses.values(), Counter()), count_round_trips)
+    return report
+
+
+def _summary(values, elapsed, statuses, count_round_trips):
+    latencies = sorted(latency for latency, _ in values)
+    round_trips = [trips for _, trips in values if trips is not None]
+    return {
+        'requests': len(values),
+        'throughput': len(values) / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'round_trips': sum(round_trips) / len(round_trips) if round_trips and count_round_trips else None,
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)}
+    }
+
+
+def print_report(report):
+    print(f'{"operation":<14}{"requests":>9}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"trips":>7}  statuses')
+    for operation, row in report.items():
+        trips = f'{row["round_trips"]:.1f}' if row['round_trips'] is not None else 'n/a'
+        statuses = ' '.join(f'{status}:{count}' for status, count in row['statuses'].items())
+        print(f'{operation:<14}{row["requests"]:>9}{row["throughput"]:>9.1f}{row["p50_ms"]:>9.2f}'
+              f'{row["p95_ms"]:>9.2f}{row["p99_ms"]:>9.2f}{trips:>7}  {statuses}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='mixed')
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--appointments', type=int, default=100000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20, help='seconds of traffic')
+    parser.add_argument('--slot-capacity', type=int, default=3)
+    parser.add_argument('--bcrypt-rounds', type=int, default=12)
+    parser.add_argument('--rate-limit', action='store_true', help='keep admission control on; all in-process clients share one IP')
+    parser.add_argument('--url', help='drive an already running server instead of an in-process app')
+    parser.add_argument('--seed-only', action='store_true', help='seed the database and exit')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+    if args.url and not args.seed_only and not os.environ.get('SECRET_KEY'):
+        parser.error("--url signs session tokens with SECRET_KEY; set it to the server's")
+
+    if args.url and not args.seed_only:
+        # The server owns its database; seeding here would drop it under the running app
+        user_ids, appointment_ids = ([str(_id) for _id in ids] for ids in seeded_ids(args.users, args.appointments))
+        print(f'using the ids seeded for --users {args.users} --appointments {args.appointments}')
+    else:
+        bench_app()
+        passwords.hasher.configure(rounds=args.bcrypt_rounds)
+        started = time.perf_counter()
+        user_ids, appointment_ids = seed(args.users, args.appointments)
+        print(f'seeded {args.users} users and {args.appointments} appointments in {time.perf_counter() - started:.1f} s')
+        if args.seed_only:
+            return
+
+    if args.url:
+        transport = HTTPTransport(args.url)
+        signer = tokens.SessionTokens()
+        signer.configure(os.environ['SECRET_KEY'])
+    else:
+        if not using_real_mongo():
+            print('warning: mongomock stand-in; latencies are a smoke test and round trips are not counted')
+        transport = TestClientTransport(load_app(
+            SLOT_CAPACITY=str(args.slot_capacity),
+            BCRYPT_ROUNDS=str(args.bcrypt_rounds),
+            BCRYPT_MAX_QUEUE=str(max(64, args.concurrency)),
+            RATE_LIMIT_ENABLED='true' if args.rate_limit else 'false'
+        ))
+        signer = tokens.session_tokens
+
+    samples, statuses, elapsed = run(transport, args.scenario, user_ids, appointment_ids, args.concurrency, args.duration, signer)
+    # mongomock never reaches the command listener, so its Server-Timing always says 0
+    report = summarize(samples, statuses, elapsed, count_round_trips=bool(args.url) or using_real_mongo())
+    print(f'{args.scenario}: {args.concurrency} clients for {elapsed:.1f} s')
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'scenario': args.scenario, 'concurrency': args.concurrency, 'duration': elapsed, 'operations': report}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
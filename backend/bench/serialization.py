@@ -0,0 +1,136 @@
+"""Per-row cost of turning appointment documents into JSON-ready dicts.
+
+    python -m bench.serialization --rows 100000
+
+Compares the original models (hydrate a UserMixin-era Appointment per row,
+re-parse and strftime created_at) with the __slots__ model and with the bulk
+serializer the list endpoints use. No database is involved.
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from bson import ObjectId
+from models import Appointment
+
+
+class LegacyAppointment:
+    """The Appointment model as it was before __slots__ and cached created_at fields, with today's fields"""
+
+    def __init__(self, user_id, date, preferred_time, concern_type, status="Pending", _id=None, created_at=None, counselor_id=None, version=0):
+        self.user_id = user_id
+        self.date = date
+        self.preferred_time = preferred_time
+        self.concern_type = concern_type
+        self.status = status
+        self._id = _id or ObjectId()
+        self.created_at = created_at or datetime.utcnow()
+        self.counselor_id = counselor_id
+        self.version = version
+
+    def to_dict(self):
+        current_created_at = self.created_at
+        if isinstance(current_created_at, str):
+            try:
+                current_created_at = datetime.fromisoformat(current_created_at.replace('Z', '+00:00'))
+            except (ValueError, AttributeError):
+                current_created_at = datetime.utcnow()
+        formatted_created_at = current_created_at.strftime('%B %d, %Y at %I:%M %p')
+        return {
+            'user_id': self.user_id,
+            'date': self.date,
+            'preferred_time': self.preferred_time,
+            'concern_type': self.concern_type,
+            'status': self.status,
+            'counselor_id': self.counselor_id,
+            'version': self.version,
+            '_id': str(self._id),
+            'created_at': current_created_at.isoformat() if isinstance(current_created_at, datetime) else current_created_at,
+            'formatted_created_at': formatted_created_at
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        _id = data.get('_id')
+        if _id and not isinstance(_id, ObjectId):
+            _id = ObjectId(_id)
+        created_at = data.get('created_at')
+        if created_at and isinstance(created_at, str):
+            try:
+                created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+            except (ValueError, AttributeError):
+                created_at = datetime.utcnow()
+        return cls(
+            user_id=data['user_id'],
+            date=data['date'],
+            preferred_time=data['preferred_time'],
+            concern_type=data['concern_type'],
+            status=data.get('status', 'Pending'),
+            _id=_id,
+            created_at=created_at,
+            counselor_id=data.get('counselor_id'),
+            version=data.get('version', 0)
+        )
+
+
+def make_documents(rows):
+    """Documents shaped like the stored ones: string ids and ISO created_at strings"""
+    start = datetime(2025, 8, 1, 7, 30)
+    return [
+        {
+            '_id': str(ObjectId()),
+            'user_id': str(ObjectId()),
+            'date': (start + timedelta(days=i % 120)).date().isoformat(),
+            'preferred_time': '10:00 AM',
+            'concern_type': 'Academic',
+            'status': 'Pending',
+            'counselor_id': None,
+            'version': i % 3,
+            'created_at': (start + timedelta(minutes=i * 7, microseconds=i % 1000 + 1)).isoformat()
+        }
+        for i in range(rows)
+    ]
+
+
+def measure(name, fn, documents, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = fn(documents)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f'{name:<28} {best * 1000:9.1f} ms  {best / len(documents) * 1e6:6.2f} us/row')
+    return result, best
+
+
+def object_size(cls, document):
+    tracemalloc.start()
+    objects = [cls.from_dict(document) for _ in range(10000)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return size / 10000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    documents = make_documents(args.rows)
+    legacy, legacy_time = measure('legacy from_dict+to_dict', lambda docs: [LegacyAppointment.from_dict(d).to_dict() for d in docs], documents, args.repeat)
+    hydrated, _ = measure('slots from_dict+to_dict', lambda docs: [Appointment.from_dict(d).to_dict() for d in docs], documents, args.repeat)
+    bulk, bulk_time = measure('bulk serialize_documents', Appointment.serialize_documents, documents, args.repeat)
+
+    if not legacy == hydrated == bulk:
+        raise SystemExit('serializers disagree')
+    print(f'bulk path is {legacy_time / bulk_time:.1f}x faster than legacy; outputs identical')
+    print(f'per-object memory: legacy {object_size(LegacyAppointment, documents[0]):.0f} B, '
+          f'slots {object_size(Appointment, documents[0]):.0f} B')
+
+
+if __name__ == '__main__':
+    main()
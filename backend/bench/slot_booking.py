@@ -0,0 +1,67 @@
+"""Booking storm: many concurrent clients race for a handful of slots; none may be overbooked.
+
+    python -m bench.slot_booking --clients 5000 --threads 128 --capacity 3
+"""
+import argparse
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import database
+from bench import bench_app, using_real_mongo
+from models import Appointment
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=64)
+    parser.add_argument('--capacity', type=int, default=3)
+    parser.add_argument('--date', default='2026-06-01')
+    args = parser.parse_args()
+
+    bench_app()
+    database.SLOT_CAPACITY = args.capacity
+    database.precompute_slots([args.date])
+    if not using_real_mongo():
+        print('warning: mongomock is not thread-safe; set BENCH_MONGO_URI for a real atomicity check')
+
+    def attempt(i):
+        appointment = Appointment(
+            user_id=f'bench-user-{i}',
+            date=args.date,
+            preferred_time=random.choice(database.SLOT_TIMES),
+            concern_type='Academic'
+        )
+        result, error = database.book_appointment(appointment)
+        return appointment.preferred_time, result is not None, error
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        outcomes = list(pool.map(attempt, range(args.clients)))
+    elapsed = time.perf_counter() - start
+
+    booked = Counter(slot for slot, ok, _ in outcomes if ok)
+    errors = Counter(error for _, ok, error in outcomes if not ok)
+    stored = Counter(apt['preferred_time'] for apt in database.mongo.db.appointments.find({'date': args.date}))
+    slots = {s['preferred_time']: s for s in database.mongo.db.slots.find({'date': args.date})}
+
+    overbooked = []
+    for preferred_time in database.SLOT_TIMES:
+        slot = slots[preferred_time]
+        if stored[preferred_time] > args.capacity or slot['booked'] != stored[preferred_time] or slot['remaining'] < 0:
+            overbooked.append(preferred_time)
+        print(f"{preferred_time}: booked={booked[preferred_time]} stored={stored[preferred_time]} "
+              f"counter={slot['booked']} remaining={slot['remaining']}")
+
+    print(f"{args.clients} attempts on {args.threads} threads in {elapsed:.2f}s "
+          f"({args.clients / elapsed:.0f} req/s); rejections: {dict(errors)}")
+    if overbooked:
+        print(f"OVERBOOKED: {', '.join(overbooked)}")
+        sys.exit(1)
+    print('no overbooking')
+
+
+if __name__ == '__main__':
+    main()
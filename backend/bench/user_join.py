@@ -0,0 +1,97 @@
+"""/all-appointments user join: $lookup in the aggregation vs. one $in query per page.
+
+    BENCH_MONGO_URI=mongodb://localhost:27017 python -m bench.user_join --users 5000 --appointments 50000 --limit 100
+
+Seeds users and appointments with ObjectId ids, then pages through every
+appointment in both APPOINTMENT_USER_JOIN modes and reports time per page,
+rows per second and MongoDB round trips per page. Both modes must return the
+same rows. Round trips are only counted against a real mongod.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+import database
+import metrics
+from bench import bench_app, using_real_mongo
+
+
+def seed(users, appointments):
+    rng = random.Random(0)
+    user_ids = [ObjectId() for _ in range(users)]
+    database.mongo.db.users.insert_many([
+        {'_id': _id, 'username': f'student{i:06d}', 'id_number': f'TUPT-{i:06d}', 'password_hash': 'x', 'role': 'user'}
+        for i, _id in enumerate(user_ids)
+    ])
+    start = datetime(2026, 1, 5, 8, 0)
+    documents = []
+    for i in range(appointments):
+        slot_start = start + timedelta(days=i % 120, hours=rng.randrange(8))
+        documents.append({
+            '_id': ObjectId(),
+            'user_id': rng.choice(user_ids),
+            'date': slot_start.date().isoformat(),
+            'preferred_time': slot_start.strftime('%I:%M %p'),
+            'slot_start': slot_start,
+            'concern_type': 'Academic',
+            'status': 'Pending',
+            'created_at': start
+        })
+        if len(documents) == 10000:
+            database.mongo.db.appointments.insert_many(documents)
+            documents = []
+    if documents:
+        database.mongo.db.appointments.insert_many(documents)
+
+
+def page_through(limit):
+    """All pages in order: (rows, seconds per page, round trips per page)"""
+    rows, timings, round_trips = [], [], []
+    after = None
+    while True:
+        stats = metrics.start_request()
+        started = time.perf_counter()
+        page = database.iter_appointments_with_user_details(limit=limit, after=after)
+        page_rows = list(page)
+        timings.append(time.perf_counter() - started)
+        round_trips.append(stats.round_trips)
+        rows.extend(page_rows)
+        if not page.next_cursor:
+            break
+        after = database.decode_appointment_cursor(page.next_cursor)
+    return rows, timings, round_trips
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--appointments', type=int, default=20000)
+    parser.add_argument('--limit', type=int, default=100)
+    args = parser.parse_args()
+
+    bench_app()
+    if not using_real_mongo():
+        print('warning: mongomock evaluates $lookup in Python; set BENCH_MONGO_URI for representative numbers')
+    seed(args.users, args.appointments)
+
+    results = {}
+    for join in ('lookup', 'app'):
+        database.APPOINTMENT_USER_JOIN = join
+        rows, timings, round_trips = page_through(args.limit)
+        results[join] = rows
+        timings.sort()
+        total = sum(timings)
+        trips = f'{sum(round_trips) / len(round_trips):.1f}' if using_real_mongo() else 'n/a'
+        print(f'{join:<7} {len(timings)} pages: median {timings[len(timings) // 2] * 1000:7.2f} ms/page, '
+              f'p95 {timings[int(len(timings) * 0.95)] * 1000:7.2f} ms/page, {len(rows) / total:9.0f} rows/s, '
+              f'{trips} round trips/page')
+
+    if results['lookup'] != results['app']:
+        raise SystemExit('join modes disagree')
+    missing = sum(1 for row in results['lookup'] if not row['user_info'])
+    print(f'both modes returned the same {len(results["lookup"])} rows; {missing} without user details')
+
+
+if __name__ == '__main__':
+    main()
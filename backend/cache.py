@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import OrderedDict
+from bson import json_util
+from log import get_logger
+
+logger = get_logger(__name__)
+
+MISSING = object()
+
+
+class MemoryBackend:
+    """In-process LRU cache with a per-entry TTL"""
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=MISSING):
+        ttl = self.ttl if ttl is MISSING else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Shared cache for several worker processes, values are stored as extended JSON"""
+
+    def __init__(self, url, ttl=300, prefix='tupt:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('CACHE_URL is set but the redis package is not installed')
+        self._client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.evictions = 0
+
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        if raw is None:
+            return MISSING
+        return json_util.loads(raw)
+
+    def set(self, key, value, ttl=MISSING):
+        ttl = self.ttl if ttl is MISSING else ttl
+        self._client.set(self.prefix + key, json_util.dumps(value), ex=ttl or None)
+
+    def delete(self, *keys):
+        if keys:
+            self._client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self):
+        keys = list(self._client.scan_iter(self.prefix + '*'))
+        if keys:
+            self._client.delete(*keys)
+
+    def size(self):
+        return None
+
+
+class Cache:
+    """Read-through front for a backend with hit/miss counters.
+
+    Backend failures are logged and treated as misses so the cache can never
+    take the database path down with it.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        try:
+            value = self.backend.get(key)
+        except Exception:
+            logger.error('cache_get_failed', exc_info=True, key=key)
+            value = MISSING
+        with self._lock:
+            if value is MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=MISSING):
+        try:
+            self.backend.set(key, value, ttl)
+        except Exception:
+            logger.error('cache_set_failed', exc_info=True, key=key)
+
+    def invalidate(self, *keys):
+        try:
+            self.backend.delete(*keys)
+        except Exception:
+            logger.error('cache_invalidate_failed', exc_info=True, keys=list(keys))
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for key, calling loader() on a miss; None results are not cached"""
+        value = self.get(key)
+        if value is not MISSING:
+            return value
+        value = loader()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'backend': type(self.backend).__name__,
+            'size': self.backend.size(),
+            'hits': hits,
+            'misses': misses,
+            'evictions': self.backend.evictions,
+            'hit_ratio': round(hits / total, 4) if total else 0.0
+        }
+
+
+user_cache = Cache(MemoryBackend())
+
+# Version stamps for conditional GETs. With several worker processes this must be
+# a shared backend, otherwise one worker cannot see another worker's bumps.
+version_cache = Cache(MemoryBackend(max_size=100000, ttl=None))
+
+
+def init_app(app):
+    ttl = app.config.get('USER_CACHE_TTL', 300)
+    if app.config.get('CACHE_URL'):
+        user_cache.backend = RedisBackend(app.config['CACHE_URL'], ttl=ttl)
+        version_cache.backend = RedisBackend(app.config['CACHE_URL'], ttl=None, prefix='tupt:version:')
+    else:
+        user_cache.backend = MemoryBackend(max_size=app.config.get('USER_CACHE_SIZE', 1024), ttl=ttl)
+        version_cache.backend = MemoryBackend(max_size=100000, ttl=None)
@@ -0,0 +1,161 @@
+"""MongoDB connection settings from the environment.
+
+MONGO_URI points the app at any deployment (a local mongod, a nearby replica
+set); without it the Atlas URI is built from MONGO_HOST, MONGO_USERNAME,
+MONGO_PASSWORD and MONGO_DB_NAME. Pool size, timeouts, wire compression and
+read preference / read concern come from the other MONGO_* variables and are
+handed to both the PyMongo and the Motor client.
+
+Reads are routed per operation class: 'default' covers everything, 'lists'
+the admin list behind /all-appointments, which tolerates replication lag and
+can be sent to secondaries with MONGO_LIST_READ_PREFERENCE=secondaryPreferred.
+Students' own lists stay on the default so they see their booking right away.
+"""
+import os
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+from log import get_logger
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import snappy
+except ImportError:
+    snappy = None
+
+logger = get_logger(__name__)
+
+ATLAS_HOST = 'cluster1.hcz8tdb.mongodb.net'
+
+READ_PREFERENCES = {
+    'primary': Primary,
+    'primaryPreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondaryPreferred': SecondaryPreferred,
+    'nearest': Nearest
+}
+READ_CONCERNS = ('local', 'available', 'majority', 'linearizable', 'snapshot')
+
+# app.config key -> MongoClient option, for the settings passed through unchanged
+CLIENT_OPTIONS = {
+    'MONGO_SERVER_SELECTION_TIMEOUT_MS': 'serverSelectionTimeoutMS',
+    'MONGO_CONNECT_TIMEOUT_MS': 'connectTimeoutMS',
+    'MONGO_SOCKET_TIMEOUT_MS': 'socketTimeoutMS',
+    'MONGO_WAIT_QUEUE_TIMEOUT_MS': 'waitQueueTimeoutMS',
+    'MONGO_MAX_IDLE_TIME_MS': 'maxIdleTimeMS'
+}
+
+# Operation class -> prefix of its MONGO_*READ_PREFERENCE, READ_CONCERN and MAX_STALENESS_SECONDS variables
+READ_OPERATIONS = {
+    'default': 'MONGO_',
+    'lists': 'MONGO_LIST_'
+}
+
+
+def mongo_uri():
+    """MONGO_URI if set, else the Atlas URI built from MONGO_HOST, MONGO_USERNAME, MONGO_PASSWORD and MONGO_DB_NAME"""
+    if os.environ.get('MONGO_URI'):
+        return os.environ['MONGO_URI']
+    host = os.environ.get('MONGO_HOST', ATLAS_HOST)
+    return f"mongodb+srv://{os.environ.get('MONGO_USERNAME')}:{os.environ.get('MONGO_PASSWORD')}@{host}/{os.environ.get('MONGO_DB_NAME')}?retryWrites=true&w=majority&appName=Cluster1"
+
+
+def _int_env(name, default=None):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def available_compressors(names):
+    """The requested wire compressors this process can use; zlib is built in, zstd and snappy need their packages"""
+    missing = {'zstd': zstandard is None, 'snappy': snappy is None}
+    unknown = set(names) - {'zstd', 'snappy', 'zlib'}
+    if unknown:
+        raise ValueError(f'Unsupported MONGO_COMPRESSORS: {", ".join(sorted(unknown))}')
+    return [name for name in names if not missing.get(name)]
+
+
+def read_settings(operation):
+    """(read preference, read concern, max staleness seconds) for an operation class from the environment"""
+    prefix = READ_OPERATIONS[operation]
+    return (
+        os.environ.get(f'{prefix}READ_PREFERENCE') or None,
+        os.environ.get(f'{prefix}READ_CONCERN') or None,
+        _int_env(f'{prefix}MAX_STALENESS_SECONDS')
+    )
+
+
+def init_app(app):
+    """Copy the MONGO_* environment into app.config"""
+    app.config['MONGO_URI'] = mongo_uri()
+    # Connection pool per process; MONGO_WARM_POOL connections are opened before serving
+    app.config['MONGO_MAX_POOL_SIZE'] = _int_env('MONGO_MAX_POOL_SIZE', 100)
+    app.config['MONGO_MIN_POOL_SIZE'] = _int_env('MONGO_MIN_POOL_SIZE', 0)
+    app.config['MONGO_WARM_POOL'] = _int_env('MONGO_WARM_POOL', app.config['MONGO_MIN_POOL_SIZE'])
+    # Unset timeouts keep the driver defaults
+    for key in CLIENT_OPTIONS:
+        app.config[key] = _int_env(key)
+    # Wire compression in order of preference, e.g. zstd,snappy,zlib; the server picks the first it supports
+    requested = [name.strip() for name in os.environ.get('MONGO_COMPRESSORS', '').split(',') if name.strip()]
+    app.config['MONGO_COMPRESSORS'] = available_compressors(requested)
+    if len(app.config['MONGO_COMPRESSORS']) < len(requested):
+        logger.warning('mongo_compressors_unavailable', requested=requested, using=app.config['MONGO_COMPRESSORS'])
+    app.config['MONGO_READS'] = {operation: read_settings(operation) for operation in READ_OPERATIONS}
+
+
+def read_preference(mode, max_staleness=None):
+    if mode not in READ_PREFERENCES:
+        raise ValueError(f'Unknown read preference {mode!r}, expected one of: {", ".join(READ_PREFERENCES)}')
+    if mode == 'primary':
+        return Primary()
+    return READ_PREFERENCES[mode](max_staleness=max_staleness if max_staleness is not None else -1)
+
+
+def read_concern(level):
+    if level not in READ_CONCERNS:
+        raise ValueError(f'Unknown read concern {level!r}, expected one of: {", ".join(READ_CONCERNS)}')
+    return ReadConcern(level)
+
+
+def client_options(config):
+    """MongoClient keyword arguments for the pool, timeouts, compression and default reads"""
+    options = {
+        'maxPoolSize': config.get('MONGO_MAX_POOL_SIZE', 100),
+        'minPoolSize': max(config.get('MONGO_MIN_POOL_SIZE', 0), config.get('MONGO_WARM_POOL', 0))
+    }
+    for key, option in CLIENT_OPTIONS.items():
+        if config.get(key) is not None:
+            options[option] = config[key]
+    if config.get('MONGO_COMPRESSORS'):
+        options['compressors'] = ','.join(config['MONGO_COMPRESSORS'])
+    mode, level, max_staleness = config.get('MONGO_READS', {}).get('default', (None, None, None))
+    if mode:
+        read_preference(mode)
+        options['readPreference'] = mode
+        if max_staleness is not None:
+            options['maxStalenessSeconds'] = max_staleness
+    if level:
+        read_concern(level)
+        options['readConcernLevel'] = level
+    return options
+
+
+def read_options(config, operation):
+    """with_options() keyword arguments for an operation class; empty when it uses the client defaults"""
+    mode, level, max_staleness = config.get('MONGO_READS', {}).get(operation, (None, None, None))
+    options = {}
+    if mode:
+        options['read_preference'] = read_preference(mode, max_staleness)
+    if level:
+        options['read_concern'] = read_concern(level)
+    return options
+
+
+def reads_primary(config, operation):
+    """Whether reads of an operation class always see the latest write"""
+    mode = (config.get('MONGO_READS', {}).get(operation) or (None,))[0]
+    if mode is None and operation != 'default':
+        return reads_primary(config, 'default')
+    return mode in (None, 'primary')
@@ -1,11 +1,230 @@
+"""PyMongo data layer behind the Flask routes.
+
+Besides the operations the routes call, the filters, pipelines, update
+documents, cache keys and result shaping the operations are built from are
+public: async_database.py builds the Motor counterparts from the same helpers,
+so only the I/O differs between the two serving stacks. Names with a leading
+underscore are internal to this module.
+"""
 from flask_pymongo import PyMongo
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+import base64
+import json
+import threading
+import uuid
+from datetime import datetime, timedelta
 from bson import ObjectId
-from models import User, Appointment
+from models import User, Appointment, object_id
+import config
+from log import get_logger
+from cache import user_cache, version_cache, MISSING
+import events
+import metrics
 
 mongo = PyMongo()
+logger = get_logger(__name__)
+
+# (collection, keys, options) for every index the query helpers below depend on
+INDEXES = [
+    ('users', [('username', ASCENDING)], {'name': 'username_unique', 'unique': True}),
+    ('users', [('id_number', ASCENDING)], {'name': 'id_number_unique', 'unique': True}),
+    ('appointments', [('user_id', ASCENDING), ('slot_start', DESCENDING)], {'name': 'user_id_slot_start'}),
+    ('appointments', [('slot_start', ASCENDING), ('_id', ASCENDING)], {'name': 'slot_start_id'}),
+    # Slot inventory counts match on the date string
+    ('appointments', [('date', ASCENDING), ('preferred_time', ASCENDING), ('_id', ASCENDING)], {'name': 'date_preferred_time_id'}),
+    ('appointments', [('created_at', DESCENDING)], {'name': 'created_at_desc'}),
+]
+
+# Bookable times per counselor per day, matching the times offered by the frontend
+SLOT_TIMES = ['08:00 AM', '09:00 AM', '10:00 AM', '11:00 AM', '01:00 PM', '02:00 PM', '03:00 PM', '04:00 PM']
+# Seats per slot when SLOT_CAPACITY is not configured: a single counselor on duty
+DEFAULT_SLOT_CAPACITY = 1
+SLOT_CAPACITY = DEFAULT_SLOT_CAPACITY
+DEFAULT_COUNSELOR_ID = 'default'
 
 def init_app(app):
-    mongo.init_app(app)
+    global SLOT_TIMES, SLOT_CAPACITY, APPOINTMENT_USER_JOIN, LIST_READS_PRIMARY
+    warm = app.config.get('MONGO_WARM_POOL', 0)
+    # A client made before fork is unusable in the child, so this must run in each worker
+    mongo.init_app(app, event_listeners=[pool_monitor, metrics.command_timer], **config.client_options(app.config))
+    _read_databases.clear()
+    for operation in config.READ_OPERATIONS:
+        options = config.read_options(app.config, operation)
+        if options:
+            _read_databases[operation] = mongo.db.with_options(**options)
+    LIST_READS_PRIMARY = config.reads_primary(app.config, 'lists')
+    if warm:
+        warm_connection_pool(warm)
+    SLOT_TIMES = app.config.get('SLOT_TIMES', SLOT_TIMES)
+    SLOT_CAPACITY = app.config.get('SLOT_CAPACITY', SLOT_CAPACITY)
+    APPOINTMENT_USER_JOIN = app.config.get('APPOINTMENT_USER_JOIN', APPOINTMENT_USER_JOIN)
+    if APPOINTMENT_USER_JOIN not in ('lookup', 'app'):
+        raise ValueError(f'APPOINTMENT_USER_JOIN must be lookup or app, not {APPOINTMENT_USER_JOIN!r}')
+    if app.config.get('MONGO_ENSURE_INDEXES', True):
+        ensure_indexes()
+    if app.config.get('MONGO_CHECK_QUERY_PLANS', False):
+        collection_scans = find_collection_scans()
+        if collection_scans:
+            raise RuntimeError(f"Query helpers running collection scans: {', '.join(collection_scans)}")
+
+# mongo.db with the read preference / concern of an operation class, where it differs from the client's
+_read_databases = {}
+# False when /all-appointments may read from a lagging secondary
+LIST_READS_PRIMARY = True
+
+def reads(operation):
+    """Database to read with for an operation class of config.READ_OPERATIONS"""
+    return _read_databases.get(operation, mongo.db)
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Counts ready pooled connections per server so startup can wait for a warm pool"""
+
+    def __init__(self):
+        self._ready = {}
+        self._changed = threading.Condition()
+
+    def _adjust(self, address, delta):
+        with self._changed:
+            self._ready[address] = self._ready.get(address, 0) + delta
+            self._changed.notify_all()
+
+    def connection_ready(self, event):
+        self._adjust(event.address, 1)
+
+    def connection_closed(self, event):
+        self._adjust(event.address, -1)
+
+    def pool_cleared(self, event):
+        with self._changed:
+            self._ready[event.address] = 0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        pass
+
+    def connection_checked_out(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+    def ready_connections(self):
+        with self._changed:
+            return dict(self._ready)
+
+    def wait_for(self, connections, timeout):
+        """Block until some server's pool holds `connections` ready connections; False on timeout"""
+        with self._changed:
+            return self._changed.wait_for(lambda: max(self._ready.values(), default=0) >= connections, timeout)
+
+pool_monitor = PoolMonitor()
+
+def warm_connection_pool(connections, timeout=30):
+    """Wait until the pool has opened `connections` sockets so the first requests skip TCP/TLS setup.
+
+    The client's minPoolSize makes pymongo's background maintenance open the
+    connections; the ping selects a server and creates its pool.
+    """
+    mongo.db.command('ping')
+    if pool_monitor.wait_for(connections, timeout):
+        logger.info('connection_pool_warmed', connections=pool_monitor.ready_connections())
+    else:
+        logger.warning('connection_pool_warm_timeout', wanted=connections, connections=pool_monitor.ready_connections())
+
+def _index_failed(collection, options, error):
+    """Stop startup for a unique index the app cannot do without, only warn for the others"""
+    if options.get('unique'):
+        # Without it duplicate registrations succeed and DuplicateUserError never fires
+        hint = ' (duplicates already stored; see python -m migrations.duplicate_users)' if error.code == 11000 else ''
+        raise RuntimeError(f"Cannot create unique index {options['name']} on {collection}{hint}: {error}")
+    logger.warning('index_create_failed', index=options['name'], collection=collection, error=str(error))
+
+def ensure_indexes():
+    """Create the indexes the app relies on; existing indexes are left untouched"""
+    created = []
+    for collection, keys, options in INDEXES:
+        try:
+            created.append(mongo.db[collection].create_index(keys, **options))
+        except OperationFailure as e:
+            _index_failed(collection, options, e)
+    logger.info('indexes_ensured', indexes=created)
+    return created
+
+def _plan_stages(plan):
+    """Collect every stage name in an explain() document"""
+    stages = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(_plan_stages(value))
+    return stages
+
+def _winning_plan_stages(explain_output):
+    """Stages of the winning plans only, rejected candidates are ignored"""
+    stages = []
+    if isinstance(explain_output, dict):
+        for key, value in explain_output.items():
+            if key == 'rejectedPlans':
+                continue
+            if key == 'winningPlan':
+                stages.extend(_plan_stages(value))
+            else:
+                stages.extend(_winning_plan_stages(value))
+    elif isinstance(explain_output, list):
+        for value in explain_output:
+            stages.extend(_winning_plan_stages(value))
+    return stages
+
+def explain_queries():
+    """Run explain() for the query issued by each lookup helper and return the winning plan stages"""
+    sample_id = ObjectId()
+    sample_start = datetime(2000, 1, 1)
+    checks = {
+        'find_user_by_username': lambda: mongo.db.users.find({'username': ''}).explain(),
+        'find_user_by_id_number': lambda: mongo.db.users.find({'id_number': ''}).explain(),
+        'find_user_by_id': lambda: mongo.db.users.find({'_id': sample_id}).explain(),
+        'find_appointments_by_user_id': lambda: mongo.db.appointments.find({'user_id': ''}).sort('slot_start', -1).explain(),
+        'find_appointment_rows_by_user_id': lambda: mongo.db.appointments.find(
+            user_appointments_filter('', sample_start, sample_start + timedelta(days=7))
+        ).sort('slot_start', -1).explain(),
+        'get_all_appointments': lambda: mongo.db.appointments.find().sort('created_at', -1).explain(),
+        'get_appointments_with_user_details': lambda: mongo.db.command(
+            'aggregate', 'appointments',
+            pipeline=appointments_with_user_details_pipeline(limit=APPOINTMENT_PAGE_MAX),
+            explain=True
+        ),
+        'iter_appointments_with_user_details': lambda: mongo.db.command(
+            'aggregate', 'appointments',
+            pipeline=appointments_with_user_details_pipeline(
+                limit=APPOINTMENT_PAGE_MAX, start=sample_start, end=sample_start + timedelta(days=7)
+            ),
+            explain=True
+        ),
+    }
+    return {name: _winning_plan_stages(check()) for name, check in checks.items()}
+
+def find_collection_scans():
+    """Names of the query helpers whose winning plan contains a COLLSCAN"""
+    return [name for name, stages in explain_queries().items() if 'COLLSCAN' in stages]
 
 def test_connection():
     try:
@@ -14,271 +233,977 @@ def test_connection():
     except Exception:
         return False
 
+class DuplicateUserError(Exception):
+    """Raised by insert_user when a unique user field is already taken"""
+
+    def __init__(self, field):
+        super().__init__(f"Duplicate value for {field}")
+        self.field = field
+
+def duplicate_key_field(error):
+    """Name of the field that violated a unique index, from a DuplicateKeyError"""
+    details = error.details or {}
+    for key in ('keyPattern', 'keyValue'):
+        if details.get(key):
+            return next(iter(details[key]))
+    message = str(error)
+    for _, keys, options in INDEXES:
+        if options['name'] in message:
+            return keys[0][0]
+    return None
+
+def id_match(value):
+    """Condition on an id stored as an ObjectId, or still as its hex string in documents
+    migrations/object_ids has not converted yet"""
+    canonical = object_id(value)
+    if isinstance(canonical, ObjectId):
+        return {'$in': [canonical, str(canonical)]}
+    return canonical
+
+def ids_match(values):
+    """id_match for several ids at once"""
+    ids = []
+    for value in values:
+        canonical = object_id(value)
+        ids.append(canonical)
+        if isinstance(canonical, ObjectId):
+            ids.append(str(canonical))
+    return {'$in': ids}
+
+def user_id_key(user_id):
+    return f'user:id:{user_id}'
+
+def username_key(username):
+    return f'user:username:{username}'
+
+def id_number_key(id_number):
+    return f'user:id_number:{id_number}'
+
+def cache_user(user_data):
+    """Cache a user document under its id; username and ID number map to that id"""
+    user_id = str(user_data['_id'])
+    user_cache.set(user_id_key(user_id), user_data)
+    user_cache.set(username_key(user_data['username']), user_id)
+    if user_data.get('id_number'):
+        user_cache.set(id_number_key(user_data['id_number']), user_id)
+
+def _find_user_cached(index_key, query):
+    """Read-through lookup of a user document via a cached secondary key"""
+    user_id = user_cache.get(index_key)
+    if user_id is not MISSING:
+        user_data = user_cache.get(user_id_key(user_id))
+        if user_data is not MISSING:
+            return user_data
+    user_data = mongo.db.users.find_one(query)
+    if user_data:
+        cache_user(user_data)
+    return user_data
+
+def invalidate_user(user_id):
+    """Drop a cached user document; call after every write to the users collection"""
+    user_cache.invalidate(user_id_key(str(user_id)))
+
 def insert_user(user):
+    """Insert a user in a single round trip, uniqueness is enforced by the users indexes"""
     try:
-        print(f"🔍 Attempting to insert user: {user.username}")
-        user_dict = user.to_dict()
-        print(f"📝 User data to insert: {user_dict}")
-        
-        # Check if database connection is working
-        try:
-            mongo.db.command('ping')
-            print("✅ Database connection is active")
-        except Exception as e:
-            print(f"❌ Database connection failed: {e}")
-            return None
-        
-        # Check if users collection exists
-        collections = mongo.db.list_collection_names()
-        print(f"📁 Available collections: {collections}")
-        
-        result = mongo.db.users.insert_one(user_dict)
-        print(f"✅ User inserted successfully with ID: {result.inserted_id}")
+        user_cache.invalidate(user_id_key(str(user._id)), username_key(user.username), id_number_key(user.id_number))
+        result = mongo.db.users.insert_one(user.to_document())
+        logger.debug('user_inserted', user_id=str(result.inserted_id), username=user.username)
         return str(result.inserted_id)
+    except DuplicateKeyError as e:
+        field = duplicate_key_field(e)
+        logger.info('user_duplicate', field=field, username=user.username)
+        raise DuplicateUserError(field)
     except Exception as e:
-        print(f"❌ Error inserting user: {e}")
-        import traceback
-        print(f"🔍 Stack trace: {traceback.format_exc()}")
+        logger.error('user_insert_failed', exc_info=True, username=user.username)
         return None
 
 def find_user_by_username(username):
     try:
-        user_data = mongo.db.users.find_one({'username': username})
+        user_data = _find_user_cached(username_key(username), {'username': username})
         if user_data:
             return User.from_dict(user_data)
         return None
     except Exception as e:
-        print(f"Error finding user by username: {e}")
+        logger.error('user_lookup_failed', exc_info=True, by='username')
         return None
 
 def find_user_by_id_number(id_number):
     try:
-        user_data = mongo.db.users.find_one({'id_number': id_number})
+        user_data = _find_user_cached(id_number_key(id_number), {'id_number': id_number})
         if user_data:
             return User.from_dict(user_data)
         return None
     except Exception as e:
-        print(f"Error finding user by ID number: {e}")
+        logger.error('user_lookup_failed', exc_info=True, by='id_number')
         return None
 
 def find_user_by_id(user_id):
     try:
-        print(f"🔍 Searching for user with ID: {user_id}")
         # Validate ObjectId
         if not ObjectId.is_valid(user_id):
-            print(f"❌ Invalid user ID format: {user_id}")
+            logger.debug('user_id_invalid', user_id=user_id)
             return None
             
-        user_data = mongo.db.users.find_one({'_id': ObjectId(user_id)})
+        user_data = user_cache.get(user_id_key(user_id))
+        if user_data is MISSING:
+            user_data = mongo.db.users.find_one({'_id': id_match(user_id)})
+            if user_data:
+                cache_user(user_data)
         if user_data:
-            print(f"✅ User found in database: {user_data.get('username')}")
             return User.from_dict(user_data)
         else:
-            print(f"❌ No user found with ID: {user_id}")
+            logger.debug('user_not_found', user_id=user_id)
             return None
     except Exception as e:
-        print(f"❌ Error finding user by ID: {e}")
+        logger.error('user_lookup_failed', exc_info=True, by='_id', user_id=user_id)
+        return None
+
+def update_user_password_hash(user_id, password_hash):
+    """Replace a user's stored password hash, used to upgrade the bcrypt work factor on login"""
+    try:
+        result = mongo.db.users.update_one({'_id': id_match(user_id)}, {'$set': {'password_hash': password_hash}})
+        invalidate_user(user_id)
+        return result.modified_count > 0
+    except Exception as e:
+        logger.error('password_hash_update_failed', exc_info=True, user_id=str(user_id))
+        return False
+
+def set_user_role(username, role):
+    """Change a user's role; returns False if there is no such user"""
+    try:
+        user_data = mongo.db.users.find_one_and_update({'username': username}, {'$set': {'role': role}})
+        if user_data is None:
+            return False
+        invalidate_user(user_data['_id'])
+        return True
+    except Exception as e:
+        logger.error('user_role_update_failed', exc_info=True, username=username)
+        return False
+
+def _appointments_version_key(user_id=None):
+    return f'appointments:user:{user_id}' if user_id else 'appointments:all'
+
+def appointments_version(user_id=None):
+    """Current version stamp of one user's appointments, or of the whole set when user_id is None"""
+    key = _appointments_version_key(user_id)
+    version = version_cache.get(key)
+    if version is MISSING:
+        version = uuid.uuid4().hex
+        version_cache.set(key, version)
+    return version
+
+def bump_appointments_version(user_id=None):
+    """Invalidate the version stamps of the global appointment set and, if given, one user's appointments"""
+    keys = [_appointments_version_key()]
+    if user_id:
+        keys.append(_appointments_version_key(user_id))
+    for key in keys:
+        version_cache.set(key, uuid.uuid4().hex)
+
+# Counselor-days whose slot documents are known to exist
+ensured_slot_days = set()
+
+def slot_id(date, preferred_time, counselor_id=None):
+    return f'{counselor_id or DEFAULT_COUNSELOR_ID}|{date}|{preferred_time}'
+
+def booked_per_time_pipeline(date, counselor_id):
+    """Seats already taken per time on one counselor-day, counted from the appointments themselves"""
+    match = {'date': date, 'status': {'$nin': list(Appointment.SLOT_RELEASING_STATUSES)}}
+    match['counselor_id'] = {'$in': [None, counselor_id]} if counselor_id == DEFAULT_COUNSELOR_ID else counselor_id
+    return [
+        {'$match': match},
+        {'$group': {'_id': '$preferred_time', 'count': {'$sum': 1}}}
+    ]
+
+def slot_documents(date, counselor_id, booked_rows):
+    booked = {row['_id']: row['count'] for row in booked_rows}
+    return [
+        {
+            '_id': slot_id(date, preferred_time, counselor_id),
+            'counselor_id': counselor_id,
+            'date': date,
+            'preferred_time': preferred_time,
+            'capacity': SLOT_CAPACITY,
+            'booked': booked.get(preferred_time, 0),
+            'remaining': SLOT_CAPACITY - booked.get(preferred_time, 0)
+        }
+        for preferred_time in SLOT_TIMES
+    ]
+
+def resized_slots_filter(date, counselor_id):
+    """Slot documents of a counselor-day created under a different SLOT_CAPACITY"""
+    return {'counselor_id': counselor_id, 'date': date, 'capacity': {'$ne': SLOT_CAPACITY}}
+
+def resize_slots_update():
+    # Seats already booked are kept; a smaller capacity can leave remaining below zero until they are released
+    return [{'$set': {'capacity': SLOT_CAPACITY, 'remaining': {'$subtract': [SLOT_CAPACITY, '$booked']}}}]
+
+def only_duplicate_keys(error):
+    """Whether a BulkWriteError consists solely of duplicate key errors"""
+    return all(write_error.get('code') == 11000 for write_error in error.details.get('writeErrors', []))
+
+def ensure_day_slots(date, counselor_id=None):
+    """Create the slot documents for one counselor-day, seeded with bookings made before slots existed"""
+    counselor_id = counselor_id or DEFAULT_COUNSELOR_ID
+    if (counselor_id, date) in ensured_slot_days:
+        return
+
+    booked_rows = mongo.db.appointments.aggregate(booked_per_time_pipeline(date, counselor_id))
+    # Slot ids are deterministic, so a duplicate key means another worker got there first;
+    # existing counters are never reset
+    try:
+        mongo.db.slots.insert_many(slot_documents(date, counselor_id, booked_rows), ordered=False)
+    except BulkWriteError as e:
+        if not only_duplicate_keys(e):
+            raise
+        # The day existed already, possibly with the seat count of an earlier SLOT_CAPACITY
+        mongo.db.slots.update_many(resized_slots_filter(date, counselor_id), resize_slots_update())
+    ensured_slot_days.add((counselor_id, date))
+
+def precompute_slots(dates, counselor_ids=None):
+    """Create slot documents ahead of time, e.g. for the next enrollment period"""
+    for date in dates:
+        for counselor_id in counselor_ids or [DEFAULT_COUNSELOR_ID]:
+            ensure_day_slots(date, counselor_id)
+
+def has_slot(preferred_time):
+    """Whether preferred_time is a bookable time with slot documents.
+
+    Appointments from before slot inventory can hold other times; they have no
+    seat to take or give back, so they are left out of the slot accounting.
+    """
+    return preferred_time in SLOT_TIMES
+
+def reserve_slot(date, preferred_time, counselor_id=None):
+    """Atomically take one seat in a slot; False when the slot is full"""
+    if not has_slot(preferred_time):
+        return True
+    ensure_day_slots(date, counselor_id)
+    slot = mongo.db.slots.find_one_and_update(
+        {'_id': slot_id(date, preferred_time, counselor_id), 'remaining': {'$gt': 0}},
+        {'$inc': {'remaining': -1, 'booked': 1}},
+        projection={'_id': 1}
+    )
+    return slot is not None
+
+def release_slot(date, preferred_time, counselor_id=None):
+    """Give one seat back to a slot"""
+    if not has_slot(preferred_time):
+        return
+    mongo.db.slots.update_one(
+        {'_id': slot_id(date, preferred_time, counselor_id), 'booked': {'$gt': 0}},
+        {'$inc': {'remaining': 1, 'booked': -1}}
+    )
+
+def book_appointment(appointment):
+    """Reserve the appointment's slot and insert it; returns (inserted_id, error)"""
+    holds_slot = Appointment.holds_slot(appointment.status)
+    try:
+        if holds_slot and not reserve_slot(appointment.date, appointment.preferred_time, appointment.counselor_id):
+            logger.info('slot_full', date=appointment.date, preferred_time=appointment.preferred_time)
+            return None, 'slot_full'
+    except Exception:
+        logger.error('slot_reserve_failed', exc_info=True, date=appointment.date)
+        return None, 'error'
+
+    result = insert_appointment(appointment)
+    if not result and holds_slot:
+        release_slot(appointment.date, appointment.preferred_time, appointment.counselor_id)
+        return None, 'error'
+    return result, None
+
+STATS_ID = 'appointments'
+
+# Lease document in the stats collection; only the pass holding it corrects the counters
+STATS_LEASE_ID = 'appointments_reconcile_lease'
+STATS_LEASE_SECONDS = 600
+
+def _stats_key(value):
+    """Counter field name for a status / concern type / date; dots and dollars are not allowed in keys"""
+    return str(value).replace('.', '_').replace('$', '_')
+
+def _record_stats(increments):
+    """Apply counter deltas to the precomputed dashboard statistics; failures only cost accuracy"""
+    increments = {field: delta for field, delta in increments.items() if delta}
+    if not increments:
+        return
+    try:
+        mongo.db.stats.update_one({'_id': STATS_ID}, {'$inc': increments}, upsert=True)
+    except Exception:
+        logger.error('stats_update_failed', exc_info=True)
+
+def status_deltas(transitions):
+    """Counter deltas for an iterable of (previous_status, new_status) pairs"""
+    increments = {}
+    for previous_status, new_status in transitions:
+        for status, delta in ((previous_status, -1), (new_status, 1)):
+            field = f'by_status.{_stats_key(status)}'
+            increments[field] = increments.get(field, 0) + delta
+    return increments
+
+def insert_increments(appointment):
+    return {
+        'total': 1,
+        f'by_status.{_stats_key(appointment.status)}': 1,
+        f'by_concern_type.{_stats_key(appointment.concern_type)}': 1,
+        f'by_date.{_stats_key(appointment.date)}': 1
+    }
+
+def stats_view(stats):
+    stats = stats or {}
+    return {
+        'total': stats.get('total', 0),
+        'by_status': stats.get('by_status', {}),
+        'by_concern_type': stats.get('by_concern_type', {}),
+        'by_date': stats.get('by_date', {}),
+        'reconciled_at': stats.get('reconciled_at')
+    }
+
+def get_appointment_stats():
+    """Counts by status, concern type and date as maintained by the write paths"""
+    return stats_view(mongo.db.stats.find_one({'_id': STATS_ID}))
+
+def stats_facet_pipeline():
+    def grouped(field, default):
+        return [{'$group': {'_id': {'$ifNull': [f'${field}', default]}, 'count': {'$sum': 1}}}]
+
+    return [{
+        '$facet': {
+            'total': [{'$count': 'count'}],
+            'by_status': grouped('status', 'Pending'),
+            'by_concern_type': grouped('concern_type', 'Unknown'),
+            'by_date': grouped('date', 'Unknown')
+        }
+    }]
+
+def stats_recomputed(facets):
+    """Counters in the stored shape from a stats_facet_pipeline result"""
+    recomputed = {'total': facets['total'][0]['count'] if facets.get('total') else 0}
+    for name in ('by_status', 'by_concern_type', 'by_date'):
+        recomputed[name] = {_stats_key(row['_id']): row['count'] for row in facets.get(name, [])}
+    return recomputed
+
+def stats_drift(facets, current):
+    """Difference between counters recomputed from a $facet result and the current counters, as $inc deltas"""
+    recomputed = stats_recomputed(facets)
+    drift = {}
+    if recomputed['total'] != current['total']:
+        drift['total'] = recomputed['total'] - current['total']
+    for name in ('by_status', 'by_concern_type', 'by_date'):
+        for key in set(recomputed[name]) | set(current[name]):
+            delta = recomputed[name].get(key, 0) - current[name].get(key, 0)
+            if delta:
+                drift[f'{name}.{key}'] = delta
+    return drift
+
+def stats_correction(drift):
+    # Applied as deltas, not a snapshot, so increments from writes made meanwhile are kept
+    update = {'$set': {'reconciled_at': datetime.utcnow().isoformat()}}
+    if drift:
+        update['$inc'] = drift
+    return update
+
+def seed_appointment_stats():
+    """Create the counters from the appointments if they do not exist yet; True if this call created them
+
+    $setOnInsert only writes when the document is new, so a second worker
+    seeding at the same time cannot add the counts again.
+    """
+    facets = next(mongo.db.appointments.aggregate(stats_facet_pipeline()), {})
+    seeded = {**stats_recomputed(facets), 'reconciled_at': datetime.utcnow().isoformat()}
+    try:
+        result = mongo.db.stats.update_one({'_id': STATS_ID}, {'$setOnInsert': seeded}, upsert=True)
+    except DuplicateKeyError:
+        return False
+    return result.upserted_id is not None
+
+def _take_stats_lease(holder):
+    """True if holder now owns the reconcile lease; it is free once expired or released"""
+    now = datetime.utcnow()
+    try:
+        lease = mongo.db.stats.find_one_and_update(
+            {'_id': STATS_LEASE_ID, 'expires_at': {'$lte': now}},
+            {'$set': {'holder': holder, 'expires_at': now + timedelta(seconds=STATS_LEASE_SECONDS)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Another pass holds an unexpired lease, so the upsert collided with it
+        return False
+    return lease is not None and lease.get('holder') == holder
+
+def _release_stats_lease(holder):
+    mongo.db.stats.update_one({'_id': STATS_LEASE_ID, 'holder': holder}, {'$set': {'expires_at': datetime.utcnow()}})
+
+def reconcile_appointment_stats():
+    """Recompute every counter with one $group pass and correct the stored values by the drift found; returns it
+
+    Corrections are $inc deltas, so two overlapping passes would apply the same
+    drift twice; a pass first takes the reconcile lease and returns None without
+    touching the counters while another worker holds it. A write landing between
+    the aggregate and the counter read can still show up as drift of one, which
+    the next pass takes back.
+    """
+    holder = uuid.uuid4().hex
+    if not _take_stats_lease(holder):
+        logger.debug('stats_reconcile_skipped', reason='lease_held')
         return None
+    try:
+        facets = next(mongo.db.appointments.aggregate(stats_facet_pipeline()), {})
+        drift = stats_drift(facets, get_appointment_stats())
+        mongo.db.stats.update_one({'_id': STATS_ID}, stats_correction(drift), upsert=True)
+    finally:
+        _release_stats_lease(holder)
+    if drift:
+        # /stats/appointments uses the global version stamp as its ETag
+        bump_appointments_version()
+        logger.warning('stats_drift_corrected', drift=drift)
+    return drift
+
+def created_event(appointment):
+    return {
+        '_id': str(appointment._id),
+        'user_id': appointment.user_id,
+        'date': appointment.date,
+        'preferred_time': appointment.preferred_time,
+        'concern_type': appointment.concern_type,
+        'counselor_id': appointment.counselor_id,
+        'status': appointment.status
+    }
 
 def insert_appointment(appointment):
     try:
-        appointment_dict = appointment.to_dict()
-        print(f"📝 Inserting appointment data: {appointment_dict}")
-        
-        result = mongo.db.appointments.insert_one(appointment_dict)
-        print(f"✅ Appointment inserted with ID: {result.inserted_id}")
+        result = mongo.db.appointments.insert_one(appointment.to_document())
+        bump_appointments_version(appointment.user_id)
+        _record_stats(insert_increments(appointment))
+        events.notify('appointment_created', created_event(appointment))
+        logger.debug('appointment_inserted', appointment_id=str(result.inserted_id), user_id=appointment.user_id)
         return result.inserted_id
     except Exception as e:
-        print(f"❌ Error inserting appointment: {e}")
-        import traceback
-        print(f"🔍 Stack trace: {traceback.format_exc()}")
+        logger.error('appointment_insert_failed', exc_info=True, user_id=appointment.user_id)
         return None
 
+def _slot_start_range(start=None, end=None):
+    """Condition on slot_start for an optional [start, end) range, or None for no bound"""
+    bounds = {}
+    if start is not None:
+        bounds['$gte'] = start
+    if end is not None:
+        bounds['$lt'] = end
+    return bounds or None
+
+def user_appointments_filter(user_id, start=None, end=None):
+    query = {'user_id': id_match(user_id)}
+    slot_range = _slot_start_range(start, end)
+    if slot_range:
+        query['slot_start'] = slot_range
+    return query
+
 def find_appointments_by_user_id(user_id):
     try:
-        print(f"🔍 Searching for appointments for user: {user_id}")
-        appointments_data = mongo.db.appointments.find({'user_id': user_id}).sort('date', -1)
+        appointments_data = mongo.db.appointments.find(user_appointments_filter(user_id)).sort('slot_start', -1)
         appointments = []
         for appointment_data in appointments_data:
             appointments.append(Appointment.from_dict(appointment_data))
-        print(f"✅ Found {len(appointments)} appointments for user {user_id}")
+        logger.debug('user_appointments_found', user_id=user_id, count=len(appointments))
         return appointments
     except Exception as e:
-        print(f"❌ Error finding appointments by user ID: {e}")
+        logger.error('user_appointments_lookup_failed', exc_info=True, user_id=user_id)
         return []
 
-def update_appointment_status(appointment_id, new_status, current_status=None):
-    """Update the status of an appointment with validation"""
+def find_appointment_rows_by_user_id(user_id, start=None, end=None):
+    """A user's appointments as JSON-ready rows, latest slot first, optionally with slot_start in [start, end)"""
     try:
-        print(f"🔍 Updating appointment {appointment_id} from {current_status} to status: {new_status}")
-        
-        # Validate status first
-        if not Appointment.is_valid_status(new_status):
-            print(f"❌ Invalid status: {new_status}")
-            return False, "Invalid status value"
-        
-        # First check if appointment exists
-        appointment_data = mongo.db.appointments.find_one({'_id': ObjectId(appointment_id)})
-        if not appointment_data:
-            print(f"❌ Appointment not found: {appointment_id}")
-            return False, "Appointment not found"
-            
-        print(f"✅ Found appointment: {appointment_data}")
-        
-        # For admin updates, if current_status is provided and it's 'Pending', 
-        # only allow 'Approved' or 'Rejected'
-        if current_status == 'Pending' and not Appointment.is_admin_updatable_status(new_status):
-            print(f"❌ Cannot update from Pending to {new_status}. Only 'Approved' or 'Rejected' allowed.")
-            return False, "Can only approve or reject pending appointments"
-        
-        result = mongo.db.appointments.update_one(
-            {'_id': ObjectId(appointment_id)},
-            {'$set': {'status': new_status}}
-        )
-        
-        print(f"✅ Update result - matched: {result.matched_count}, modified: {result.modified_count}")
-        
-        if result.modified_count > 0:
-            print(f"✅ Successfully updated appointment {appointment_id} to {new_status}")
-            return True, "Status updated successfully"
-        else:
-            print(f"⚠️ No changes made to appointment {appointment_id}")
-            return False, "No changes made"
-            
+        cursor = mongo.db.appointments.find(user_appointments_filter(user_id, start, end)).sort('slot_start', -1)
+        rows = Appointment.serialize_documents(cursor)
+        logger.debug('user_appointments_found', user_id=user_id, count=len(rows))
+        return rows
     except Exception as e:
-        print(f"❌ Error updating appointment status: {e}")
-        import traceback
-        print(f"🔍 Stack trace: {traceback.format_exc()}")
-        return False, f"Error updating appointment: {str(e)}"
+        logger.error('user_appointments_lookup_failed', exc_info=True, user_id=user_id)
+        return []
 
 def get_all_appointments():
     """Get all appointments (for admin/counselor view)"""
     try:
         appointments = list(mongo.db.appointments.find().sort('created_at', -1))
-        print(f"🔍 Found {len(appointments)} total appointments in database")
-        for apt in appointments:
-            print(f"   - {apt['_id']}: {apt.get('user_id', 'N/A')} - {apt.get('date', 'N/A')} - {apt.get('status', 'N/A')}")
+        logger.debug('all_appointments_found', count=len(appointments))
         return [Appointment.from_dict(appointment) for appointment in appointments]
     except Exception as e:
-        print(f"Error getting all appointments: {e}")
+        logger.error('all_appointments_lookup_failed', exc_info=True)
         return []
 
 def find_appointment_by_id(appointment_id):
     """Find a specific appointment by ID"""
     try:
-        print(f"🔍 Searching for appointment with ID: {appointment_id}")
-        
-        # SIMPLE FIX: Just search by string ID since that's how it's stored
-        appointment_data = mongo.db.appointments.find_one({'_id': appointment_id})
+        appointment_data = mongo.db.appointments.find_one({'_id': id_match(appointment_id)})
         
         if appointment_data:
-            print(f"✅ Appointment found: {appointment_data}")
             return Appointment.from_dict(appointment_data), None
         else:
-            print(f"❌ No appointment found with ID: {appointment_id}")
+            logger.debug('appointment_not_found', appointment_id=appointment_id)
             return None, "Appointment not found"
             
     except Exception as e:
-        print(f"❌ Error finding appointment by ID: {e}")
+        logger.error('appointment_lookup_failed', exc_info=True, appointment_id=appointment_id)
         return None, f"Error finding appointment: {str(e)}"
 
-def update_appointment_status(appointment_id, new_status, current_status=None):
-    """Update the status of an appointment"""
+def _status_changed_event(appointment_id, previous, new_status):
+    """Event payload for a status change, built from the appointment's pre-image"""
+    return {
+        '_id': str(appointment_id),
+        'user_id': str(previous['user_id']) if previous.get('user_id') is not None else None,
+        'date': previous.get('date'),
+        'preferred_time': previous.get('preferred_time'),
+        'counselor_id': previous.get('counselor_id'),
+        'status': new_status,
+        'previous_status': previous.get('status', 'Pending')
+    }
+
+# Fields of the pre-image needed to apply a status change's side effects
+STATUS_PREIMAGE_PROJECTION = {'user_id': 1, 'status': 1, 'version': 1, 'date': 1, 'preferred_time': 1, 'counselor_id': 1}
+
+def slot_change_for(previous, new_status):
+    """'release', 'reserve' or None: what a status change means for the appointment's slot"""
+    was_holding = Appointment.holds_slot(previous.get('status', 'Pending'))
+    if was_holding and not Appointment.holds_slot(new_status):
+        return 'release'
+    if not was_holding and Appointment.holds_slot(new_status):
+        return 'reserve'
+    return None
+
+def slot_of(appointment_data):
+    return appointment_data.get('date'), appointment_data.get('preferred_time'), appointment_data.get('counselor_id')
+
+def publish_status_change(appointment_id, previous, new_status):
+    """In-process side effects of an applied status change: version stamps and events"""
+    bump_appointments_version(previous.get('user_id'))
+    events.notify('appointment_status_changed', _status_changed_event(appointment_id, previous, new_status))
+
+# Why a status transition did not apply, beyond the state machine refusing it
+APPOINTMENT_NOT_FOUND = "Appointment not found"
+STATUS_CONFLICT = "Appointment was modified concurrently"
+
+def status_transition_filter(appointment_id, new_status, expected_version=None):
+    """Matches the appointment only while the state machine allows new_status from its current status"""
+    sources = Appointment.statuses_before(new_status)
+    if 'Pending' in sources:
+        # Documents written without a status are Pending
+        sources = sources + [None]
+    query = {'_id': id_match(appointment_id), 'status': {'$in': sources}}
+    if expected_version is not None:
+        # Documents written before versioning are version 0
+        query['version'] = expected_version if expected_version else {'$in': [0, None]}
+    return query
+
+def status_transition_update(new_status, write_id=None):
+    """Pipeline update that records the status being left and bumps the version in the same write.
+
+    write_id tags the write so a batch can tell its own updates from an
+    identical transition another request made concurrently.
+    """
+    return [{'$set': {
+        'previous_status': {'$ifNull': ['$status', 'Pending']},
+        'status': {'$literal': new_status},
+        'version': {'$add': [{'$ifNull': ['$version', 0]}, 1]},
+        'last_write_id': {'$literal': write_id}
+    }}]
+
+def status_revert_update(previous):
+    """Undo a transition that cannot stand, back to the status and version it left.
+
+    Restoring the version keeps ETags and expected_version values issued before
+    the transition valid, since nothing was published for it.
+    """
+    return {'$set': {'status': previous['status'], 'version': previous['version']}}
+
+def transition_error(current, new_status):
+    """Why a conditional transition matched nothing, given the appointment as it is now"""
+    if not current:
+        return APPOINTMENT_NOT_FOUND
+    status = current.get('status', 'Pending')
+    if not Appointment.can_transition(status, new_status):
+        return f"Cannot change status from {status} to {new_status}"
+    # The move is allowed now, so either the version or a concurrent status change is what missed
+    return STATUS_CONFLICT
+
+def transition_preimage(updated):
+    """The appointment as it was before a transition, rebuilt from the after-image"""
+    return dict(updated, status=updated['previous_status'], version=updated['version'] - 1)
+
+def transition_appointment_status(appointment_id, new_status, expected_version=None):
+    """Move an appointment to new_status if Appointment.STATUS_TRANSITIONS allows it.
+
+    The move is a single find_one_and_update conditional on the current status
+    (and on expected_version when given), so concurrent edits cannot be lost.
+    Returns (updated Appointment, None) or (None, error).
+    """
+    if not Appointment.is_valid_status(new_status):
+        return None, "Invalid status value"
     try:
-        print(f"🔍 Updating appointment {appointment_id} to status: {new_status}")
-        
-        # Validate status
-        if not Appointment.is_valid_status(new_status):
-            return False, "Invalid status value"
-        
-        # SIMPLE FIX: Update by string ID
-        result = mongo.db.appointments.update_one(
-            {'_id': appointment_id},  # Just use the string ID directly
-            {'$set': {'status': new_status}}
+        updated = mongo.db.appointments.find_one_and_update(
+            status_transition_filter(appointment_id, new_status, expected_version),
+            status_transition_update(new_status),
+            return_document=ReturnDocument.AFTER
         )
-        
-        if result.modified_count > 0:
-            print(f"✅ Successfully updated appointment {appointment_id} to {new_status}")
-            return True, "Status updated successfully"
+        if not updated:
+            # Only failures pay for a second read, to say why
+            current = mongo.db.appointments.find_one({'_id': id_match(appointment_id)}, {'status': 1})
+            error = transition_error(current, new_status)
+            logger.debug('appointment_status_not_changed', appointment_id=appointment_id, status=new_status, error=error)
+            return None, error
+
+        previous = transition_preimage(updated)
+        slot_change = slot_change_for(previous, new_status)
+        if slot_change == 'release':
+            release_slot(*slot_of(updated))
+        elif slot_change == 'reserve' and not reserve_slot(*slot_of(updated)):
+            # Reinstating an appointment whose slot has been taken meanwhile; move it back
+            mongo.db.appointments.update_one(
+                {'_id': updated['_id'], 'version': updated['version']},
+                status_revert_update(previous)
+            )
+            return None, "Selected time slot is fully booked"
+
+        _record_stats(status_deltas([(previous['status'], new_status)]))
+        publish_status_change(appointment_id, previous, new_status)
+        logger.info('appointment_status_updated', appointment_id=appointment_id, status=new_status, version=updated['version'])
+        return Appointment.from_dict(updated), None
+
+    except Exception as e:
+        logger.error('appointment_status_update_failed', exc_info=True, appointment_id=appointment_id)
+        return None, f"Error updating appointment: {str(e)}"
+
+BULK_STATUS_MAX = 500
+
+def validate_bulk_updates(updates):
+    """Per-item results plus {appointment_id: (result, new_status)} for the items worth sending"""
+    results = [{'appointment_id': item.get('appointment_id'), 'success': False} for item in updates]
+    pending = {}
+
+    for result, item in zip(results, updates):
+        appointment_id, new_status = item.get('appointment_id'), item.get('status')
+        if appointment_id:
+            # Keyed like str(document['_id']), so any spelling of a hex id finds its document
+            appointment_id = str(object_id(appointment_id))
+        if not appointment_id or not new_status:
+            result['error'] = "appointment_id and status are required"
+        elif not Appointment.is_valid_status(new_status):
+            result['error'] = "Invalid status value"
+        elif not Appointment.is_admin_updatable_status(new_status):
+            result['error'] = "Counselors can only approve or reject appointments"
+        elif appointment_id in pending:
+            result['error'] = "Duplicate appointment in batch"
         else:
-            print(f"⚠️ No changes made to appointment {appointment_id}")
-            return False, "No changes made"
-            
+            pending[appointment_id] = (result, new_status)
+    return results, pending
+
+def plan_bulk_updates(pending, current, write_id):
+    """Guarded UpdateOne per still-valid item; items that fail the transition rule leave `pending`"""
+    operations = []
+    for appointment_id, (result, new_status) in list(pending.items()):
+        apt = current.get(appointment_id)
+        if not apt:
+            result['error'] = "Appointment not found"
+        elif not Appointment.can_transition(apt.get('status', 'Pending'), new_status):
+            result['error'] = "Can only approve or reject pending appointments"
+        else:
+            # Guard on the status and version we validated against so concurrent edits are not overwritten
+            operations.append(UpdateOne(
+                {'_id': id_match(appointment_id), 'status': apt.get('status'), 'version': apt.get('version')},
+                status_transition_update(new_status, write_id)
+            ))
+            continue
+        del pending[appointment_id]
+    return operations
+
+BULK_REREAD_PROJECTION = {'status': 1, 'previous_status': 1, 'version': 1, 'last_write_id': 1}
+
+def applied_bulk_updates(pending, current, reread, write_id):
+    """Ids this batch's own write moved, from a re-read (BULK_REREAD_PROJECTION) after a partial bulk_write.
+
+    A matching status alone is not enough: a concurrent single edit to the same
+    status would be counted twice, with its stats and slot release. The item
+    must be exactly one version past the planned one, have left the planned
+    status and carry this batch's write_id.
+    """
+    applied = set()
+    for apt in reread:
+        appointment_id = str(apt['_id'])
+        planned = current[appointment_id]
+        if (apt.get('last_write_id') == write_id
+                and apt.get('status') == pending[appointment_id][1]
+                and apt.get('version') == (planned.get('version') or 0) + 1
+                and apt.get('previous_status') == (planned.get('status') or 'Pending')):
+            applied.add(appointment_id)
+    return applied
+
+def finish_bulk_updates(pending, current, applied):
+    """Mark results and publish changes; returns (slots to release, stats increments)"""
+    changed = []
+    for appointment_id, (result, new_status) in pending.items():
+        if appointment_id not in applied:
+            result['error'] = "Appointment was modified concurrently"
+            continue
+        result['success'] = True
+        result['status'] = new_status
+        result['version'] = current[appointment_id].get('version', 0) + 1
+        changed.append((appointment_id, current[appointment_id], new_status))
+
+    for user_id in {previous.get('user_id') for _, previous, _ in changed}:
+        bump_appointments_version(user_id)
+    for appointment_id, previous, new_status in changed:
+        events.notify('appointment_status_changed', _status_changed_event(appointment_id, previous, new_status))
+
+    releases = [slot_of(previous) for _, previous, new_status in changed if slot_change_for(previous, new_status) == 'release']
+    increments = status_deltas((previous.get('status', 'Pending'), new_status) for _, previous, new_status in changed)
+    return releases, increments
+
+def bulk_update_appointment_status(updates):
+    """Approve or reject many pending appointments with one read and one bulk_write.
+
+    `updates` is a list of {'appointment_id', 'status'} dicts. Returns one
+    result dict per item, in order, with 'success' and either 'status' or 'error'.
+    """
+    results, pending = validate_bulk_updates(updates)
+    if not pending:
+        return results
+
+    try:
+        current = {
+            str(apt['_id']): apt
+            for apt in mongo.db.appointments.find({'_id': ids_match(pending)}, STATUS_PREIMAGE_PROJECTION)
+        }
+
+        write_id = uuid.uuid4().hex
+        operations = plan_bulk_updates(pending, current, write_id)
+        if not operations:
+            return results
+
+        write = mongo.db.appointments.bulk_write(operations, ordered=False)
+        applied = set(pending)
+        if write.modified_count < len(operations):
+            # Some guards missed; one more read tells which items lost the race
+            reread = mongo.db.appointments.find({'_id': ids_match(pending)}, BULK_REREAD_PROJECTION)
+            applied = applied_bulk_updates(pending, current, reread, write_id)
+
+        releases, increments = finish_bulk_updates(pending, current, applied)
+        for slot in releases:
+            release_slot(*slot)
+        _record_stats(increments)
+        logger.info('appointment_status_bulk_updated', requested=len(updates), updated=len(applied))
     except Exception as e:
-        print(f"❌ Error updating appointment status: {e}")
-        return False, f"Error updating appointment: {str(e)}"
-    
+        logger.error('appointment_status_bulk_update_failed', exc_info=True)
+        for result, _ in pending.values():
+            if not result['success']:
+                result['error'] = f"Error updating appointment: {str(e)}"
 
-    
-def get_appointments_with_user_details():
-    """Get all appointments with user information using aggregation"""
+    return results
+
+APPOINTMENT_PAGE_MAX = 500
+
+# How /all-appointments attaches user details: 'lookup' joins inside the aggregation,
+# 'app' reads the appointments first and fetches their users with one $in query per batch
+APPOINTMENT_USER_JOIN = 'lookup'
+USER_INFO_PROJECTION = {'username': 1, 'id_number': 1}
+
+# Fields the admin view needs; everything else stays on the server
+APPOINTMENT_ADMIN_PROJECTION = {
+    'user_id': 1,
+    'date': 1,
+    'preferred_time': 1,
+    'concern_type': 1,
+    'status': 1,
+    'created_at': 1,
+    'slot_start': 1,
+    'version': 1,
+    'user_info.username': 1,
+    'user_info.id_number': 1
+}
+
+def encode_appointment_cursor(appointment_data):
+    """Encode the (slot_start, _id) sort key of an appointment as an opaque cursor"""
+    _id = appointment_data['_id']
+    slot_start = appointment_data.get('slot_start')
+    key = [slot_start.isoformat() if slot_start else None, str(_id), isinstance(_id, ObjectId)]
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+def decode_appointment_cursor(cursor):
+    """Decode a cursor produced by encode_appointment_cursor, raises ValueError if malformed"""
     try:
-        pipeline = [
-            {
-                '$lookup': {
-                    'from': 'users',
-                    'localField': 'user_id',
-                    'foreignField': '_id',
-                    'as': 'user_info'
-                }
-            },
-            {
-                '$unwind': {
-                    'path': '$user_info',
-                    'preserveNullAndEmptyArrays': True
-                }
-            },
-            {
-                '$sort': {'date': 1, 'preferred_time': 1}
+        slot_start, _id, is_object_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        slot_start = datetime.fromisoformat(slot_start) if slot_start is not None else None
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if is_object_id:
+        if not ObjectId.is_valid(_id):
+            raise ValueError('Invalid cursor')
+        _id = ObjectId(_id)
+    return slot_start, _id
+
+def serialize_appointment_with_user(apt):
+    """Convert an aggregated appointment document into its JSON-ready form"""
+    user_info = apt.get('user_info')
+    return {
+        '_id': str(apt['_id']),
+        'user_id': str(apt['user_id']),
+        'date': apt['date'],
+        'preferred_time': apt['preferred_time'],
+        'concern_type': apt['concern_type'],
+        'status': apt.get('status', 'Pending'),
+        'version': apt.get('version', 0),
+        'created_at': apt.get('created_at', ''),
+        'user_info': {
+            'username': user_info.get('username', 'Unknown'),
+            'id_number': user_info.get('id_number', 'Unknown')
+        } if user_info else {}
+    }
+
+class AppointmentPage:
+    """Lazily serialized page of appointments; next_cursor is known once iteration finishes"""
+
+    def __init__(self, cursor, limit=None):
+        self._cursor = cursor
+        self._limit = limit
+        self._last = None
+        self.count = 0
+
+    def __iter__(self):
+        for apt in self._cursor:
+            self._last = apt
+            self.count += 1
+            yield serialize_appointment_with_user(apt)
+
+    @property
+    def next_cursor(self):
+        if self._limit and self.count == self._limit and self._last is not None:
+            return encode_appointment_cursor(self._last)
+        return None
+
+def user_ids_query(batch):
+    return {'_id': ids_match({str(apt['user_id']) for apt in batch if apt.get('user_id') is not None})}
+
+def attach_user_info(batch, users):
+    """Set user_info on each appointment from the users fetched for its batch"""
+    users_by_id = {str(user['_id']): user for user in users}
+    for apt in batch:
+        user = users_by_id.get(str(apt.get('user_id')))
+        if user:
+            apt['user_info'] = user
+    return batch
+
+def _joined_in_app(cursor, users, batch_size=APPOINTMENT_PAGE_MAX):
+    """Appointment documents with user_info attached, one query on `users` per batch of appointments"""
+    batch = []
+    for apt in cursor:
+        batch.append(apt)
+        if len(batch) == batch_size:
+            yield from attach_user_info(batch, users.find(user_ids_query(batch), USER_INFO_PROJECTION))
+            batch = []
+    if batch:
+        yield from attach_user_info(batch, users.find(user_ids_query(batch), USER_INFO_PROJECTION))
+
+def appointments_with_user_details_pipeline(limit=None, after=None, start=None, end=None, join='lookup'):
+    """Appointments in (slot_start, _id) order, optionally after a cursor and with slot_start in [start, end).
+
+    With join='app' the users are left out and attached by _joined_in_app.
+    """
+    conditions = []
+    slot_range = _slot_start_range(start, end)
+    if slot_range:
+        conditions.append({'slot_start': slot_range})
+    if after is not None:
+        slot_start, _id = after
+        # Keyset condition on the (slot_start, _id) sort key. Documents without a
+        # slot_start (not yet migrated, or unparseable) sort first as nulls.
+        if slot_start is None:
+            conditions.append({'$or': [
+                {'slot_start': {'$ne': None}},
+                {'slot_start': None, '_id': {'$gt': _id}}
+            ]})
+        else:
+            conditions.append({'$or': [
+                {'slot_start': {'$gt': slot_start}},
+                {'slot_start': slot_start, '_id': {'$gt': _id}}
+            ]})
+    pipeline = []
+    if conditions:
+        pipeline.append({'$match': conditions[0] if len(conditions) == 1 else {'$and': conditions}})
+    pipeline.append({'$sort': {'slot_start': 1, '_id': 1}})
+    if limit:
+        pipeline.append({'$limit': limit})
+    if join == 'app':
+        pipeline.append({'$project': APPOINTMENT_ADMIN_PROJECTION})
+        return pipeline
+    # Join users only for the rows on this page; appointments.user_id and users._id
+    # are both ObjectIds, so each row is one lookup on the users _id index
+    pipeline.extend([
+        {
+            '$lookup': {
+                'from': 'users',
+                'localField': 'user_id',
+                'foreignField': '_id',
+                'as': 'user_info'
             }
-        ]
-        
-        appointments_cursor = mongo.db.appointments.aggregate(pipeline)
-        appointments = list(appointments_cursor)
-        
-        print(f"🔍 Found {len(appointments)} appointments with user details")
-        
-        # Convert to serializable format
-        serialized_appointments = []
-        for apt in appointments:
-            serialized_apt = {
-                '_id': str(apt['_id']),
-                'user_id': apt['user_id'],
-                'date': apt['date'],
-                'preferred_time': apt['preferred_time'],
-                'concern_type': apt['concern_type'],
-                'status': apt.get('status', 'Pending'),
-                'created_at': apt.get('created_at', ''),
-                'user_info': {
-                    'username': apt.get('user_info', {}).get('username', 'Unknown'),
-                    'id_number': apt.get('user_info', {}).get('id_number', 'Unknown')
-                } if apt.get('user_info') else {}
+        },
+        {
+            '$unwind': {
+                'path': '$user_info',
+                'preserveNullAndEmptyArrays': True
             }
-            serialized_appointments.append(serialized_apt)
-        
-        return serialized_appointments
+        },
+        {
+            '$project': APPOINTMENT_ADMIN_PROJECTION
+        }
+    ])
+    return pipeline
+
+def iter_appointments_with_user_details(limit=None, after=None, start=None, end=None):
+    """Page through appointments with user information without materializing the result set.
+
+    `after` is a decoded cursor as returned by decode_appointment_cursor and
+    [start, end) an optional slot_start range. The aggregation is started here
+    so connection errors surface before streaming. Reads use the 'lists'
+    read preference, which may point at secondaries.
+    """
+    db = reads('lists')
+    pipeline = appointments_with_user_details_pipeline(limit=limit, after=after, start=start, end=end, join=APPOINTMENT_USER_JOIN)
+    cursor = db.appointments.aggregate(pipeline)
+    if APPOINTMENT_USER_JOIN == 'app':
+        cursor = _joined_in_app(cursor, db.users)
+    return AppointmentPage(cursor, limit=limit)
+
+def get_appointments_with_user_details():
+    """Get all appointments with user information using aggregation"""
+    try:
+        appointments = list(iter_appointments_with_user_details())
+        logger.debug('appointments_with_user_details_found', count=len(appointments))
+        return appointments
         
     except Exception as e:
-        print(f"❌ Error getting appointments with user details: {e}")
+        logger.error('appointments_with_user_details_failed', exc_info=True)
         return []
 
 def debug_appointments():
     """Debug function to see all appointments and their structure"""
     try:
-        print("🔍 DEBUG: All appointments in database:")
         appointments = list(mongo.db.appointments.find())
-        print(f"Total appointments: {len(appointments)}")
+        logger.debug('debug_appointments', count=len(appointments))
         
-        for i, apt in enumerate(appointments):
-            print(f"Appointment {i+1}:")
-            print(f"  _id: {apt['_id']} (type: {type(apt['_id'])})")
-            print(f"  user_id: {apt.get('user_id', 'N/A')}")
-            print(f"  date: {apt.get('date', 'N/A')}")
-            print(f"  status: {apt.get('status', 'N/A')}")
-            print(f"  concern_type: {apt.get('concern_type', 'N/A')}")
-            print("  ---")
+        if logger.is_debug():
+            for apt in appointments:
+                # High-volume event; thinned out by LOG_DEBUG_SAMPLE_RATE
+                logger.debug(
+                    'debug_appointment',
+                    _id=str(apt['_id']),
+                    id_type=type(apt['_id']).__name__,
+                    user_id=apt.get('user_id', 'N/A'),
+                    date=apt.get('date', 'N/A'),
+                    status=apt.get('status', 'N/A'),
+                    concern_type=apt.get('concern_type', 'N/A')
+                )
             
         return appointments
     except Exception as e:
-        print(f"❌ Error debugging appointments: {e}")
+        logger.error('debug_appointments_failed', exc_info=True)
         return []
\ No newline at end of file
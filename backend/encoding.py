@@ -0,0 +1,235 @@
+"""Response encoding: a pluggable JSON provider and Accept-Encoding negotiated compression.
+
+orjson is used when it is installed and the standard library otherwise; both
+render ObjectId as its hex string and dates as ISO 8601, so responses look the
+same whichever is in use. brotli is likewise optional, gzip is always there.
+"""
+import dataclasses
+import decimal
+import uuid
+import zlib
+from datetime import date
+from bson import ObjectId
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Types worth compressing; event streams are excluded so every event is flushed as it happens
+COMPRESSIBLE_TYPES = ('application/json', 'text/plain')
+
+
+def _default(value):
+    """Types neither JSON library knows about natively"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson when available.
+
+    Keys are emitted in insertion order and non-ASCII text as UTF-8, which is
+    cheaper than Flask's sorted, escaped default and is what orjson does anyway.
+    """
+
+    default = staticmethod(_default)
+    ensure_ascii = False
+    sort_keys = False
+
+    def __init__(self, app, backend='auto'):
+        super().__init__(app)
+        if backend == 'orjson' and orjson is None:
+            raise RuntimeError('JSON_ENCODER is orjson but the orjson package is not installed')
+        self.backend = 'json' if backend == 'json' or orjson is None else 'orjson'
+
+    def _orjson_options(self, kwargs):
+        """orjson options matching json.dumps kwargs, or None if they need the standard library"""
+        if self.backend != 'orjson' or set(kwargs) - {'indent', 'separators', 'sort_keys', 'default'}:
+            return None
+        options = orjson.OPT_NON_STR_KEYS
+        if kwargs.get('indent'):
+            options |= orjson.OPT_INDENT_2
+        if kwargs.get('sort_keys', self.sort_keys):
+            options |= orjson.OPT_SORT_KEYS
+        return options
+
+    def encode(self, obj, **kwargs):
+        """Serialize obj to UTF-8 JSON bytes"""
+        options = self._orjson_options(kwargs)
+        if options is None:
+            return self.dumps(obj, **kwargs).encode('utf-8')
+        return orjson.dumps(obj, default=kwargs.get('default', self.default), option=options)
+
+    def dumps(self, obj, **kwargs):
+        options = self._orjson_options(kwargs)
+        if options is None:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=kwargs.get('default', self.default), option=options).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if self.backend == 'orjson' and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        dump_args = {}
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            dump_args['indent'] = 2
+        else:
+            dump_args['separators'] = (',', ':')
+        return self._app.response_class(self.encode(obj, **dump_args) + b'\n', mimetype=self.mimetype)
+
+
+def negotiate(accept_encoding, available):
+    """Pick a content coding from an Accept-Encoding header, or None for identity.
+
+    `available` lists the server's codings in order of preference, which breaks
+    ties between codings the client rates equally.
+    """
+    ratings = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        ratings[coding] = quality
+
+    best, best_quality = None, 0.0
+    for coding in available:
+        quality = ratings.get(coding, ratings.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class _BrotliStream:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+class Compression:
+    """Compression settings shared by the Flask hook and the ASGI middleware"""
+
+    def __init__(self):
+        self.codings = ()
+        self.min_size = 1024
+        self.gzip_level = 1
+        self.brotli_quality = 4
+
+    def configure(self, codings, min_size=1024, gzip_level=1, brotli_quality=4):
+        codings = tuple(coding for coding in codings if coding)
+        unknown = set(codings) - {'br', 'gzip'}
+        if unknown:
+            raise ValueError(f'Unsupported RESPONSE_COMPRESSION codings: {", ".join(sorted(unknown))}')
+        # brotli is optional; without it only gzip is offered
+        self.codings = tuple(coding for coding in codings if coding != 'br' or brotli is not None)
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def compressible(self, content_type):
+        """Whether responses of content_type vary by Accept-Encoding"""
+        return bool(self.codings) and (content_type or '').split(';')[0].strip() in COMPRESSIBLE_TYPES
+
+    def choose(self, accept_encoding, content_type):
+        """Coding to apply to a response of content_type, or None to send it as is"""
+        if not self.compressible(content_type):
+            return None
+        return negotiate(accept_encoding, self.codings)
+
+    def compressor(self, coding):
+        """Incremental compressor with compress(chunk) and flush()"""
+        if coding == 'br':
+            return _BrotliStream(self.brotli_quality)
+        # wbits 31 selects the gzip container
+        return zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data, coding):
+        compressor = self.compressor(coding)
+        return compressor.compress(data) + compressor.flush()
+
+    def compress_stream(self, chunks, coding):
+        compressor = self.compressor(coding)
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+            yield compressor.flush()
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+
+compression = Compression()
+
+
+def init_app(app):
+    """Install the JSON provider and compress eligible responses"""
+    from flask import request
+
+    app.json = JSONProvider(app, backend=app.config.get('JSON_ENCODER', 'auto'))
+    compression.configure(
+        app.config.get('RESPONSE_COMPRESSION', ()),
+        min_size=app.config.get('COMPRESSION_MIN_SIZE', 1024),
+        gzip_level=app.config.get('COMPRESSION_GZIP_LEVEL', 1),
+        brotli_quality=app.config.get('COMPRESSION_BROTLI_QUALITY', 4)
+    )
+
+    @app.after_request
+    def _compress_response(response):
+        if not compression.compressible(response.mimetype):
+            return response
+        response.vary.add('Accept-Encoding')
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or response.direct_passthrough or 'Content-Encoding' in response.headers):
+            return response
+        coding = compression.choose(request.headers.get('Accept-Encoding'), response.mimetype)
+        if coding is None:
+            return response
+        if response.is_streamed:
+            response.response = compression.compress_stream(response.response, coding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < compression.min_size:
+                return response
+            response.set_data(compression.compress(data, coding))
+        response.headers['Content-Encoding'] = coding
+        # A compressed body is a different representation; only weak comparison still matches it
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
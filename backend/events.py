@@ -0,0 +1,224 @@
+import asyncio
+import queue
+import threading
+import time
+from log import get_logger
+
+logger = get_logger(__name__)
+
+ADMIN_CHANNEL = 'admin'
+
+# Fixed frames of the SSE stream: reconnect delay, 'refetch everything' after an overflow, heartbeat
+SSE_RETRY = 'retry: 3000\n\n'
+SSE_RESYNC = 'event: resync\ndata: {}\n\n'
+SSE_KEEP_ALIVE = ': keep-alive\n\n'
+
+
+def sse_frame(event, dumps):
+    """One published event as an SSE message"""
+    return f"event: {event['type']}\ndata: {dumps(event['appointment'])}\n\n"
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class Subscription:
+    """Bounded mailbox for one SSE client; overflowing marks it for a full resync"""
+
+    def __init__(self, channel, max_pending=100):
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.overflowed = False
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        return self.queue.get(timeout=timeout)
+
+
+class AsyncSubscription(Subscription):
+    """Subscription an asyncio task waits on without holding a thread; create it on the event loop"""
+
+    def __init__(self, channel, max_pending=100):
+        super().__init__(channel, max_pending)
+        self._loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+
+    def deliver(self, event):
+        # Publishers run on request threads and the change stream thread as well as on the loop
+        super().deliver(event)
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # Loop already closed during shutdown
+            pass
+
+    async def get_async(self, timeout):
+        """Next event, raising queue.Empty after timeout seconds like Subscription.get"""
+        while True:
+            try:
+                return self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self._ready.clear()
+            # Re-checked after clearing so a delivery in between is not slept through
+            if not self.queue.empty():
+                continue
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                raise queue.Empty
+
+
+class EventBroker:
+    """In-process pub/sub that fans appointment events out to SSE subscribers"""
+
+    def __init__(self, max_subscribers=1000):
+        self.max_subscribers = max_subscribers
+        self._channels = {}
+        self._listeners = []
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        """Call listener(event) synchronously for every published event, e.g. to maintain in-memory indexes"""
+        self._listeners.append(listener)
+
+    def subscribe(self, channel, max_pending=100, subscription_class=Subscription):
+        """Register a subscriber, returns None when the broker is at capacity"""
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                return None
+            subscription = subscription_class(channel, max_pending)
+            self._channels.setdefault(channel, set()).add(subscription)
+            self._count += 1
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers and subscription in subscribers:
+                subscribers.discard(subscription)
+                self._count -= 1
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def publish(self, event):
+        """Deliver an appointment event to its owner's channel and to the admin channel"""
+        channels = [ADMIN_CHANNEL]
+        user_id = event.get('appointment', {}).get('user_id')
+        if user_id:
+            channels.append(user_channel(user_id))
+        with self._lock:
+            targets = [s for channel in channels for s in self._channels.get(channel, ())]
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception:
+                logger.error('event_listener_failed', exc_info=True, event_type=event.get('type'))
+        for subscription in targets:
+            subscription.deliver(event)
+
+    def subscriber_count(self):
+        return self._count
+
+
+broker = EventBroker()
+
+# True while a MongoDB change stream feeds the broker; the data layer then stops
+# publishing locally so every worker sees each event exactly once.
+_change_stream_active = threading.Event()
+_watcher = None
+
+
+def change_stream_active():
+    return _change_stream_active.is_set()
+
+
+def notify(event_type, appointment):
+    """Publish an event from the data layer unless the change stream will deliver it"""
+    if not _change_stream_active.is_set():
+        broker.publish({'type': event_type, 'appointment': appointment})
+
+
+def _serialize_change(change):
+    """Map a change stream document onto the event published to subscribers"""
+    document = change.get('fullDocument') or {}
+    appointment = {
+        '_id': str(change['documentKey']['_id']),
+        'user_id': str(document['user_id']) if document.get('user_id') is not None else None,
+        'date': document.get('date'),
+        'preferred_time': document.get('preferred_time'),
+        'counselor_id': document.get('counselor_id'),
+        'status': document.get('status')
+    }
+    if change['operationType'] == 'insert':
+        appointment['concern_type'] = document.get('concern_type')
+        return {'type': 'appointment_created', 'appointment': appointment}
+    updated_fields = change.get('updateDescription', {}).get('updatedFields', {})
+    if 'status' not in updated_fields:
+        return None
+    appointment['status'] = updated_fields['status']
+    appointment['previous_status'] = updated_fields.get('previous_status')
+    return {'type': 'appointment_status_changed', 'appointment': appointment}
+
+
+class ChangeStreamWatcher(threading.Thread):
+    """Tails the appointments change stream and republishes inserts and status updates"""
+
+    # The app writes appointments outside transactions; data migrations rewrite them inside
+    # one (migrations/object_ids.py) and must not reach subscribers as new appointments
+    pipeline = [{'$match': {'operationType': {'$in': ['insert', 'update']}, 'txnNumber': {'$exists': False}}}]
+
+    def __init__(self, collection, retry_seconds=5):
+        super().__init__(name='appointments-change-stream', daemon=True)
+        self.collection = collection
+        self.retry_seconds = retry_seconds
+        self.resume_token = None
+        self._stopping = threading.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    def run(self):
+        while not self._stopping.is_set():
+            try:
+                with self.collection.watch(self.pipeline, full_document='updateLookup',
+                                           resume_after=self.resume_token, max_await_time_ms=1000) as stream:
+                    _change_stream_active.set()
+                    logger.info('change_stream_started')
+                    while not self._stopping.is_set() and stream.alive:
+                        change = stream.try_next()
+                        if change is None:
+                            continue
+                        self.resume_token = stream.resume_token
+                        event = _serialize_change(change)
+                        if event:
+                            broker.publish(event)
+            except (NotImplementedError, TypeError):
+                # Client or test double without change stream support
+                break
+            except Exception as e:
+                # Standalone servers (code 40573) cannot open change streams at all
+                if getattr(e, 'code', None) == 40573 or 'replica set' in str(e):
+                    break
+                logger.error('change_stream_failed', exc_info=True)
+                time.sleep(self.retry_seconds)
+            finally:
+                _change_stream_active.clear()
+        if not self._stopping.is_set():
+            logger.warning('change_stream_unavailable', fallback='in-process')
+
+
+def init_app(app):
+    global _watcher
+    broker.max_subscribers = app.config.get('SSE_MAX_SUBSCRIBERS', 1000)
+    if app.config.get('EVENTS_CHANGE_STREAM', True) and _watcher is None:
+        from database import mongo
+        _watcher = ChangeStreamWatcher(mongo.db.appointments)
+        _watcher.start()
@@ -0,0 +1,69 @@
+# Production launcher: `gunicorn -c gunicorn.conf.py` from the backend directory.
+#
+# Every worker imports and builds the app itself (no preload), so each one gets
+# its own MongoClient, warmed pool and background threads after fork. `kill -HUP`
+# on the master starts a fresh set of workers before the old ones are told to
+# finish their in-flight requests, so a reload does not drop connections.
+#
+# The ETag version stamps and the user cache live in each process unless CACHE_URL
+# (redis://...) shares them, and a worker that missed a write would answer 304
+# with a stale list. So there is one worker by default, cpu*2+1 once CACHE_URL is
+# set, and create_app() refuses to start more than one worker without it.
+# The availability index and SSE broker are fed by the MongoDB change stream in
+# every worker, which needs a replica set (Atlas is one).
+import multiprocessing
+import os
+from dotenv import load_dotenv
+
+# Same environment the app sees, so CACHE_URL in .env counts here too
+load_dotenv()
+
+bind = os.environ.get('WEB_BIND', '0.0.0.0:5000')
+
+workers = int(os.environ.get('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1 if os.environ.get('CACHE_URL') else 1))
+preload_app = False
+
+if os.environ.get('WEB_ASGI', '').lower() in ('1', 'true', 'yes'):
+    # asgi:app on uvicorn workers: the Motor endpoints and the event stream run on the
+    # event loop, so open /appointments/stream connections cost no thread
+    wsgi_app = 'asgi:app'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'app:create_app()'
+    worker_class = 'gthread'
+    # Under gthread every open /appointments/stream holds a thread for as long as the
+    # dashboard is open. WEB_THREADS serve ordinary requests (they mostly wait on Atlas;
+    # bcrypt runs on its own pool) and WEB_SSE_STREAMS more threads are reserved for
+    # streams. The broker refuses streams beyond that with 503, so open dashboards can
+    # never take the threads the other routes need. Set WEB_SSE_STREAMS to the expected
+    # open dashboards divided by the workers, or use WEB_ASGI for many streams.
+    sse_streams = int(os.environ.get('WEB_SSE_STREAMS', 4))
+    threads = int(os.environ.get('WEB_THREADS', 8)) + sse_streams
+    os.environ.setdefault('SSE_MAX_SUBSCRIBERS', str(sse_streams))
+
+# Requests are allowed `graceful_timeout` seconds to finish on reload or shutdown.
+# SSE streams are long-lived, so they are cut when it expires; clients reconnect
+# on their own after the `retry` interval the stream announces.
+timeout = int(os.environ.get('WEB_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('WEB_KEEPALIVE', 5))
+
+# Recycle workers now and then to bound slow leaks; jitter keeps them from restarting together
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', 50))
+
+# The app logs structured JSON to stdout itself
+accesslog = os.environ.get('WEB_ACCESS_LOG')
+errorlog = '-'
+
+# Seen by create_app() in each worker, which refuses to run several without a shared cache
+os.environ['WEB_WORKERS'] = str(workers)
+
+
+def worker_exit(server, worker):
+    # Drain the log queue and close pooled sockets once the worker stops serving
+    import log
+    from database import mongo
+    if mongo.cx is not None:
+        mongo.cx.close()
+    log.shutdown_logging()
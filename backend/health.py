@@ -0,0 +1,94 @@
+import threading
+import time
+from datetime import datetime
+import database
+from log import get_logger
+
+logger = get_logger(__name__)
+
+COUNTED_COLLECTIONS = ('users', 'appointments', 'slots')
+
+
+class HealthMonitor(threading.Thread):
+    """Pings the cluster on an interval and keeps the last result for health checks and write paths.
+
+    Collection counts come from estimated_document_count (collection metadata,
+    no scan), so the check stays cheap however large the collections grow.
+    """
+
+    def __init__(self, interval=10):
+        super().__init__(name='mongo-health', daemon=True)
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._state = {
+            'connected': None,
+            'rtt_ms': None,
+            'collections': {},
+            'checked_at': None,
+            'last_ok_at': None,
+            'consecutive_failures': 0,
+            'error': None
+        }
+
+    def check(self):
+        """Run one check now and update the cached state"""
+        start = time.perf_counter()
+        try:
+            database.mongo.db.command('ping')
+            rtt_ms = round((time.perf_counter() - start) * 1000, 2)
+            collections = {name: database.mongo.db[name].estimated_document_count() for name in COUNTED_COLLECTIONS}
+        except Exception as e:
+            with self._lock:
+                was_connected = self._state['connected']
+                self._state.update(
+                    connected=False,
+                    checked_at=datetime.utcnow().isoformat(),
+                    consecutive_failures=self._state['consecutive_failures'] + 1,
+                    error=str(e)
+                )
+            if was_connected is not False:
+                logger.error('database_unreachable', error=str(e))
+            return
+
+        now = datetime.utcnow().isoformat()
+        with self._lock:
+            was_connected = self._state['connected']
+            self._state.update(
+                connected=True,
+                rtt_ms=rtt_ms,
+                collections=collections,
+                checked_at=now,
+                last_ok_at=now,
+                consecutive_failures=0,
+                error=None
+            )
+        if was_connected is False:
+            logger.info('database_reachable', rtt_ms=rtt_ms)
+
+    def state(self):
+        with self._lock:
+            return dict(self._state, collections=dict(self._state['collections']))
+
+    def available(self):
+        """False only once a check has actually failed; unknown counts as available"""
+        with self._lock:
+            return self._state['connected'] is not False
+
+    def stop(self):
+        self._stopping.set()
+
+    def run(self):
+        while not self._stopping.wait(self.interval):
+            self.check()
+
+
+monitor = HealthMonitor()
+
+
+def init_app(app):
+    """Take a first reading synchronously, then keep refreshing in the background"""
+    monitor.interval = app.config.get('HEALTH_CHECK_SECONDS', 10)
+    monitor.check()
+    if monitor.interval and not monitor.is_alive():
+        monitor.start()
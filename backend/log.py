@@ -0,0 +1,169 @@
+import atexit
+import json
+import logging
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Field names whose values never reach the log output
+SENSITIVE_KEYS = {'password', 'password_hash', 'token', 'secret', 'secret_key', 'authorization', 'cookie'}
+REDACTED = '[REDACTED]'
+
+_listener = None
+_queue_handler = None
+
+
+def redact(value):
+    """Return a copy of value with every sensitive key masked, recursing into dicts and lists"""
+    if isinstance(value, dict):
+        return {k: REDACTED if str(k).lower() in SENSITIVE_KEYS else redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, event and the event fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage()
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(redact(fields))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps one in every `1 / rate` DEBUG records per event; other levels always pass"""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno != logging.DEBUG or self.every == 1:
+            return True
+        if self.every == 0:
+            return False
+        with self._lock:
+            count = self._counts.get(record.msg, 0)
+            self._counts[record.msg] = count + 1
+        return count % self.every == 0
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread; only freeze the message here
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class StructuredLogger:
+    """Thin wrapper that logs an event name plus keyword fields.
+
+    Level checks happen before any record is built, so disabled debug calls
+    cost a single method call.
+    """
+
+    __slots__ = ('_logger',)
+
+    def __init__(self, logger):
+        self._logger = logger
+
+    def _log(self, level, event, exc_info, fields):
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, event, exc_info=exc_info, extra={'fields': fields})
+
+    def debug(self, event, **fields):
+        self._log(logging.DEBUG, event, False, fields)
+
+    def info(self, event, **fields):
+        self._log(logging.INFO, event, False, fields)
+
+    def warning(self, event, **fields):
+        self._log(logging.WARNING, event, False, fields)
+
+    def error(self, event, exc_info=False, **fields):
+        self._log(logging.ERROR, event, exc_info, fields)
+
+    def critical(self, event, exc_info=False, **fields):
+        self._log(logging.CRITICAL, event, exc_info, fields)
+
+    def is_debug(self):
+        return self._logger.isEnabledFor(logging.DEBUG)
+
+
+def get_logger(name):
+    return StructuredLogger(logging.getLogger(name))
+
+
+def configure_logging(level='INFO', debug_sample_rate=1.0, queue_size=10000, stream=None):
+    """Route all app logging through a bounded queue to a JSON stream handler on a background thread"""
+    global _listener, _queue_handler
+
+    if _listener is not None:
+        _listener.stop()
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    stream_handler = logging.StreamHandler(stream or sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _queue_handler.addFilter(SamplingFilter(debug_sample_rate))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_records():
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+def init_app(app):
+    configure_logging(
+        level=app.config.get('LOG_LEVEL', 'INFO'),
+        debug_sample_rate=app.config.get('LOG_DEBUG_SAMPLE_RATE', 1.0),
+        queue_size=app.config.get('LOG_QUEUE_SIZE', 10000)
+    )
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,211 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from pymongo import monitoring
+
+# Seconds; from a cached lookup up to a slow bcrypt registration
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROUND_TRIP_BUCKETS = (0, 1, 2, 3, 4, 5, 8, 13, 21, 50)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, rendered in the Prometheus text format"""
+
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        for labels, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{_label_text(self.label_names, labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{self.name}_sum{_label_text(self.label_names, labels)} {total}')
+            lines.append(f'{self.name}_count{_label_text(self.label_names, labels)} {count}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f'{self.name}{_label_text(self.label_names, labels)} {value}')
+        return lines
+
+
+request_latency = Histogram(
+    'http_request_duration_seconds', 'Time to produce the response, by route template, method and status',
+    ('route', 'method', 'status')
+)
+request_db_time = Histogram(
+    'http_request_db_seconds', 'Time spent in MongoDB commands per request, by route template',
+    ('route', 'method')
+)
+request_db_round_trips = Histogram(
+    'http_request_db_round_trips', 'MongoDB commands issued per request, by route template',
+    ('route', 'method'), buckets=ROUND_TRIP_BUCKETS
+)
+db_command_latency = Histogram(
+    'mongodb_command_duration_seconds', 'MongoDB command latency, by command name',
+    ('command',)
+)
+db_command_failures = Counter(
+    'mongodb_command_failures_total', 'Failed MongoDB commands, by command name',
+    ('command',)
+)
+throttled_requests = Counter(
+    'http_requests_throttled_total', 'Requests refused by admission control, by endpoint and reason (ip, account, concurrency)',
+    ('endpoint', 'reason')
+)
+
+REGISTRY = [request_latency, request_db_time, request_db_round_trips, db_command_latency, db_command_failures, throttled_requests]
+
+
+class RequestStats:
+    """Database time and round trips of one request, filled in by the command listener"""
+
+    __slots__ = ('started', 'db_seconds', 'round_trips')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_seconds = 0.0
+        self.round_trips = 0
+
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+def start_request():
+    """Begin attributing database commands on this thread / task to a new request"""
+    stats = RequestStats()
+    _current.set(stats)
+    return stats
+
+
+def server_timing(stats):
+    """Server-Timing header value for the request so far"""
+    elapsed = time.perf_counter() - stats.started
+    return f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.round_trips} round trips", total;dur={elapsed * 1000:.2f}'
+
+
+def finish_request(stats, route, method, status):
+    """Record a finished request; returns its Server-Timing header value"""
+    _current.set(None)
+    timing = server_timing(stats)
+    request_latency.observe(time.perf_counter() - stats.started, route, method, str(status))
+    request_db_time.observe(stats.db_seconds, route, method)
+    request_db_round_trips.observe(stats.round_trips, route, method)
+    return timing
+
+
+class CommandTimer(monitoring.CommandListener):
+    """Times every MongoDB command and charges it to the request that issued it.
+
+    pymongo publishes command events on the thread that ran the command and
+    Motor runs commands with the caller's context copied, so the request's
+    RequestStats is reachable through a context variable in both stacks.
+    Commands issued by background threads are only counted globally.
+    """
+
+    def started(self, event):
+        pass
+
+    def _record(self, event):
+        seconds = event.duration_micros / 1e6
+        stats = _current.get()
+        if stats is not None:
+            stats.db_seconds += seconds
+            stats.round_trips += 1
+        return seconds
+
+    def succeeded(self, event):
+        db_command_latency.observe(self._record(event), event.command_name)
+
+    def failed(self, event):
+        db_command_latency.observe(self._record(event), event.command_name)
+        db_command_failures.inc(event.command_name)
+
+
+command_timer = CommandTimer()
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def init_app(app):
+    """Time every Flask request and expose the registry at /metrics"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g.request_stats = start_request()
+
+    @app.after_request
+    def _record_request(response):
+        stats = g.pop('request_stats', None)
+        if stats is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        if response.is_streamed:
+            # The body (and its getMores) is produced after this hook, so the request is recorded once the
+            # server closes the response; the header can only cover the time to the first byte
+            method, status = request.method, response.status_code
+            response.headers['Server-Timing'] = server_timing(stats)
+            response.call_on_close(lambda: finish_request(stats, route, method, status))
+        else:
+            response.headers['Server-Timing'] = finish_request(stats, route, request.method, response.status_code)
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return Response(render(), mimetype=None, content_type=CONTENT_TYPE)
@@ -0,0 +1,49 @@
+"""Data migrations; run from backend/ with `python -m migrations.<name>`.
+
+Migrations run online against the configured database (MONGO_* variables, or
+MIGRATION_MONGO_URI to point elsewhere) in small batches, so the app keeps
+serving while they run. Each one only touches documents still in the old
+shape, so an interrupted run is resumed by starting it again.
+"""
+import os
+import time
+from dotenv import load_dotenv
+from flask import Flask
+import config
+import database
+import log
+
+load_dotenv()
+
+
+def migration_app():
+    """Flask app connected to the migration target, without the request-serving machinery"""
+    app = Flask(__name__)
+    config.init_app(app)
+    app.config['MONGO_URI'] = os.environ.get('MIGRATION_MONGO_URI') or app.config['MONGO_URI']
+    app.config['MONGO_MAX_POOL_SIZE'] = 4
+    app.config['MONGO_MIN_POOL_SIZE'] = app.config['MONGO_WARM_POOL'] = 0
+    log.configure_logging(level=os.environ.get('LOG_LEVEL', 'WARNING'))
+    database.init_app(app)
+    return app
+
+
+def run_batches(migrate_batch, batch_size, pause, label):
+    """Call migrate_batch(batch_size) until it reports no work left, sleeping `pause` seconds between batches.
+
+    migrate_batch returns a dict of counters for the batch; a batch whose
+    counters are all zero ends the run. Returns the summed counters.
+    """
+    totals = {}
+    start = time.perf_counter()
+    while True:
+        counts = migrate_batch(batch_size)
+        if not any(counts.values()):
+            break
+        for name, value in counts.items():
+            totals[name] = totals.get(name, 0) + value
+        progress = ', '.join(f'{name} {value}' for name, value in totals.items())
+        print(f'{label}: {progress} ({time.perf_counter() - start:.1f}s)')
+        if pause:
+            time.sleep(pause)
+    return totals
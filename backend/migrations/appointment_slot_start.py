@@ -0,0 +1,88 @@
+"""Backfill the typed appointment fields on documents written before they existed.
+
+    python -m migrations.appointment_slot_start --batch-size 500 --pause 0.2
+    python -m migrations.appointment_slot_start --dry-run
+
+Sets slot_start from the date and preferred_time strings, turns ISO string
+created_at values into dates and drops the stored formatted_created_at. Every
+update is conditional on slot_start still being absent, so documents the app
+writes meanwhile (which already carry slot_start) are never overwritten.
+Documents whose strings do not parse get slot_start null and are reported;
+they drop out of date-range queries until fixed by hand.
+"""
+import argparse
+from datetime import datetime
+from pymongo import UpdateOne
+import database
+from migrations import migration_app, run_batches
+from models import slot_start
+
+MISSING_SLOT_START = {'slot_start': {'$exists': False}}
+PROJECTION = {'date': 1, 'preferred_time': 1, 'created_at': 1}
+
+
+def _created_at(value):
+    """Stored created_at as a datetime, or None to leave it as it is"""
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+def plan_update(document):
+    """The $set / $unset that brings one appointment document to the typed schema"""
+    update = {
+        '$set': {'slot_start': slot_start(document.get('date'), document.get('preferred_time'))},
+        '$unset': {'formatted_created_at': ''}
+    }
+    created_at = _created_at(document.get('created_at'))
+    if created_at is not None:
+        update['$set']['created_at'] = created_at
+    return update
+
+
+def migrate_batch(batch_size):
+    documents = list(database.mongo.db.appointments.find(MISSING_SLOT_START, PROJECTION).limit(batch_size))
+    if not documents:
+        return {'converted': 0, 'unparseable': 0}
+    updates = [(document['_id'], plan_update(document)) for document in documents]
+    database.mongo.db.appointments.bulk_write(
+        [UpdateOne(dict(MISSING_SLOT_START, _id=_id), update) for _id, update in updates],
+        ordered=False
+    )
+    unparseable = [_id for _id, update in updates if update['$set']['slot_start'] is None]
+    for _id in unparseable:
+        print(f'unparseable date/preferred_time: {_id}')
+    return {'converted': len(updates) - len(unparseable), 'unparseable': len(unparseable)}
+
+
+def dry_run():
+    counts = {'convertible': 0, 'unparseable': 0}
+    for document in database.mongo.db.appointments.find(MISSING_SLOT_START, PROJECTION):
+        if plan_update(document)['$set']['slot_start'] is None:
+            counts['unparseable'] += 1
+            print(f'unparseable date/preferred_time: {document["_id"]}')
+        else:
+            counts['convertible'] += 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--pause', type=float, default=0.2, help='seconds to sleep between batches')
+    parser.add_argument('--dry-run', action='store_true', help='report what would change without writing')
+    args = parser.parse_args()
+
+    migration_app()
+    if args.dry_run:
+        print(f'dry run: {dry_run()}')
+        return
+    totals = run_batches(migrate_batch, args.batch_size, args.pause, 'appointments')
+    print(f'done: {totals or "nothing to migrate"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Find users sharing a username or id_number, which stop the unique indexes from being built.
+
+    python -m migrations.duplicate_users
+    python -m migrations.duplicate_users --rename
+
+The app refuses to start while username_unique or id_number_unique cannot be
+created. This lists every duplicated value with its accounts, oldest first,
+and how many appointments each one holds. --rename keeps the oldest account
+as it is and suffixes the value of the others with the end of their _id
+(e.g. jdoe~3f9a1c), so no account or appointment is lost; tell those students
+their new username, or merge their appointments by hand first.
+"""
+import argparse
+import database
+from migrations import migration_app
+
+FIELDS = ('username', 'id_number')
+
+
+def duplicates(field):
+    """{value: [user documents, oldest first]} for every value of field held by more than one user"""
+    pipeline = [
+        {'$match': {field: {'$ne': None}}},
+        {'$sort': {'created_at': 1, '_id': 1}},
+        {'$group': {'_id': f'${field}', 'users': {'$push': {'_id': '$_id', 'created_at': '$created_at'}}, 'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}}
+    ]
+    return {group['_id']: group['users'] for group in database.mongo.db.users.aggregate(pipeline)}
+
+
+def renamed(value, user_id):
+    return f'{value}~{str(user_id)[-6:]}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rename', action='store_true', help='rename all but the oldest account holding each value')
+    args = parser.parse_args()
+
+    migration_app()
+    db = database.mongo.db
+    found = 0
+    for field in FIELDS:
+        for value, users in duplicates(field).items():
+            found += 1
+            print(f'{field} {value!r}:')
+            for position, user in enumerate(users):
+                # Appointments not yet converted by migrations.object_ids hold the id as a string
+                appointments = db.appointments.count_documents({'user_id': {'$in': [user['_id'], str(user['_id'])]}})
+                action = ''
+                if args.rename and position:
+                    db.users.update_one({'_id': user['_id'], field: value}, {'$set': {field: renamed(value, user['_id'])}})
+                    action = f' -> renamed to {renamed(value, user["_id"])!r}'
+                print(f"  {user['_id']} created {user.get('created_at')}, {appointments} appointments{action}")
+    if not found:
+        print('no duplicate usernames or id numbers')
+    elif not args.rename:
+        print(f'{found} duplicated values; rerun with --rename to make them unique')
+
+
+if __name__ == '__main__':
+    main()
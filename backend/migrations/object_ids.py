@@ -0,0 +1,126 @@
+"""Give users and appointments one id type: ObjectId for every _id and appointments.user_id.
+
+    python -m migrations.object_ids --batch-size 200 --pause 0.2
+    python -m migrations.object_ids --dry-run
+
+An _id cannot be changed in place, so documents stored under a hex string _id
+are re-inserted under the ObjectId and the originals deleted, one transaction
+per batch (Atlas runs as a replica set, which transactions need). The
+documents are re-read inside the transaction, so a concurrent write from the
+app aborts and retries the batch instead of being lost. appointments.user_id
+is converted in place. Ids that are not 24-digit hex strings are left alone
+and reported.
+
+The app matches both forms meanwhile (database.id_match), so this can run
+while it serves; once it finishes the users $lookup joins on matching types
+and uses the users _id index.
+"""
+import argparse
+from bson import ObjectId
+from pymongo import UpdateOne
+import database
+from migrations import migration_app, run_batches
+from models import object_id
+
+HEX_ID = '^[0-9a-fA-F]{24}$'
+
+
+def canonical_document(document):
+    """Copy of a document under its ObjectId _id, with user_id converted too"""
+    document = dict(document, _id=ObjectId(document['_id']))
+    if 'user_id' in document:
+        document['user_id'] = object_id(document['user_id'])
+    return document
+
+
+class StringIds:
+    """Walks one collection's string _ids in order and re-keys the hex ones as ObjectIds"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.last = ''
+
+    def _replace(self, ids, session):
+        documents = list(self.collection.find({'_id': {'$in': ids}}, session=session))
+        if documents:
+            self.collection.delete_many({'_id': {'$in': [document['_id'] for document in documents]}}, session=session)
+            self.collection.insert_many([canonical_document(document) for document in documents], session=session)
+
+    def __call__(self, batch_size):
+        query = {'_id': {'$type': 'string', '$gt': self.last}}
+        ids = [document['_id'] for document in self.collection.find(query, {'_id': 1}).sort('_id', 1).limit(batch_size)]
+        if not ids:
+            return {'converted': 0, 'skipped': 0}
+        self.last = ids[-1]
+        convertible = [_id for _id in ids if ObjectId.is_valid(_id)]
+        for _id in set(ids) - set(convertible):
+            print(f'{self.collection.name}: not a hex id, left as is: {_id!r}')
+        if convertible:
+            with database.mongo.cx.start_session() as session:
+                session.with_transaction(lambda s: self._replace(convertible, s))
+        return {'converted': len(convertible), 'skipped': len(ids) - len(convertible)}
+
+
+class StringUserIds:
+    """Converts appointments.user_id hex strings to ObjectIds in place"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __call__(self, batch_size):
+        # Converted documents drop out of the query, so no position needs to be kept
+        query = {'user_id': {'$type': 'string', '$regex': HEX_ID}}
+        documents = list(self.collection.find(query, {'user_id': 1}).limit(batch_size))
+        if not documents:
+            return {'converted': 0}
+        self.collection.bulk_write([
+            # Guarded on the old value so a concurrent change is not overwritten
+            UpdateOne({'_id': document['_id'], 'user_id': document['user_id']}, {'$set': {'user_id': ObjectId(document['user_id'])}})
+            for document in documents
+        ], ordered=False)
+        return {'converted': len(documents)}
+
+
+def dry_run():
+    db = database.mongo.db
+    counts = {}
+    for name in ('users', 'appointments'):
+        ids = [document['_id'] for document in db[name].find({'_id': {'$type': 'string'}}, {'_id': 1})]
+        convertible = sum(1 for _id in ids if ObjectId.is_valid(_id))
+        counts[f'{name} string _id'] = convertible
+        counts[f'{name} non-hex _id'] = len(ids) - convertible
+    user_ids = [document['user_id'] for document in db.appointments.find({'user_id': {'$type': 'string'}}, {'user_id': 1})]
+    convertible = sum(1 for user_id in user_ids if ObjectId.is_valid(user_id))
+    counts['appointments string user_id'] = convertible
+    counts['appointments non-hex user_id'] = len(user_ids) - convertible
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--pause', type=float, default=0.2, help='seconds to sleep between batches')
+    parser.add_argument('--dry-run', action='store_true', help='report what would change without writing')
+    args = parser.parse_args()
+
+    migration_app()
+    if args.dry_run:
+        print(f'dry run: {dry_run()}')
+        return
+    db = database.mongo.db
+    # Re-inserted appointments get their user_id converted on the way, so the last pass only sees the rest
+    phases = [
+        ('users _id', StringIds(db.users)),
+        ('appointments _id', StringIds(db.appointments)),
+        ('appointments user_id', StringUserIds(db.appointments)),
+    ]
+    for label, migrate_batch in phases:
+        totals = run_batches(migrate_batch, args.batch_size, args.pause, label)
+        print(f'{label} done: {totals or "nothing to migrate"}')
+    left = db.appointments.count_documents({'user_id': {'$type': 'string'}})
+    if left:
+        print(f'appointments with a non-hex user_id left as is: {left}')
+
+
+if __name__ == '__main__':
+    main()
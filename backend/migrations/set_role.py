@@ -0,0 +1,38 @@
+"""Grant or revoke admin rights; /register only ever creates students.
+
+    python -m migrations.set_role counselor1 admin
+    python -m migrations.set_role counselor1 user
+    python -m migrations.set_role --list
+
+The user's session tokens carry the old role until they expire (TOKEN_MAX_AGE)
+or are refreshed. Without a shared CACHE_URL each app process may also serve
+the cached user for up to USER_CACHE_TTL seconds before /token/refresh sees
+the change.
+"""
+import argparse
+import database
+from migrations import migration_app
+from models import User
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('username', nargs='?')
+    parser.add_argument('role', nargs='?', choices=User.ROLES)
+    parser.add_argument('--list', action='store_true', help='list the users with a role other than user')
+    args = parser.parse_args()
+    if not args.list and not (args.username and args.role):
+        parser.error('give a username and a role, or --list')
+
+    migration_app()
+    if args.list:
+        for user in database.mongo.db.users.find({'role': {'$ne': 'user'}}, {'username': 1, 'role': 1}).sort('username', 1):
+            print(f"{user['username']}: {user.get('role')}")
+        return
+    if not database.set_user_role(args.username, args.role):
+        raise SystemExit(f'no user named {args.username!r}')
+    print(f'{args.username}: {args.role}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,111 @@
-from flask_login import UserMixin
 from bson import ObjectId
-import bcrypt
 from datetime import datetime
+from passwords import hasher
+
+# How a slot's date and preferred_time strings combine into its start time
+SLOT_START_FORMAT = '%Y-%m-%d %I:%M %p'
+
+MONTH_NAMES = ('', 'January', 'February', 'March', 'April', 'May', 'June', 'July',
+               'August', 'September', 'October', 'November', 'December')
+
+
+def slot_start(date, preferred_time):
+    """Start of a slot as a naive datetime on the school's wall clock, None if the strings don't parse.
+
+    Stored as a BSON date so lists sort chronologically and date ranges can
+    use an index; the date and preferred_time strings are kept alongside it.
+    """
+    try:
+        return datetime.strptime(f'{date} {preferred_time}', SLOT_START_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+
+def object_id(value):
+    """Canonical stored form of an id: an ObjectId for a 24-digit hex string, anything else unchanged"""
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    return value
+
+
+def _parse_created_at(value):
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except (ValueError, AttributeError):
+            return datetime.utcnow()
+    return value or datetime.utcnow()
+
+
+# Display text per calendar day and per minute of the day; both key spaces are small
+_date_texts = {}
+_time_texts = {}
+
+
+def _date_text(iso_date):
+    text = _date_texts.get(iso_date)
+    if text is None:
+        if len(_date_texts) >= 10000:
+            _date_texts.clear()
+        text = _date_texts[iso_date] = f'{MONTH_NAMES[int(iso_date[5:7])]} {iso_date[8:10]}, {iso_date[0:4]}'
+    return text
+
+
+def _time_text(iso_time):
+    text = _time_texts.get(iso_time)
+    if text is None:
+        hour = int(iso_time[0:2])
+        text = _time_texts[iso_time] = f"{(hour % 12) or 12:02d}:{iso_time[3:5]} {'AM' if hour < 12 else 'PM'}"
+    return text
+
+
+def _is_canonical_iso(value):
+    """Whether a stored string is exactly what datetime.isoformat() would print for it"""
+    if len(value) < 19 or value[10] != 'T' or value[4] != '-' or value[7] != '-' or value[13] != ':' or value[16] != ':':
+        return False
+    tail = value[19:]
+    if not tail:
+        return True
+    if tail[0] == '.':
+        if len(tail) < 7 or not tail[1:7].isdigit() or tail[1:7] == '000000':
+            return False
+        tail = tail[7:]
+    return tail == '' or (len(tail) == 6 and tail[0] in '+-' and tail[3] == ':')
+
+
+def created_at_fields(value):
+    """(ISO string, display string) for a stored created_at value.
+
+    The display string matches strftime('%B %d, %Y at %I:%M %p') in the C
+    locale. Strings the app wrote itself are sliced instead of parsed; anything
+    else goes through the same parsing the models always did.
+    """
+    if not (isinstance(value, str) and _is_canonical_iso(value)):
+        value = _parse_created_at(value).isoformat()
+    try:
+        return value, f'{_date_text(value[0:10])} at {_time_text(value[11:16])}'
+    except (ValueError, IndexError):
+        # Shaped like an ISO timestamp but not a real one
+        value = _parse_created_at(value).isoformat()
+        return value, f'{_date_text(value[0:10])} at {_time_text(value[11:16])}'
+
+
+class User:
+    """A registered student or counselor.
+
+    Implements the attributes Flask-Login expects (is_authenticated, is_active,
+    is_anonymous, get_id) directly instead of inheriting UserMixin, so the
+    class can use __slots__.
+    """
+
+    __slots__ = ('username', 'password_hash', 'id_number', 'birthdate', 'role', '_id', 'created_at')
+
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+
+    ROLES = ('user', 'admin')
 
-class User(UserMixin):
     def __init__(self, username, password_hash, id_number=None, birthdate=None, role="user", _id=None, created_at=None):
         self.username = username
         self.password_hash = password_hash
@@ -16,12 +118,29 @@ class User(UserMixin):
     def get_id(self):
         return str(self._id)
 
+    def __eq__(self, other):
+        if isinstance(other, User):
+            return self.get_id() == other.get_id()
+        return NotImplemented
+
+    __hash__ = object.__hash__
+
     @staticmethod
     def set_password(password):
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        return hasher.hash(password)
 
     def check_password(self, password):
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return hasher.verify(password, self.password_hash)
+
+    @staticmethod
+    async def set_password_async(password):
+        return await hasher.hash_async(password)
+
+    async def check_password_async(self, password):
+        return await hasher.verify_async(password, self.password_hash)
+
+    def password_needs_rehash(self):
+        return hasher.needs_rehash(self.password_hash)
 
     def to_dict(self):
         return {
@@ -34,6 +153,13 @@ class User(UserMixin):
             'created_at': self.created_at.isoformat() if isinstance(self.created_at, datetime) else self.created_at
         }
 
+    def to_document(self):
+        """Stored form: ObjectId _id and a typed created_at"""
+        document = self.to_dict()
+        document['_id'] = self._id
+        document['created_at'] = _parse_created_at(self.created_at)
+        return document
+
     @classmethod
     def from_dict(cls, data):
         # Handle _id conversion
@@ -44,10 +170,7 @@ class User(UserMixin):
         # Handle created_at conversion
         created_at = data.get('created_at')
         if created_at and isinstance(created_at, str):
-            try:
-                created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-            except (ValueError, AttributeError):
-                created_at = datetime.utcnow()
+            created_at = _parse_created_at(created_at)
         
         return cls(
             username=data['username'],
@@ -61,14 +184,33 @@ class User(UserMixin):
 
 
 class Appointment:
-    def __init__(self, user_id, date, preferred_time, concern_type, status="Pending", _id=None, created_at=None):
+    # Statuses that hand the booked time slot back to the pool
+    SLOT_RELEASING_STATUSES = ('Rejected', 'Cancelled')
+
+    # Status changes counselors can make, from each status; the admin dashboard offers exactly these
+    STATUS_TRANSITIONS = {
+        'Pending': ('Approved', 'Rejected'),
+        'Approved': ('Completed', 'Cancelled'),
+        'Rejected': ('Pending',),
+        'Cancelled': ('Pending',),
+        'Completed': ()
+    }
+
+    __slots__ = ('user_id', 'date', 'preferred_time', 'concern_type', 'status', '_id', 'created_at', 'counselor_id', 'version', '_created_at_cache')
+
+    def __init__(self, user_id, date, preferred_time, concern_type, status="Pending", _id=None, created_at=None, counselor_id=None, version=0):
         self.user_id = user_id
         self.date = date
         self.preferred_time = preferred_time
         self.concern_type = concern_type
         self.status = status  # 'Pending', 'Approved', 'Rejected', 'Cancelled', 'Completed'
         self._id = _id or ObjectId()
+        # Kept as stored (ISO string or datetime); parsed only when needed
         self.created_at = created_at or datetime.utcnow()
+        self.counselor_id = counselor_id
+        # Bumped by every status change; clients send it back to detect concurrent edits
+        self.version = version
+        self._created_at_cache = None
 
     @staticmethod
     def is_valid_status(status):
@@ -80,29 +222,57 @@ class Appointment:
     def is_admin_updatable_status(status):
         """Validate if status can be set by admin (only Approved or Rejected for pending appointments)"""
         return status in ['Approved', 'Rejected']
+
+    @staticmethod
+    def can_transition(current_status, new_status):
+        """Whether an appointment in current_status may be moved to new_status"""
+        return new_status in Appointment.STATUS_TRANSITIONS.get(current_status, ())
+
+    @staticmethod
+    def statuses_before(new_status):
+        """Statuses an appointment may be moved to new_status from"""
+        return [status for status, targets in Appointment.STATUS_TRANSITIONS.items() if new_status in targets]
+
+    @staticmethod
+    def holds_slot(status):
+        """Whether an appointment in this status occupies its time slot"""
+        return status not in Appointment.SLOT_RELEASING_STATUSES
+
+    def _created_at_fields(self):
+        cache = self._created_at_cache
+        if cache is None or cache[0] is not self.created_at:
+            cache = self._created_at_cache = (self.created_at, created_at_fields(self.created_at))
+        return cache[1]
+
+    @property
+    def formatted_created_at(self):
+        return self._created_at_fields()[1]
     
     def to_dict(self):
-        # Use the actual created_at datetime to generate the formatted string
-        current_created_at = self.created_at
-        if isinstance(current_created_at, str):
-            try:
-                current_created_at = datetime.fromisoformat(current_created_at.replace('Z', '+00:00'))
-            except (ValueError, AttributeError):
-                current_created_at = datetime.utcnow()
-        
-        formatted_created_at = current_created_at.strftime('%B %d, %Y at %I:%M %p')
-        
+        created_at, formatted_created_at = self._created_at_fields()
         return {
             'user_id': self.user_id,
             'date': self.date,
             'preferred_time': self.preferred_time,
             'concern_type': self.concern_type,
             'status': self.status,
+            'counselor_id': self.counselor_id,
+            'version': self.version,
             '_id': str(self._id),
-            'created_at': current_created_at.isoformat() if isinstance(current_created_at, datetime) else current_created_at,
+            'created_at': created_at,
             'formatted_created_at': formatted_created_at
         }
 
+    def to_document(self):
+        """Stored form: ObjectId ids, typed slot_start and created_at, no display-only fields"""
+        document = self.to_dict()
+        del document['formatted_created_at']
+        document['_id'] = self._id
+        document['user_id'] = object_id(self.user_id)
+        document['created_at'] = _parse_created_at(self.created_at)
+        document['slot_start'] = slot_start(self.date, self.preferred_time)
+        return document
+
     @classmethod
     def from_dict(cls, data):
         # Handle _id conversion
@@ -110,20 +280,38 @@ class Appointment:
         if _id and not isinstance(_id, ObjectId):
             _id = ObjectId(_id)
         
-        # Handle created_at conversion from string to datetime if needed
-        created_at = data.get('created_at')
-        if created_at and isinstance(created_at, str):
-            try:
-                created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-            except (ValueError, AttributeError):
-                created_at = datetime.utcnow()
-        
         return cls(
-            user_id=data['user_id'],
+            user_id=str(data['user_id']),
             date=data['date'],
             preferred_time=data['preferred_time'],
             concern_type=data['concern_type'],
             status=data.get('status', 'Pending'),  # Default to 'Pending'
             _id=_id,
-            created_at=created_at
-        )
\ No newline at end of file
+            created_at=data.get('created_at'),
+            counselor_id=data.get('counselor_id'),
+            version=data.get('version', 0)
+        )
+
+    @staticmethod
+    def serialize_documents(documents):
+        """JSON-ready rows straight from raw appointment documents, same shape as to_dict().
+
+        List endpoints use this instead of building an Appointment per row.
+        """
+        rows = []
+        append = rows.append
+        for data in documents:
+            created_at, formatted_created_at = created_at_fields(data.get('created_at'))
+            append({
+                'user_id': str(data['user_id']),
+                'date': data['date'],
+                'preferred_time': data['preferred_time'],
+                'concern_type': data['concern_type'],
+                'status': data.get('status', 'Pending'),
+                'counselor_id': data.get('counselor_id'),
+                'version': data.get('version', 0),
+                '_id': str(data['_id']),
+                'created_at': created_at,
+                'formatted_created_at': formatted_created_at
+            })
+        return rows
@@ -0,0 +1,137 @@
+import asyncio
+import bcrypt
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when the hashing pool is saturated and the request should be shed"""
+
+
+class PasswordHasher:
+    """Runs bcrypt hashing and verification on a bounded thread pool.
+
+    bcrypt releases the GIL while it works, so a thread pool spreads the cost
+    across cores. Admission is bounded by `workers + max_queue`: once that many
+    jobs are in flight new ones are rejected with PasswordPoolBusy instead of
+    piling up behind the pool.
+    """
+
+    def __init__(self, rounds=12, workers=None, max_queue=64, timeout=10.0):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self.configure(rounds=rounds, workers=workers, max_queue=max_queue, timeout=timeout)
+
+    def configure(self, rounds=12, workers=None, max_queue=64, timeout=10.0):
+        old_executor = self._executor
+        self.rounds = int(rounds)
+        self.workers = int(workers or os.cpu_count() or 1)
+        self.max_queue = int(max_queue)
+        self.timeout = float(timeout)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+        self._queued = 0
+        self._active = 0
+        self._completed = 0
+        self._rejected = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        if old_executor is not None:
+            old_executor.shutdown(wait=False)
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise PasswordPoolBusy('Password hashing pool is saturated')
+
+        with self._lock:
+            self._queued += 1
+
+        def job():
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+            start = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self._active -= 1
+                    self._completed += 1
+                    self._latency_total += elapsed
+                    self._latency_max = max(self._latency_max, elapsed)
+                self._slots.release()
+
+        return self._executor.submit(job)
+
+    def _timed_out(self):
+        with self._lock:
+            self._rejected += 1
+        return PasswordPoolBusy('Timed out waiting for the password hashing pool')
+
+    def _run(self, fn, *args):
+        future = self._submit(fn, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise self._timed_out()
+
+    async def _run_async(self, fn, *args):
+        future = self._submit(fn, *args)
+        try:
+            # Shielded so a timeout never cancels a queued job and leaks its admission slot
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.timeout)
+        except asyncio.TimeoutError:
+            raise self._timed_out()
+
+    def hash(self, password):
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return self._run(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+    def verify(self, password, password_hash):
+        return self._run(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+    async def hash_async(self, password):
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return (await self._run_async(bcrypt.hashpw, password.encode('utf-8'), salt)).decode('utf-8')
+
+    async def verify_async(self, password, password_hash):
+        return await self._run_async(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+    def needs_rehash(self, password_hash):
+        """True when the stored hash was made with a different work factor than configured"""
+        try:
+            return int(password_hash.split('$')[2]) != self.rounds
+        except (AttributeError, IndexError, ValueError):
+            return False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rounds': self.rounds,
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'queue_depth': self._queued,
+                'active': self._active,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'avg_latency_ms': round(self._latency_total / self._completed * 1000, 2) if self._completed else 0.0,
+                'max_latency_ms': round(self._latency_max * 1000, 2)
+            }
+
+
+hasher = PasswordHasher()
+
+
+def init_app(app):
+    hasher.configure(
+        rounds=app.config.get('BCRYPT_ROUNDS', 12),
+        workers=app.config.get('BCRYPT_WORKERS'),
+        max_queue=app.config.get('BCRYPT_MAX_QUEUE', 64),
+        timeout=app.config.get('BCRYPT_TIMEOUT', 10.0)
+    )
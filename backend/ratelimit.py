@@ -0,0 +1,227 @@
+"""Admission control for the expensive write paths: /login, /register and POST /appointments.
+
+A request first takes a token from the bucket of its client IP and, where the
+endpoint has one, of its account (the username for /login, the user_id for a
+booking); an empty bucket answers 429 with Retry-After. It then needs a slot
+in its endpoint class's concurrency cap ('auth' for the bcrypt paths,
+'booking' for slot reservation), which answers 503 when full, so overload is
+shed before any bcrypt or MongoDB work starts.
+
+Buckets live in process memory unless RATE_LIMIT_URL (redis://...) shares
+them between worker processes; the concurrency caps are per process. Backend
+failures let requests through so the limiter can never become the outage.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from log import get_logger
+import metrics
+
+logger = get_logger(__name__)
+
+RATE_UNITS = {'second': 1, 'minute': 60, 'hour': 3600}
+
+# Endpoint -> endpoint class sharing a concurrency cap
+ENDPOINT_CLASSES = {
+    'login': 'auth',
+    'register': 'auth',
+    'booking': 'booking'
+}
+
+REFUSALS = {
+    429: {'message': 'Too many requests', 'error': 'Rate limit exceeded, please retry later'},
+    503: {'message': 'Server is busy', 'error': 'Too many concurrent requests, please retry shortly'}
+}
+
+# Longest account name kept in a bucket key
+MAX_ACCOUNT_KEY = 128
+
+
+def parse_rate(text):
+    """'5/minute' -> (5, 60): bucket capacity and the seconds it takes to refill; None for an empty setting"""
+    if not text:
+        return None
+    count, _, unit = text.partition('/')
+    try:
+        capacity = int(count)
+        period = RATE_UNITS[unit.strip()]
+    except (ValueError, KeyError):
+        raise ValueError(f'Invalid rate {text!r}, expected e.g. 10/minute')
+    if capacity < 1:
+        raise ValueError(f'Invalid rate {text!r}, the count must be positive')
+    return capacity, period
+
+
+class MemoryBuckets:
+    """Token buckets in process memory; the least recently used are dropped beyond max_keys"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, period):
+        """Take one token; returns 0 if there was one, else the seconds until there will be"""
+        rate = capacity / period
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+# Refill and take in one step on the Redis server, timed by its clock so workers agree
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBuckets:
+    """Token buckets shared by every worker process through Redis"""
+
+    def __init__(self, url, prefix='tupt:rate:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('RATE_LIMIT_URL is set but the redis package is not installed')
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(TAKE_SCRIPT)
+        self.prefix = prefix
+
+    def take(self, key, capacity, period):
+        return float(self._take(keys=[self.prefix + key], args=[capacity, capacity / period]))
+
+
+class ConcurrencyCap:
+    """At most `limit` requests of an endpoint class in flight in this process; 0 means no cap"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.limit and self.active >= self.limit:
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+
+
+class Admission:
+    """Rate limits and concurrency caps per endpoint"""
+
+    def __init__(self):
+        self.enabled = False
+        self.backend = MemoryBuckets()
+        self.trusted_proxies = 0
+        # endpoint -> {'ip': (capacity, period) or None, 'account': ...}
+        self.limits = {}
+        # endpoint class -> ConcurrencyCap
+        self.caps = {}
+
+    def configure(self, backend, limits, caps, trusted_proxies=0, enabled=True):
+        self.backend = backend
+        self.limits = limits
+        self.caps = {name: ConcurrencyCap(limit) for name, limit in caps.items()}
+        self.trusted_proxies = trusted_proxies
+        self.enabled = enabled
+
+    def client_ip(self, remote_addr, forwarded_for=None):
+        """The client address, taken from X-Forwarded-For as appended by the trusted proxies in front of us"""
+        if self.trusted_proxies and forwarded_for:
+            hops = [hop.strip() for hop in forwarded_for.split(',') if hop.strip()]
+            if hops:
+                return hops[-min(self.trusted_proxies, len(hops))]
+        return remote_addr
+
+    def _take(self, key, rate):
+        try:
+            return self.backend.take(key, *rate)
+        except Exception:
+            logger.error('rate_limit_backend_failed', exc_info=True, key=key)
+            return 0
+
+    def admit(self, endpoint, ip, account=None):
+        """None if the request may go ahead (then call release(endpoint) when it is done), else (status, retry_after)"""
+        if not self.enabled:
+            return None
+        limits = self.limits.get(endpoint, {})
+        for scope, key in (('ip', ip), ('account', account)):
+            rate = limits.get(scope)
+            if rate is None or not key:
+                continue
+            wait = self._take(f'{endpoint}:{scope}:{str(key)[:MAX_ACCOUNT_KEY]}', rate)
+            if wait:
+                metrics.throttled_requests.inc(endpoint, scope)
+                logger.info('request_throttled', endpoint=endpoint, scope=scope, retry_after=round(wait, 2))
+                return 429, math.ceil(wait)
+        cap = self.caps.get(ENDPOINT_CLASSES.get(endpoint))
+        if cap is not None and not cap.acquire():
+            metrics.throttled_requests.inc(endpoint, 'concurrency')
+            return 503, 1
+        return None
+
+    def release(self, endpoint):
+        cap = self.caps.get(ENDPOINT_CLASSES.get(endpoint))
+        if self.enabled and cap is not None:
+            cap.release()
+
+    def stats(self):
+        return {name: {'active': cap.active, 'limit': cap.limit} for name, cap in self.caps.items()}
+
+
+admission = Admission()
+
+
+def init_app(app):
+    url = app.config.get('RATE_LIMIT_URL')
+    admission.configure(
+        RedisBuckets(url) if url else MemoryBuckets(),
+        limits={
+            'login': {
+                'ip': parse_rate(app.config.get('RATE_LIMIT_LOGIN_IP')),
+                'account': parse_rate(app.config.get('RATE_LIMIT_LOGIN_ACCOUNT'))
+            },
+            'register': {'ip': parse_rate(app.config.get('RATE_LIMIT_REGISTER_IP'))},
+            'booking': {
+                'ip': parse_rate(app.config.get('RATE_LIMIT_BOOKING_IP')),
+                'account': parse_rate(app.config.get('RATE_LIMIT_BOOKING_ACCOUNT'))
+            }
+        },
+        caps={
+            'auth': app.config.get('CONCURRENCY_LIMIT_AUTH', 0),
+            'booking': app.config.get('CONCURRENCY_LIMIT_BOOKING', 0)
+        },
+        trusted_proxies=app.config.get('RATE_LIMIT_TRUSTED_PROXIES', 0),
+        enabled=app.config.get('RATE_LIMIT_ENABLED', True)
+    )
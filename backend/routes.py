@@ -1,7 +1,118 @@
-from flask import jsonify, request
-from database import find_user_by_username, find_user_by_id_number, insert_user, insert_appointment, find_appointments_by_user_id, update_appointment_status, get_all_appointments, find_user_by_id, find_appointment_by_id, get_appointments_with_user_details
-from models import User, Appointment
+import functools
+from flask import jsonify, request, Response, stream_with_context
+from database import find_user_by_username, insert_user, DuplicateUserError, update_user_password_hash, book_appointment, find_appointment_rows_by_user_id, transition_appointment_status, APPOINTMENT_NOT_FOUND, STATUS_CONFLICT, bulk_update_appointment_status, BULK_STATUS_MAX, appointments_version, get_appointment_stats, find_user_by_id, find_appointment_by_id, iter_appointments_with_user_details
+from models import User
+import validation
+from passwords import hasher, PasswordPoolBusy
+from log import get_logger
+from cache import user_cache
+import events
+import availability
+import health
+import ratelimit
+import tokens
+from tokens import session_tokens
 from bson import ObjectId
+import database
+import queue
+
+logger = get_logger(__name__)
+
+# Conflict messages for each unique user field, keyed by the violated index field
+DUPLICATE_USER_ERRORS = {
+    'username': 'Username already exists',
+    'id_number': 'ID number already registered'
+}
+
+# Status transition failures that are not a refused status change
+TRANSITION_ERROR_STATUS = {
+    APPOINTMENT_NOT_FOUND: 404,
+    STATUS_CONFLICT: 409
+}
+
+def password_pool_busy_response():
+    """503 returned when the bcrypt pool sheds a request"""
+    response = jsonify({
+        'message': 'Server is busy',
+        'error': 'Too many concurrent password checks, please retry shortly'
+    })
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+def admission_controlled(endpoint, account_field=None):
+    """Run the view only if ratelimit.admission lets the request in, answering 429 / 503 otherwise"""
+    def decorate(view):
+        @functools.wraps(view)
+        def admitted(*args, **kwargs):
+            data = request.get_json(silent=True)
+            account = data.get(account_field) if account_field and isinstance(data, dict) else None
+            ip = ratelimit.admission.client_ip(request.remote_addr, request.headers.get('X-Forwarded-For'))
+            refused = ratelimit.admission.admit(endpoint, ip, account)
+            if refused:
+                status, retry_after = refused
+                response = jsonify(ratelimit.REFUSALS[status])
+                response.headers['Retry-After'] = str(retry_after)
+                return response, status
+            try:
+                return view(*args, **kwargs)
+            finally:
+                ratelimit.admission.release(endpoint)
+        return admitted
+    return decorate
+
+def token_required(roles=tokens.STAFF_ROLES, owner_arg=None):
+    """Run the view only for a session token with one of roles, or whose user is the owner_arg path parameter"""
+    def decorate(view):
+        @functools.wraps(view)
+        def authorized(*args, **kwargs):
+            owner = kwargs.get(owner_arg) if owner_arg else None
+            refused = token_refusal(roles, owner)
+            if refused:
+                return refused
+            return view(*args, **kwargs)
+        return authorized
+    return decorate
+
+def token_refusal(roles=tokens.STAFF_ROLES, owner=None, query_token=False):
+    """401 / 403 response unless the request's session token has one of roles or belongs to owner, otherwise None"""
+    token = tokens.bearer_token(request.headers.get('Authorization'))
+    if token is None and query_token:
+        token = request.args.get('token')
+    refused = session_tokens.authorize(token, roles, owner)
+    if not refused:
+        return None
+    body, headers = tokens.refusal(*refused)
+    response = jsonify(body)
+    response.headers.update(headers)
+    return response, refused[0]
+
+def database_unavailable_response():
+    """503 for write paths while the health monitor reports the cluster unreachable, otherwise None"""
+    if health.monitor.available():
+        return None
+    response = jsonify({
+        'message': 'Service unavailable',
+        'error': 'Database is unreachable, please retry shortly'
+    })
+    response.headers['Retry-After'] = str(health.monitor.interval or 10)
+    return response, 503
+
+def appointments_etag(user_id=None):
+    """Strong ETag for an appointment list: version stamp plus the query string that shaped the page"""
+    return validation.etag_for(appointments_version(user_id), request.query_string.decode())
+
+def not_modified(etag):
+    """304 response if the client already holds etag, otherwise None"""
+    # Weak comparison, as If-None-Match requires; compressed responses carry the weak form
+    if request.if_none_match.contains_weak(etag):
+        return with_etag(Response(status=304), etag)
+    return None
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    # Let browsers keep the body but revalidate on every view
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 def init_routes(app):
     @app.route('/')
@@ -12,176 +123,152 @@ def init_routes(app):
         })
 
     @app.route('/register', methods=['POST'])
+    @admission_controlled('register')
     def register():
         try:
-            print("🚀 REGISTER ENDPOINT CALLED")
             data = request.get_json()
-            print(f"📦 Received registration data: {data}")
+            logger.debug('register_request', data=data)
             
-            # Validate required fields
-            if not data:
-                print("❌ No JSON data provided")
-                return jsonify({
-                    'message': 'Invalid request data',
-                    'error': 'No JSON data provided'
-                }), 400
-            
-            required_fields = ['username', 'password', 'id_number', 'birthdate']
-            missing_fields = [field for field in required_fields if not data.get(field)]
+            # Validate required fields and password length
+            error = validation.validate_registration(data)
+            if error:
+                return jsonify(error), 400
             
-            if missing_fields:
-                print(f"❌ Missing fields: {missing_fields}")
-                return jsonify({
-                    'message': 'Missing required fields',
-                    'error': f'Missing fields: {", ".join(missing_fields)}',
-                    'missing_fields': missing_fields
-                }), 400
+            # Fail fast instead of hashing a password we cannot store
+            unavailable = database_unavailable_response()
+            if unavailable:
+                return unavailable
             
-            print(f"🔍 Checking if username exists: {data['username']}")
-            # Check if user already exists
-            if find_user_by_username(data['username']):
-                print(f"❌ Username already exists: {data['username']}")
+            # Create new user with default role 'user'
+            try:
+                password_hash = User.set_password(data['password'])
+            except PasswordPoolBusy:
+                return password_pool_busy_response()
+            user = validation.new_user(data, password_hash)
+            
+            # Save user to database; the unique indexes reject duplicates in the same round trip
+            try:
+                result = insert_user(user)
+            except DuplicateUserError as e:
+                error = DUPLICATE_USER_ERRORS.get(e.field, 'User already exists')
+                logger.info('register_rejected', username=user.username, error=error)
                 return jsonify({
                     'message': 'Registration failed',
-                    'error': 'Username already exists'
-                }), 409
-            
-            print(f"🔍 Checking if ID number exists: {data['id_number']}")
-            # Check if ID number already exists
-            if find_user_by_id_number(data['id_number']):
-                print(f"❌ ID number already exists: {data['id_number']}")
-                return jsonify({
-                    'message': 'Registration failed', 
-                    'error': 'ID number already registered'
+                    'error': error
                 }), 409
             
-            # Validate password length
-            if len(data['password']) < 6:
-                print(f"❌ Password too short: {len(data['password'])} characters")
-                return jsonify({
-                    'message': 'Registration failed',
-                    'error': 'Password must be at least 6 characters long'
-                }), 400
-            
-            print("✅ All validations passed, creating user...")
-            # Create new user with default role 'user'
-            password_hash = User.set_password(data['password'])
-            user = User(
-                username=data['username'],
-                password_hash=password_hash,
-                id_number=data['id_number'],
-                birthdate=data['birthdate'],
-                role=data.get('role', 'user')  # Default role is 'user'
-            )
-            
-            print(f"👤 User object created: {user.username}")
-            
-            # Save user to database
-            result = insert_user(user)
-            print(f"💾 Database insertion result: {result}")
-            
             if result:
-                print(f"✅ User registered successfully: {user.username}")
+                logger.info('user_registered', user_id=result, username=user.username)
                 return jsonify({
                     'message': 'Registration successful! Please login.',
                     'user_id': str(user._id),
-                    'user': {
-                        'username': user.username,
-                        'id_number': user.id_number,
-                        'birthdate': user.birthdate,
-                        'role': user.role
-                    }
+                    'user': validation.user_summary(user)
                 }), 201
             else:
-                print("❌ Failed to insert user into database")
                 return jsonify({
                     'message': 'Registration failed',
                     'error': 'Failed to create user in database'
                 }), 500
             
         except Exception as e:
-            print(f"💥 Registration error: {str(e)}")
-            import traceback
-            print(f"🔍 Stack trace: {traceback.format_exc()}")
+            logger.error('register_failed', exc_info=True)
             return jsonify({
                 'message': 'Registration error',
                 'error': str(e)
             }), 500
 
     @app.route('/login', methods=['POST'])
+    @admission_controlled('login', account_field='username')
     def login():
         try:
             data = request.get_json()
             
-            if not data or not data.get('username') or not data.get('password'):
-                return jsonify({
-                    'message': 'Login failed',
-                    'error': 'Username and password are required'
-                }), 400
+            error = validation.validate_login(data)
+            if error:
+                return jsonify(error), 400
             
             user = find_user_by_username(data['username'])
-            if user is None or not user.check_password(data['password']):
-                return jsonify({
-                    'message': 'Login failed',
-                    'error': 'Invalid username or password'
-                }), 401
+            try:
+                if user is None or not user.check_password(data['password']):
+                    return jsonify({
+                        'message': 'Login failed',
+                        'error': 'Invalid username or password'
+                    }), 401
+
+                # Transparently upgrade hashes made with a different work factor
+                if user.password_needs_rehash():
+                    update_user_password_hash(user._id, User.set_password(data['password']))
+            except PasswordPoolBusy:
+                return password_pool_busy_response()
             
-            print(f"✅ User {user.username} logged in successfully. Role: {user.role}")
+            logger.info('user_logged_in', user_id=str(user._id), role=user.role)
             
             return jsonify({
                 'message': 'Login successful',
-                'user': {
-                    'username': user.username,
-                    'id_number': user.id_number,
-                    'birthdate': user.birthdate,
-                    'user_id': str(user._id),
-                    'role': user.role
-                }
+                'user': dict(validation.user_summary(user), user_id=str(user._id)),
+                **session_tokens.grant(user)
             }), 200
             
         except Exception as e:
-            print(f"❌ Login error: {e}")
+            logger.error('login_failed', exc_info=True)
             return jsonify({
                 'message': 'Login error',
                 'error': str(e)
             }), 500
 
+    # Swap a live session token for a fresh one; the user is re-read so role changes and deletions apply
+    @app.route('/token/refresh', methods=['POST'])
+    def refresh_token():
+        try:
+            claims, error = session_tokens.verify(tokens.bearer_token(request.headers.get('Authorization')) or '')
+            user = find_user_by_id(claims['uid']) if claims else None
+            if user is None:
+                body, headers = tokens.refusal(401, error or tokens.INVALID)
+                response = jsonify(body)
+                response.headers.update(headers)
+                return response, 401
+
+            return jsonify({
+                'message': 'Token refreshed',
+                'user': dict(validation.user_summary(user), user_id=str(user._id)),
+                **session_tokens.grant(user)
+            }), 200
+
+        except Exception as e:
+            logger.error('token_refresh_failed', exc_info=True)
+            return jsonify({
+                'message': 'Token refresh error',
+                'error': str(e)
+            }), 500
+
     @app.route('/appointments', methods=['POST'])
+    @admission_controlled('booking', account_field='user_id')
     def create_appointment():
         try:
             data = request.get_json()
             
-            # Validate required fields
-            if not data:
-                return jsonify({
-                    'message': 'Invalid request data',
-                    'error': 'No JSON data provided'
-                }), 400
+            # Validate required fields and the requested time
+            error = validation.validate_new_appointment(data, database.SLOT_TIMES)
+            if error:
+                return jsonify(error), 400
             
-            required_fields = ['user_id', 'date', 'preferred_time', 'concern_type']
-            missing_fields = [field for field in required_fields if not data.get(field)]
+            unavailable = database_unavailable_response()
+            if unavailable:
+                return unavailable
             
-            if missing_fields:
-                return jsonify({
-                    'message': 'Missing required fields',
-                    'error': f'Missing fields: {", ".join(missing_fields)}',
-                    'missing_fields': missing_fields
-                }), 400
+            appointment = validation.new_appointment(data)
             
-            # Create new appointment with default status 'Pending' (not approved)
-            appointment = Appointment(
-                user_id=data['user_id'],
-                date=data['date'],
-                preferred_time=data['preferred_time'],
-                concern_type=data['concern_type'],
-                status=data.get('status', 'Pending')  # Default status is 'Pending'
-            )
+            # Reserve the slot and save the appointment; the slot counter rejects overbooking atomically
+            result, error = book_appointment(appointment)
             
-            # Save appointment to database
-            result = insert_appointment(appointment)
+            if error == 'slot_full':
+                return jsonify({
+                    'message': 'Appointment scheduling failed',
+                    'error': 'Selected time slot is fully booked'
+                }), 409
             
             if result:
-                print(f"✅ Appointment created for user {data['user_id']} on {data['date']} at {data['preferred_time']}")
+                logger.info('appointment_created', appointment_id=str(appointment._id), user_id=data['user_id'], date=data['date'], preferred_time=data['preferred_time'])
                 return jsonify({
                     'message': 'Appointment scheduled successfully! Waiting for approval.',
                     'appointment_id': str(appointment._id),
@@ -194,61 +281,119 @@ def init_routes(app):
                 }), 500
             
         except Exception as e:
-            print(f"❌ Appointment scheduling error: {e}")
+            logger.error('appointment_create_failed', exc_info=True)
             return jsonify({
                 'message': 'Appointment scheduling error',
                 'error': str(e)
             }), 500
 
+    # Server-sent events: ?user_id=<id> for one student's appointments, ?scope=admin for all of them.
+    # EventSource cannot set headers, so the session token may also come as ?token=<token>.
+    @app.route('/appointments/stream', methods=['GET'])
+    def stream_appointment_events():
+        user_id = request.args.get('user_id')
+        if request.args.get('scope') == 'admin':
+            channel = events.ADMIN_CHANNEL
+        elif user_id:
+            channel = events.user_channel(user_id)
+        else:
+            return jsonify({
+                'message': 'Invalid stream request',
+                'error': 'Provide user_id or scope=admin'
+            }), 400
+
+        refused = token_refusal(owner=None if channel == events.ADMIN_CHANNEL else user_id, query_token=True)
+        if refused:
+            return refused
+
+        subscription = events.broker.subscribe(channel)
+        if subscription is None:
+            response = jsonify({
+                'message': 'Server is busy',
+                'error': 'Too many open event streams'
+            })
+            response.headers['Retry-After'] = '5'
+            return response, 503
+
+        heartbeat = app.config.get('SSE_HEARTBEAT_SECONDS', 15)
+
+        def generate():
+            try:
+                yield events.SSE_RETRY
+                while True:
+                    if subscription.overflowed:
+                        # Client fell behind; tell it to refetch instead of replaying a gap
+                        subscription.overflowed = False
+                        yield events.SSE_RESYNC
+                    try:
+                        event = subscription.get(timeout=heartbeat)
+                    except queue.Empty:
+                        yield events.SSE_KEEP_ALIVE
+                        continue
+                    yield events.sse_frame(event, app.json.dumps)
+            finally:
+                events.broker.unsubscribe(subscription)
+
+        response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
     @app.route('/appointments/<user_id>', methods=['GET'])
+    @token_required(owner_arg='user_id')
     def get_user_appointments(user_id):
         try:
-            appointments = find_appointments_by_user_id(user_id)
-            
-            print(f"✅ Retrieved {len(appointments)} appointments for user {user_id}")
-            
-            return jsonify({
+            start, end, error = validation.parse_date_range(request.args.get('from'), request.args.get('to'))
+            if error:
+                return jsonify(error), 400
+
+            # Answer from the version stamp alone when nothing changed since the client's copy
+            etag = appointments_etag(user_id)
+            cached = not_modified(etag)
+            if cached:
+                return cached
+
+            return with_etag(jsonify({
                 'message': 'Appointments retrieved successfully',
-                'appointments': [appointment.to_dict() for appointment in appointments]
-            }), 200
+                'appointments': find_appointment_rows_by_user_id(user_id, start, end)
+            }), etag), 200
             
         except Exception as e:
-            print(f"❌ Error retrieving appointments: {e}")
+            logger.error('user_appointments_failed', exc_info=True, user_id=user_id)
             return jsonify({
                 'message': 'Error retrieving appointments',
                 'error': str(e)
             }), 500
 
     @app.route('/appointments/<appointment_id>/status', methods=['PUT'])
+    @token_required()
     def update_appointment_status_route(appointment_id):
         try:
             data = request.get_json()
             
-            if not data or not data.get('status'):
-                return jsonify({
-                    'message': 'Status is required'
-                }), 400
-            
             # Validate status
-            valid_statuses = ['Pending', 'Approved', 'Rejected', 'Cancelled', 'Completed']
-            if data['status'] not in valid_statuses:
-                return jsonify({
-                    'message': f'Status must be one of: {", ".join(valid_statuses)}'
-                }), 400
+            error = validation.validate_status_update(data)
+            if error:
+                return jsonify(error), 400
             
-            # SIMPLE: Just update the status directly
-            success, message = update_appointment_status(appointment_id, data['status'])
+            unavailable = database_unavailable_response()
+            if unavailable:
+                return unavailable
             
-            if success:
+            # Optional version from the client's copy guards against overwriting a concurrent edit
+            appointment, error = transition_appointment_status(appointment_id, data['status'], data.get('version'))
+            
+            if appointment:
                 return jsonify({
-                    'message': f'Appointment status updated to {data["status"]}',
-                    'status': data['status']
+                    'message': f'Appointment status updated to {appointment.status}',
+                    'status': appointment.status,
+                    'version': appointment.version
                 }), 200
             else:
                 return jsonify({
                     'message': 'Failed to update appointment status',
-                    'error': message
-                }), 400
+                    'error': error
+                }), TRANSITION_ERROR_STATUS.get(error, 400)
                 
         except Exception as e:
             return jsonify({
@@ -256,19 +401,107 @@ def init_routes(app):
                 'error': str(e)
             }), 500
         
-    # Enhanced endpoint to get all appointments with user details
-    @app.route('/all-appointments', methods=['GET'])
-    def get_all_appointments_route():
+    # Dashboard counters maintained incrementally by the write paths
+    @app.route('/stats/appointments', methods=['GET'])
+    def get_appointment_stats_route():
         try:
-            appointments = get_appointments_with_user_details()
-            
+            # Counters only move when appointments do, so the global version stamp doubles as their ETag
+            etag = appointments_etag()
+            cached = not_modified(etag)
+            if cached:
+                return cached
+
+            return with_etag(jsonify({
+                'message': 'Appointment statistics retrieved successfully',
+                'stats': get_appointment_stats()
+            }), etag), 200
+
+        except Exception as e:
+            logger.error('appointment_stats_failed', exc_info=True)
             return jsonify({
-                'message': 'All appointments retrieved successfully',
-                'appointments': appointments
+                'message': 'Error retrieving appointment statistics',
+                'error': str(e)
+            }), 500
+
+    # Free seats per time slot, answered from the in-memory availability index
+    @app.route('/availability', methods=['GET'])
+    def get_availability():
+        start, days, error = validation.parse_availability_query(request.args.get('date'), request.args.get('range'))
+        if error:
+            return jsonify(error), 400
+
+        return jsonify({
+            'message': 'Availability retrieved successfully',
+            'capacity': availability.index.capacity,
+            'days': availability.index.free_slots(start, days, request.args.get('counselor_id'))
+        }), 200
+
+    # Approve or reject a batch of pending appointments in one request
+    @app.route('/appointments/bulk-status', methods=['PUT'])
+    @token_required()
+    def bulk_update_appointment_status_route():
+        try:
+            updates, error = validation.validate_bulk_status_update(request.get_json(), BULK_STATUS_MAX)
+            if error:
+                return jsonify(error), 400
+
+            unavailable = database_unavailable_response()
+            if unavailable:
+                return unavailable
+
+            results = bulk_update_appointment_status(updates)
+            updated = sum(1 for result in results if result['success'])
+
+            return jsonify({
+                'message': f'{updated} of {len(results)} appointments updated',
+                'updated': updated,
+                'failed': len(results) - updated,
+                'results': results
             }), 200
+
+        except Exception as e:
+            logger.error('bulk_status_update_failed', exc_info=True)
+            return jsonify({
+                'message': 'Error updating appointment statuses',
+                'error': str(e)
+            }), 500
+
+    # Enhanced endpoint to get all appointments with user details, in slot order.
+    # Supports keyset pagination via ?limit=N&cursor=<next_cursor>, a slot date range
+    # via ?from=YYYY-MM-DD&to=YYYY-MM-DD, and streams the body.
+    @app.route('/all-appointments', methods=['GET'])
+    @token_required()
+    def get_all_appointments_route():
+        try:
+            limit, after, error = validation.parse_page_query(request.args.get('limit'), request.args.get('cursor'))
+            if not error:
+                start, end, error = validation.parse_date_range(request.args.get('from'), request.args.get('to'))
+            if error:
+                return jsonify(error), 400
+
+            # A lagging secondary could serve an old page under the current version stamp, so only primary reads get an ETag
+            etag = appointments_etag() if database.LIST_READS_PRIMARY else None
+            cached = not_modified(etag) if etag else None
+            if cached:
+                return cached
+
+            page = iter_appointments_with_user_details(limit=limit, after=after, start=start, end=end)
+
+            def generate():
+                yield '{"message": "All appointments retrieved successfully", "appointments": ['
+                first = True
+                for appointment in page:
+                    if not first:
+                        yield ','
+                    first = False
+                    yield app.json.dumps(appointment)
+                yield '], "next_cursor": ' + app.json.dumps(page.next_cursor) + '}'
+
+            response = Response(stream_with_context(generate()), status=200, mimetype='application/json')
+            return with_etag(response, etag) if etag else response
             
         except Exception as e:
-            print(f"❌ Error retrieving all appointments: {e}")
+            logger.error('all_appointments_failed', exc_info=True)
             return jsonify({
                 'message': 'Error retrieving appointments',
                 'error': str(e)
@@ -287,18 +520,15 @@ def init_routes(app):
             
             return jsonify({
                 'message': 'User profile retrieved successfully',
-                'user': {
-                    'username': user.username,
-                    'id_number': user.id_number,
-                    'birthdate': user.birthdate,
-                    'user_id': str(user._id),
-                    'role': user.role,
-                    'created_at': user.created_at.isoformat() if hasattr(user.created_at, 'isoformat') else user.created_at
-                }
+                'user': dict(
+                    validation.user_summary(user),
+                    user_id=str(user._id),
+                    created_at=user.created_at.isoformat() if hasattr(user.created_at, 'isoformat') else user.created_at
+                )
             }), 200
             
         except Exception as e:
-            print(f"❌ Error retrieving user profile: {e}")
+            logger.error('user_profile_failed', exc_info=True, user_id=user_id)
             return jsonify({
                 'message': 'Error retrieving user profile',
                 'error': str(e)
@@ -318,29 +548,34 @@ def init_routes(app):
             'note': 'Authentication handled by frontend localStorage'
         })
 
+    # Answered from the health monitor's last check; never touches the database
     @app.route('/health')
     def health_check():
+        database_state = health.monitor.state()
         return jsonify({
-            'status': 'healthy',
-            'message': 'API is running'
+            'status': 'healthy' if database_state['connected'] is not False else 'degraded',
+            'message': 'API is running',
+            'database': database_state,
+            'password_pool': hasher.stats(),
+            'admission': ratelimit.admission.stats(),
+            'user_cache': user_cache.stats()
         })
 
     # Test endpoint to check if appointments collection exists
     @app.route('/test-appointments')
     def test_appointments():
-        try:
-            from database import mongo
-            # Try to access appointments collection
-            appointments_count = mongo.db.appointments.count_documents({})
-            return jsonify({
-                'message': 'Appointments collection is accessible',
-                'appointments_count': appointments_count
-            })
-        except Exception as e:
+        database_state = health.monitor.state()
+        if not database_state['connected']:
             return jsonify({
                 'message': 'Error accessing appointments collection',
-                'error': str(e)
+                'error': database_state['error'] or 'No successful health check yet'
             }), 500
+        # Approximate count from collection metadata, as of the last health check
+        return jsonify({
+            'message': 'Appointments collection is accessible',
+            'appointments_count': database_state['collections'].get('appointments'),
+            'checked_at': database_state['checked_at']
+        })
 
     # Debug endpoint to check appointment data
     @app.route('/debug/appointments/<appointment_id>')
@@ -399,6 +634,20 @@ def init_routes(app):
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
+    # Debug endpoint to verify every query helper is served by an index
+    @app.route('/debug/query-plans')
+    def debug_query_plans():
+        try:
+            from database import explain_queries
+            plans = explain_queries()
+            collection_scans = [name for name, stages in plans.items() if 'COLLSCAN' in stages]
+            return jsonify({
+                'plans': plans,
+                'collection_scans': collection_scans
+            }), 500 if collection_scans else 200
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
     # Debug endpoint to check user details
     @app.route('/debug/users')
     def debug_users():
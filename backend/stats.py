@@ -0,0 +1,27 @@
+import threading
+import time
+import database
+from log import get_logger
+
+logger = get_logger(__name__)
+
+_reconciler = None
+
+
+def _reconcile_periodically(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            database.reconcile_appointment_stats()
+        except Exception:
+            logger.error('stats_reconcile_failed', exc_info=True)
+
+
+def init_app(app):
+    """Seed the dashboard counters if they do not exist yet and schedule periodic reconciliation"""
+    global _reconciler
+    database.seed_appointment_stats()
+    interval = app.config.get('STATS_RECONCILE_SECONDS', 3600)
+    if interval and _reconciler is None:
+        _reconciler = threading.Thread(target=_reconcile_periodically, args=(interval,), name='stats-reconcile', daemon=True)
+        _reconciler.start()
@@ -0,0 +1,118 @@
+"""Signed session tokens, so protected routes authorize a request without looking the user up.
+
+/login hands out a token carrying the user's id and role plus the time it was
+signed, HMAC-SHA256 signed with SECRET_KEY. The protected routes trust its
+claims after checking the signature and age, which costs no database round
+trip. Tokens expire after TOKEN_MAX_AGE seconds (15 minutes by default);
+POST /token/refresh swaps a live token for a fresh one and is the only place
+the user is read again, so a changed role or deleted account takes effect
+within one expiry window.
+
+Keys rotate without logging everyone out: set SECRET_KEY to the new key and
+SECRET_KEY_FALLBACKS to the old ones (comma-separated). New tokens are signed
+with SECRET_KEY and tokens signed with a fallback keep verifying until they
+expire, after which the fallback can be dropped.
+"""
+import hashlib
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# Roles that may see and change every student's appointments
+STAFF_ROLES = ('admin',)
+
+# Distinguishes these signatures from anything else signed with SECRET_KEY
+SALT = 'tupt-session-token'
+
+EXPIRED = 'Session expired, please log in again'
+INVALID = 'Invalid session token'
+MISSING = 'Authorization: Bearer <token> header required'
+FORBIDDEN = 'Not allowed to access this resource'
+
+# The key app.py falls back to; it is published in the repository, so tokens signed with it prove nothing
+PLACEHOLDER_SECRET_KEY = 'your-secret-key-change-this-in-production'
+
+REFUSALS = {
+    401: 'Authentication required',
+    403: 'Access denied'
+}
+
+
+def bearer_token(header):
+    """The token from an 'Authorization: Bearer <token>' header, or None"""
+    scheme, _, token = (header or '').partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        return None
+    return token.strip()
+
+
+class SessionTokens:
+    """Issues and checks session tokens; configured from app.config by init_app"""
+
+    def __init__(self):
+        self.serializer = None
+        self.max_age = 900
+        self.required = True
+
+    def configure(self, secret_key, fallbacks=(), max_age=900, required=True):
+        # itsdangerous signs with the last key and accepts any of them
+        self.serializer = URLSafeTimedSerializer(
+            [*reversed(fallbacks), secret_key], salt=SALT, signer_kwargs={'digest_method': hashlib.sha256}
+        )
+        self.max_age = max_age
+        self.required = required
+
+    def issue(self, user_id, role):
+        return self.serializer.dumps({'uid': str(user_id), 'role': role})
+
+    def verify(self, token):
+        """(claims, None) for a valid unexpired token, else (None, error)"""
+        try:
+            claims = self.serializer.loads(token, max_age=self.max_age)
+        except SignatureExpired:
+            return None, EXPIRED
+        except BadSignature:
+            return None, INVALID
+        if not isinstance(claims, dict) or not claims.get('uid') or not claims.get('role'):
+            return None, INVALID
+        return claims, None
+
+    def authorize(self, token, roles=STAFF_ROLES, owner=None):
+        """None if the token has one of roles or belongs to owner (a user id), else (status, error)"""
+        if not self.required:
+            return None
+        if not token:
+            return 401, MISSING
+        claims, error = self.verify(token)
+        if error:
+            return 401, error
+        if claims['role'] in roles or (owner is not None and claims['uid'] == str(owner)):
+            return None
+        logger.info('request_forbidden', user_id=claims['uid'], role=claims['role'])
+        return 403, FORBIDDEN
+
+    def grant(self, user):
+        """Login / refresh response fields for a user"""
+        return {'token': self.issue(user._id, user.role), 'expires_in': self.max_age}
+
+
+session_tokens = SessionTokens()
+
+
+def refusal(status, error):
+    """Response body and headers for an authorize() refusal"""
+    headers = {'WWW-Authenticate': 'Bearer'} if status == 401 else {}
+    return {'message': REFUSALS[status], 'error': error}, headers
+
+
+def init_app(app):
+    if app.config.get('TOKEN_REQUIRED', True) and app.config.get('SECRET_KEY') in (None, '', PLACEHOLDER_SECRET_KEY):
+        raise RuntimeError('SECRET_KEY is unset or the placeholder; set a random secret to sign session tokens, '
+                           'or TOKEN_REQUIRED=false to run without token checks')
+    session_tokens.configure(
+        app.config['SECRET_KEY'],
+        fallbacks=app.config.get('SECRET_KEY_FALLBACKS') or (),
+        max_age=app.config.get('TOKEN_MAX_AGE', 900),
+        required=app.config.get('TOKEN_REQUIRED', True)
+    )
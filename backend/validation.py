@@ -0,0 +1,205 @@
+"""Request validation shared by the Flask routes and the ASGI app.
+
+Validators take decoded request data and return the JSON body of a 400
+response, or None when the input is acceptable, so both serving stacks
+reject the same input with the same messages.
+"""
+import hashlib
+from datetime import datetime, time, timedelta
+from models import User, Appointment
+from database import decode_appointment_cursor, APPOINTMENT_PAGE_MAX
+import availability
+
+VALID_STATUSES = ['Pending', 'Approved', 'Rejected', 'Cancelled', 'Completed']
+
+
+def _missing_fields_error(data, required_fields):
+    if not data:
+        return {
+            'message': 'Invalid request data',
+            'error': 'No JSON data provided'
+        }
+    missing_fields = [field for field in required_fields if not data.get(field)]
+    if missing_fields:
+        return {
+            'message': 'Missing required fields',
+            'error': f'Missing fields: {", ".join(missing_fields)}',
+            'missing_fields': missing_fields
+        }
+    return None
+
+
+def _int_arg(value, default=None):
+    """Integer query parameter; malformed values fall back to the default like Flask's type=int"""
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def validate_registration(data):
+    error = _missing_fields_error(data, ['username', 'password', 'id_number', 'birthdate'])
+    if error:
+        return error
+    if len(data['password']) < 6:
+        return {
+            'message': 'Registration failed',
+            'error': 'Password must be at least 6 characters long'
+        }
+    return None
+
+
+def new_user(data, password_hash):
+    return User(
+        username=data['username'],
+        password_hash=password_hash,
+        id_number=data['id_number'],
+        birthdate=data['birthdate'],
+        # Self-registration only ever creates students; admins are promoted with migrations.set_role
+        role='user'
+    )
+
+
+def user_summary(user):
+    """Public fields of a user as returned by the auth and profile endpoints"""
+    return {
+        'username': user.username,
+        'id_number': user.id_number,
+        'birthdate': user.birthdate,
+        'role': user.role
+    }
+
+
+def validate_login(data):
+    if not data or not data.get('username') or not data.get('password'):
+        return {
+            'message': 'Login failed',
+            'error': 'Username and password are required'
+        }
+    return None
+
+
+def validate_new_appointment(data, slot_times):
+    error = _missing_fields_error(data, ['user_id', 'date', 'preferred_time', 'concern_type'])
+    if error:
+        return error
+    if data['preferred_time'] not in slot_times:
+        return {
+            'message': 'Appointment scheduling failed',
+            'error': f'preferred_time must be one of: {", ".join(slot_times)}'
+        }
+    try:
+        availability.parse_date(data['date'])
+    except (TypeError, ValueError):
+        return {
+            'message': 'Appointment scheduling failed',
+            'error': 'date must be YYYY-MM-DD'
+        }
+    return None
+
+
+def new_appointment(data):
+    # New appointments are always 'Pending'; only staff move them on, through the status routes
+    return Appointment(
+        user_id=data['user_id'],
+        date=data['date'],
+        preferred_time=data['preferred_time'],
+        concern_type=data['concern_type'],
+        status='Pending',
+        counselor_id=data.get('counselor_id')
+    )
+
+
+def validate_status_update(data):
+    if not data or not data.get('status'):
+        return {'message': 'Status is required'}
+    if data['status'] not in VALID_STATUSES:
+        return {'message': f'Status must be one of: {", ".join(VALID_STATUSES)}'}
+    version = data.get('version')
+    if version is not None and (not isinstance(version, int) or isinstance(version, bool) or version < 0):
+        return {'message': 'Version must be a non-negative integer'}
+    return None
+
+
+def validate_bulk_status_update(data, max_updates):
+    """Returns (updates, error)"""
+    updates = data.get('updates') if isinstance(data, dict) else None
+    if not isinstance(updates, list) or not updates:
+        return None, {'message': 'A non-empty updates list is required'}
+    if len(updates) > max_updates:
+        return None, {'message': f'At most {max_updates} updates per request'}
+    if not all(isinstance(item, dict) for item in updates):
+        return None, {'message': 'Each update must be an object with appointment_id and status'}
+    return updates, None
+
+
+def parse_availability_query(date_value, range_value):
+    """Returns (start, days, error) from the raw date and range query parameters"""
+    try:
+        start = availability.parse_date(date_value or '')
+    except ValueError:
+        return None, None, {
+            'message': 'Invalid availability query',
+            'error': 'date must be YYYY-MM-DD'
+        }
+    days = _int_arg(range_value, 1)
+    if not 1 <= days <= availability.MAX_RANGE_DAYS:
+        return None, None, {
+            'message': 'Invalid availability query',
+            'error': f'range must be between 1 and {availability.MAX_RANGE_DAYS} days'
+        }
+    return start, days, None
+
+
+def parse_date_range(from_value, to_value):
+    """Returns (start, end, error): the slot_start range [start, end) for inclusive YYYY-MM-DD from/to parameters"""
+    bounds = []
+    for name, value in (('from', from_value), ('to', to_value)):
+        if not value:
+            bounds.append(None)
+            continue
+        try:
+            bounds.append(datetime.combine(availability.parse_date(value), time.min))
+        except ValueError:
+            return None, None, {
+                'message': 'Invalid date range',
+                'error': f'{name} must be YYYY-MM-DD'
+            }
+    start, end = bounds
+    if start and end and end < start:
+        return None, None, {
+            'message': 'Invalid date range',
+            'error': 'to must not be before from'
+        }
+    # `to` is inclusive, so the range runs to the start of the following day
+    return start, end + timedelta(days=1) if end else None, None
+
+
+def parse_page_query(limit_value, cursor):
+    """Returns (limit, after, error) from the raw limit and cursor query parameters"""
+    limit = _int_arg(limit_value)
+    if limit is not None and limit < 1:
+        return None, None, {
+            'message': 'Invalid pagination parameters',
+            'error': 'limit must be a positive integer'
+        }
+    if limit is not None:
+        limit = min(limit, APPOINTMENT_PAGE_MAX)
+
+    after = None
+    if cursor:
+        try:
+            after = decode_appointment_cursor(cursor)
+        except ValueError as e:
+            return None, None, {
+                'message': 'Invalid pagination parameters',
+                'error': str(e)
+            }
+    return limit, after, None
+
+
+def etag_for(version, query_string):
+    """Strong ETag for an appointment list: version stamp plus the query string that shaped the page"""
+    return hashlib.sha1(f'{version}|{query_string}'.encode('utf-8')).hexdigest()
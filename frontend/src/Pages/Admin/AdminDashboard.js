@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
+import { authFetch, clearSession } from '../../session';
 import './AdminDashboard.css';
 
 const AdminDashboard = () => {
@@ -43,8 +44,12 @@ const AdminDashboard = () => {
     try {
       setIsLoading(true);
       setError('');
-      const response = await fetch('http://localhost:5000/all-appointments');
+      const response = await authFetch('http://localhost:5000/all-appointments');
       
+      if (response.status === 401) {
+        navigate('/');
+        return;
+      }
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
@@ -371,12 +376,13 @@ const AdminDashboard = () => {
         return;
       }
 
-      const response = await fetch(`http://localhost:5000/appointments/${appointmentId}/status`, {
+      const response = await authFetch(`http://localhost:5000/appointments/${appointmentId}/status`, {
         method: 'PUT',
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ status: newStatus }),
+        // The version we last saw; the server refuses the change if someone else edited it since
+        body: JSON.stringify({ status: newStatus, version: appointment?.version }),
       });
 
       const data = await response.json();
@@ -385,7 +391,7 @@ const AdminDashboard = () => {
         setAppointments(prevAppointments => 
           prevAppointments.map(apt => 
             apt._id === appointmentId 
-              ? { ...apt, status: newStatus }
+              ? { ...apt, status: data.status, version: data.version }
               : apt
           )
         );
@@ -393,7 +399,7 @@ const AdminDashboard = () => {
         setFilteredAppointments(prevFiltered => 
           prevFiltered.map(apt => 
             apt._id === appointmentId 
-              ? { ...apt, status: newStatus }
+              ? { ...apt, status: data.status, version: data.version }
               : apt
           )
         );
@@ -460,8 +466,7 @@ const AdminDashboard = () => {
   };
 
   const handleLogout = () => {
-    localStorage.removeItem('currentUser');
-    localStorage.removeItem('isAuthenticated');
+    clearSession();
     localStorage.removeItem('user');
     navigate('/');
   };
@@ -1,5 +1,6 @@
 import React, { useState } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
+import { saveSession } from '../../session';
 import './Login.css';
 
 const Login = () => {
@@ -52,9 +53,8 @@ const handleLoginSubmit = async (e) => {
     const data = await response.json();
 
     if (response.ok) {
-      // Store user data in localStorage
-      localStorage.setItem('currentUser', JSON.stringify(data.user));
-      localStorage.setItem('isAuthenticated', 'true');
+      // Store user data and session token in localStorage
+      saveSession(data);
       
       console.log('Login successful:', data);
       alert('Login successful!');
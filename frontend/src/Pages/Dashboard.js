@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
+import { authFetch, clearSession } from '../session';
 import './Dashboard.css';
 
 const Dashboard = () => {
@@ -85,9 +86,11 @@ const Dashboard = () => {
 
   const loadUserAppointments = async (userId) => {
     try {
-      const response = await fetch(`http://localhost:5000/appointments/${userId}`);
+      const response = await authFetch(`http://localhost:5000/appointments/${userId}`);
       
-      if (response.ok) {
+      if (response.status === 401) {
+        navigate('/');
+      } else if (response.ok) {
         const data = await response.json();
         console.log('Appointments loaded:', data.appointments);
         setScheduledAppointments(data.appointments || []);
@@ -101,8 +104,7 @@ const Dashboard = () => {
 
   const handleLogout = () => {
     // Clear localStorage
-    localStorage.removeItem('currentUser');
-    localStorage.removeItem('isAuthenticated');
+    clearSession();
     navigate('/');
   };
 
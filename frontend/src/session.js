@@ -0,0 +1,50 @@
+// Session token handed out by /login; the appointment and admin endpoints require it
+const API_URL = 'http://localhost:5000';
+
+// Refresh this long before the token runs out
+const REFRESH_MARGIN_MS = 60 * 1000;
+
+export const saveSession = (data) => {
+  localStorage.setItem('currentUser', JSON.stringify(data.user));
+  localStorage.setItem('isAuthenticated', 'true');
+  localStorage.setItem('token', data.token);
+  localStorage.setItem('tokenExpiresAt', String(Date.now() + data.expires_in * 1000));
+};
+
+export const clearSession = () => {
+  localStorage.removeItem('currentUser');
+  localStorage.removeItem('isAuthenticated');
+  localStorage.removeItem('token');
+  localStorage.removeItem('tokenExpiresAt');
+};
+
+const refreshToken = async () => {
+  const response = await fetch(`${API_URL}/token/refresh`, {
+    method: 'POST',
+    headers: { Authorization: `Bearer ${localStorage.getItem('token')}` },
+  });
+  if (response.ok) {
+    saveSession(await response.json());
+  }
+};
+
+// fetch() with the session token attached, renewing it first when it is about to expire.
+// A 401 means the session is gone, so it is cleared and the caller should send the user to the login page.
+export const authFetch = async (url, options = {}) => {
+  const expiresAt = Number(localStorage.getItem('tokenExpiresAt') || 0);
+  if (localStorage.getItem('token') && expiresAt - Date.now() < REFRESH_MARGIN_MS) {
+    await refreshToken();
+  }
+
+  const response = await fetch(url, {
+    ...options,
+    headers: {
+      ...options.headers,
+      Authorization: `Bearer ${localStorage.getItem('token')}`,
+    },
+  });
+  if (response.status === 401) {
+    clearSession();
+  }
+  return response;
+};